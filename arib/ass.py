@@ -13,47 +13,145 @@ file.
 
 """
 from pathlib import Path
+import functools
+import os
+import sys
 import arib.code_set as code_set
 import arib.control_characters as control_characters
 import re
 from arib.arib_exceptions import FileOpenError
 from arib.drcs_decoder import drcs_unpack_to_bitmap
 from arib.drcs_cache import DrcsGlyph
+from arib.drcs_cache import DRCS_CACHE
+from arib.tokens import Tokens
 
 
 # DRCS drawing support
-def bitmap_to_ass_path(bitmap, alpha_threshold=1):
+
+# Ways of turning a DRCS bitmap into an ASS drawing path
+DRCS_PATH_RUNS = "runs"  # a rectangle per horizontal run of pixels on each row
+DRCS_PATH_RECTS = "rects"  # runs merged with identical runs on the rows below
+DRCS_PATH_OUTLINE = "outline"  # the outline of each connected area as a polygon
+DRCS_PATH_STRATEGIES = (DRCS_PATH_RUNS, DRCS_PATH_RECTS, DRCS_PATH_OUTLINE)
+
+
+_RUN = re.compile(b"\x01+")
+
+
+@functools.lru_cache(maxsize=None)
+def _threshold_table(alpha_threshold):
+    """Byte translation table marking pixels >= alpha_threshold with 1 and others with 0"""
+    return bytes(int(v >= alpha_threshold) for v in range(256))
+
+
+def bitmap_runs(row, alpha_threshold=1):
+    """Yield (start, end) of the horizontal runs of pixels >= alpha_threshold in a row.
+    end is exclusive.
     """
-    bitmap: 2D list [h][w] with values 0..N (N = 2**depth-1)
+    if alpha_threshold <= 0:
+        if len(row):
+            yield 0, len(row)
+        return
+    if alpha_threshold > 255:
+        return
+    drawn = bytes(row).translate(_threshold_table(alpha_threshold))
+    for run in _RUN.finditer(drawn):
+        yield run.span()
+
+
+def ass_rect(x1, y1, x2, y2):
+    """ASS path of the rectangle from (x1, y1) to (x2, y2)"""
+    return f"m {x1} {y1} l {x2} {y1} l {x2} {y2} l {x1} {y2}"
+
+
+def bitmap_to_ass_path(bitmap, alpha_threshold=1, strategy=DRCS_PATH_RECTS):
+    """
+    bitmap: DrcsBitmap (or 2D list [h][w]) with values 0..N (N = 2**depth-1)
     alpha_threshold: draw pixels with value >= threshold (simple mono)
+    strategy: one of DRCS_PATH_STRATEGIES. All draw exactly the same pixels.
     returns: ASS path string like 'm x y l x2 y l x2 y2 l x y2'
     """
-    h = len(bitmap)
-    if h == 0:
+    if not len(bitmap):
         return ""
+    if strategy == DRCS_PATH_RUNS:
+        return _runs_path(bitmap, alpha_threshold)
+    if strategy == DRCS_PATH_RECTS:
+        return _rects_path(bitmap, alpha_threshold)
+    if strategy == DRCS_PATH_OUTLINE:
+        return _outline_path(bitmap, alpha_threshold)
+    raise ValueError(f"Unknown DRCS path strategy: {strategy!r}")
+
+
+def _runs_path(bitmap, alpha_threshold):
+    # rectangle from (run_start, y) to (run_end, y+1)
+    # ASS path is integer-friendly; y grows downward in libass
+    path_parts = []
+    for y, row in enumerate(bitmap):
+        for run_start, run_end in bitmap_runs(row, alpha_threshold):
+            path_parts.append(ass_rect(run_start, y, run_end, y + 1))
+    return " ".join(path_parts)
+
+
+def _rects_path(bitmap, alpha_threshold):
+    # a run that's repeated exactly on the following rows grows into a taller rectangle
+    rects = []
+    open_rects = {}  # (run_start, run_end) -> top row
+    for y, row in enumerate(bitmap):
+        runs = {}
+        for run in bitmap_runs(row, alpha_threshold):
+            runs[run] = open_rects.pop(run, y)
+        for (x1, x2), top in open_rects.items():
+            rects.append((top, x1, x2, y))
+        open_rects = runs
+    for (x1, x2), top in open_rects.items():
+        rects.append((top, x1, x2, len(bitmap)))
+    rects.sort()
+    return " ".join(ass_rect(x1, top, x2, bottom) for top, x1, x2, bottom in rects)
+
+
+def _outline_path(bitmap, alpha_threshold):
+    # Every pixel edge between a drawn and an undrawn pixel, directed clockwise
+    # around the drawn pixel. Outlines then run clockwise and holes counterclockwise,
+    # so holes stay empty under both nonzero and even-odd fill rules.
+    h = len(bitmap)
     w = len(bitmap[0])
 
-    path_parts = []
+    def drawn(x, y):
+        return 0 <= y < h and 0 <= x < w and bitmap[y][x] >= alpha_threshold
+
+    edges = {}  # start point -> list of end points
     for y in range(h):
-        row = bitmap[y]
-        x = 0
-        while x < w:
-            # find start of a run
-            while x < w and row[x] < alpha_threshold:
-                x += 1
-            if x >= w:
-                break
-            run_start = x
-            while x < w and row[x] >= alpha_threshold:
-                x += 1
-            run_end = x  # exclusive
-
-            # rectangle from (run_start, y) to (run_end, y+1)
-            # ASS path is integer-friendly; y grows downward in libass
-            x1, y1 = run_start, y
-            x2, y2 = run_end, y + 1
-            path_parts.append(f"m {x1} {y1} l {x2} {y1} l {x2} {y2} l {x1} {y2}")
+        for x in range(w):
+            if not drawn(x, y):
+                continue
+            if not drawn(x, y - 1):
+                edges.setdefault((x, y), []).append((x + 1, y))
+            if not drawn(x + 1, y):
+                edges.setdefault((x + 1, y), []).append((x + 1, y + 1))
+            if not drawn(x, y + 1):
+                edges.setdefault((x + 1, y + 1), []).append((x, y + 1))
+            if not drawn(x - 1, y):
+                edges.setdefault((x, y + 1), []).append((x, y))
 
+    path_parts = []
+    for start in sorted(edges):
+        while edges.get(start):
+            # walk one closed outline, keeping only its corners
+            points = [start]
+            point = edges[start].pop()
+            while point != start:
+                points.append(point)
+                point = edges[point].pop()
+            corners = [
+                p
+                for i, p in enumerate(points)
+                if (points[i - 1][0] != p[0] or p[0] != points[(i + 1) % len(points)][0])
+                and (points[i - 1][1] != p[1] or p[1] != points[(i + 1) % len(points)][1])
+            ]
+            path_parts.append(
+                f"m {corners[0][0]} {corners[0][1]} "
+                + " ".join(f"l {x} {y}" for x, y in corners[1:])
+            )
     return " ".join(path_parts)
 
 
@@ -67,7 +165,9 @@ def ass_draw_dialogue(path, p_scale=1, fscx=100, fscy=100, anchor=1):
     return f"{{\\an{anchor}\\p{p_scale}}}" f"{path}{{\\p0}}"
 
 
-def ass_draw_drcs_inline(glyph: DrcsGlyph, pad_spaces: int = 2) -> str:
+def ass_draw_drcs_inline(
+    glyph: DrcsGlyph, pad_spaces: int = 2, strategy: str = DRCS_PATH_RECTS
+) -> str:
     """
     Emit a DRCS vector drawing that inherits the CURRENT ASS state:
     - inherits \1c (primary color), \1a (alpha), \bord, \\shad, etc.
@@ -79,10 +179,17 @@ def ass_draw_drcs_inline(glyph: DrcsGlyph, pad_spaces: int = 2) -> str:
       "{\\c&H00FF00&}" + ass_draw_drcs_inline(glyph, pad_spaces=2) + "お前たちは"
     """
     bmp = drcs_unpack_to_bitmap(glyph.width, glyph.height, glyph.bitmap, depth=glyph.depth_bits)
-    path = bitmap_to_ass_path(bmp, alpha_threshold=1)
+    path = bitmap_to_ass_path(bmp, alpha_threshold=1, strategy=strategy)
     return f"{{\\p1}}{path}{{\\p0}}{' ' * pad_spaces}"
 
 
+# DRCS drawing functions for each path strategy, for use with DRCS_CACHE.drawing()
+DRCS_DRAWERS = {
+    strategy: functools.partial(ass_draw_drcs_inline, strategy=strategy)
+    for strategy in DRCS_PATH_STRATEGIES
+}
+
+
 class Pos(object):
     """Screen position in pixels"""
 
@@ -100,27 +207,41 @@ class Pos(object):
 
 
 class Dialog(object):
-    """text and dialog"""
+    """text and dialog
+    Text is collected as a list of parts and only joined when the line is written,
+    so building up a line a character (or tag) at a time stays linear.
+    """
 
     def __init__(self, s, x=None, y=None):
-        # make sure we always hold text
-        self._s = s.decode("utf-8", "replace") if isinstance(s, (bytes, bytearray)) else str(s)
+        self._parts = []
+        self._len = 0
         self._x = x
         self._y = y
+        self += s
 
     def __iadd__(self, other):
-        if isinstance(other, (bytes, bytearray)):
-            other = other.decode("utf-8", "replace")
-        else:
-            other = str(other)
-        self._s += other
+        # decoded text is almost always str already
+        if type(other) is not str:
+            if isinstance(other, (bytes, bytearray)):
+                other = other.decode("utf-8", "replace")
+            else:
+                other = str(other)
+        self._parts.append(other)
+        self._len += len(other)
         return self
 
+    def append(self, *parts):
+        """Add several str parts at once (override tags, say) without joining them first"""
+        self._parts.extend(parts)
+        self._len += sum(map(len, parts))
+
     def __len__(self):
-        return len(self._s)
+        return self._len
 
     def __str__(self):
-        return self._s
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
 
 
 class Size(object):
@@ -189,31 +310,139 @@ class ClosedCaptionArea(object):
         return Pos(int(round(x)), int(round(y)))
 
 
+# Size of the write buffer of .ass files
+ASS_WRITE_BUFFER_SIZE = 1024 * 1024
+
+# .ass file path meaning standard output
+ASS_STDOUT = "-"
+
+# names tried for the temporary file of an atomic .ass file before giving up
+TEMP_FILE_ATTEMPTS = 100
+
+
+def _create_temp_file(filepath):
+    """Create a new file to write filepath under, alongside it and hidden.
+    Like mkstemp(), but with the permissions open() would give filepath (0o666 less
+    the umask), without having to change the process wide umask to find out what it is.
+    :return: (fd open for writing, Path of the file)
+    """
+    for _ in range(TEMP_FILE_ATTEMPTS):
+        temppath = filepath.parent / f".{filepath.name}.{os.urandom(4).hex()}.tmp"
+        try:
+            fd = os.open(temppath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        return fd, temppath
+    raise FileExistsError(f"No free temporary file name for {str(filepath)!r}")
+
+
 class ASSFile(object):
-    """Wrapper for a single open utf-8 encoded .ass subtitle file"""
+    """Wrapper for a single open utf-8 encoded .ass subtitle file
+    Use as a context manager, or call close() when done. With atomic=True the
+    file is written under a temporary name alongside filepath and only renamed
+    to filepath when closed after a successful conversion, so filepath never
+    holds partial output.
+    With live=True each batch of dialog lines is flushed out as soon as it's written,
+    for following captions as they arrive. A filepath of ASS_STDOUT ("-") writes to
+    standard output (and is never atomic).
+    """
 
-    def __init__(self, filepath, width=960, height=540):
-        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+    def __init__(
+        self,
+        filepath,
+        width=960,
+        height=540,
+        atomic=False,
+        buffer_size=ASS_WRITE_BUFFER_SIZE,
+        live=False,
+    ):
+        stdout = str(filepath) == ASS_STDOUT
+        filepath = Path(filepath)
+        if not stdout:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._filepath = filepath
+        self._temppath = None
+        self._f = None
+        self._dialogue_lines = 0
+        self._live = live
 
         try:
-            self._f = open(filepath, "w", encoding="utf-8", newline="")
+            if stdout:
+                sys.stdout.flush()
+                self._f = open(
+                    sys.stdout.fileno(),
+                    "w",
+                    encoding="utf-8",
+                    newline="",
+                    buffering=buffer_size,
+                    closefd=False,
+                )
+            elif atomic:
+                fd, self._temppath = _create_temp_file(filepath)
+                self._f = open(fd, "w", encoding="utf-8", newline="", buffering=buffer_size)
+            else:
+                self._f = open(
+                    filepath, "w", encoding="utf-8", newline="", buffering=buffer_size
+                )
         except Exception as e:
-            raise FileOpenError(f"Could not open file {filepath!r} for writing: {e}") from e
+            raise FileOpenError(f"Could not open file {str(filepath)!r} for writing: {e}") from e
 
-        self.write_header(width, height, filepath)
+        self.write_header(width, height, str(filepath))
         self.write_styles()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close(commit=exc_type is None)
+
     def __del__(self):
+        # last resort only. an atomic file that was never closed is never committed.
         try:
-            if self._f:
-                self._f.close()
+            self.close(commit=False)
         except AttributeError:
             pass
 
+    @property
+    def closed(self):
+        return self._f is None
+
+    def close(self, commit=True):
+        """Flush and close the file. Safe to call more than once.
+        :param commit: for atomic files, rename the temporary file into place
+        (True) or delete it (False)
+        """
+        f, self._f = self._f, None
+        if f is None:
+            return
+        temppath, self._temppath = self._temppath, None
+        try:
+            f.close()
+        except BaseException:
+            if temppath:
+                temppath.unlink(missing_ok=True)
+            raise
+        if temppath:
+            if commit:
+                os.replace(temppath, self._filepath)
+            else:
+                temppath.unlink(missing_ok=True)
+
     def write(self, line):
         """Write indicated string to file. usually a line of dialog."""
         self._f.write(line)
 
+    def write_lines(self, lines):
+        """Write a batch of strings (lines of dialog) to file in one call."""
+        self._f.writelines(lines)
+        self._dialogue_lines += len(lines)
+        if self._live:
+            self._f.flush()
+
+    def dialogue_lines(self):
+        """Number of lines of dialog written via write_lines()"""
+        return self._dialogue_lines
+
     def write_header(self, width, height, title):
         header = """[Script Info]
 ; *****************************************************************************
@@ -292,21 +521,21 @@ def katakana(formatter, k, timestamp):
 
 def medium(formatter, k, timestamp):
     formatter.open_file()
-    formatter._current_lines[-1] += "{\\rmedium}" + formatter._current_color
+    formatter._current_lines[-1].append("{\\rmedium}", formatter._current_color)
     formatter._current_style = "medium"
     formatter._current_textsize = TextSize.MEDIUM
 
 
 def normal(formatter, k, timestamp):
     formatter.open_file()
-    formatter._current_lines[-1] += "{\\rnormal}" + formatter._current_color
+    formatter._current_lines[-1].append("{\\rnormal}", formatter._current_color)
     formatter._current_style = "normal"
     formatter._current_textsize = TextSize.NORMAL
 
 
 def small(formatter, k, timestamp):
     formatter.open_file()
-    formatter._current_lines[-1] += "{\\rsmall}" + formatter._current_color
+    formatter._current_lines[-1].append("{\\rsmall}", formatter._current_color)
     formatter._current_style = "small"
     formatter._current_textsize = TextSize.SMALL
 
@@ -320,7 +549,8 @@ def drcs(formatter, c, timestamp):
     if formatter._disable_drcs:
         formatter._current_lines[-1] += "�"
     else:
-        drawing_code = ass_draw_drcs_inline(c.glyph)
+        # the same glyphs (speaker, phone icons...) turn up over and over
+        drawing_code = DRCS_CACHE.drawing(c.glyph, DRCS_DRAWERS[formatter._drcs_path])
         formatter._current_lines[-1] += drawing_code
 
 
@@ -432,17 +662,16 @@ def clear_screen(formatter, cs, timestamp):
     if (
         len(formatter._current_lines[0]) or len(formatter._current_lines)
     ) and start_time != end_time:
-        for current_line in reversed(formatter._current_lines):
-            if not len(current_line):
-                continue
-
-            line = "Dialogue: 0,{start_time},{end_time},normal,,0000,0000,0000,,{line}\\N\n".format(
-                start_time=start_time, end_time=end_time, line=current_line._s
+        lines = [
+            "Dialogue: 0,{start_time},{end_time},normal,,0000,0000,0000,,{line}\\N\n".format(
+                start_time=start_time, end_time=end_time, line=current_line
             )
-            # TODO: add option to dump to stdout
-            # print line.encode('utf-8')
+            for current_line in reversed(formatter._current_lines)
+            if len(current_line)
+        ]
+        if lines:
             if formatter._ass_file:
-                formatter._ass_file.write(line)
+                formatter._ass_file.write_lines(lines)
             formatter._current_lines = [Dialog("")]
 
     formatter._elapsed_time_s = timestamp
@@ -491,6 +720,13 @@ class ASSFormatter(object):
         code_set.DRCS15: drcs,
     }
 
+    # handlers of the above keyed by control code, for tokens.Tokens streams
+    DISPLAYED_CONTROL_CODES = {
+        c.CODE: handler
+        for c, handler in DISPLAYED_CC_STATEMENTS.items()
+        if getattr(c, "CODE", None) is not None
+    }
+
     def __init__(
         self,
         default_color="white",
@@ -500,12 +736,18 @@ class ASSFormatter(object):
         video_filename="output.ass",
         verbose=False,
         disable_drcs=False,
+        drcs_path=DRCS_PATH_RECTS,
+        atomic=False,
+        live=False,
     ):
         """
         :param width: width of target screen in pixels
         :param height: height of target screen in pixels
         :param format_callback: callback method of form <None>callback(string) that
         can be used to dump strings to file upon each subsequent "clear screen" command.
+        :param drcs_path: how DRCS characters are drawn. One of DRCS_PATH_STRATEGIES
+        :param atomic: write the .ass file under a temporary name and rename it on close()
+        :param live: flush each Dialogue line out to the .ass file as soon as it's written
         """
         self._color = default_color
         self._tmax = tmax
@@ -523,19 +765,40 @@ class ASSFormatter(object):
         self._height = height
         self._verbose = verbose
         self._disable_drcs = disable_drcs
+        self._drcs_path = drcs_path
+        self._atomic = atomic
+        self._live = live
 
     def open_file(self):
         if not self._ass_file:
             if self._verbose:
                 print("Found nonempty ARIB closed caption data in file.")
                 print("Writing .ass file: " + self._filename)
-            self._ass_file = ASSFile(self._filename)
+            self._ass_file = ASSFile(self._filename, atomic=self._atomic, live=self._live)
 
     def file_written(self):
         return self._ass_file is not None
 
+    def dialogue_lines(self):
+        """Number of Dialogue lines written to the .ass file so far"""
+        return self._ass_file.dialogue_lines() if self._ass_file else 0
+
+    def close(self, commit=True):
+        """Finish the .ass file (if one was opened). See ASSFile.close()"""
+        if self._ass_file:
+            self._ass_file.close(commit)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close(commit=exc_type is None)
+
     def format(self, captions, timestamp):
         """Format ARIB closed caption info tinto text for an .ASS file"""
+        if isinstance(captions, Tokens):
+            self.format_tokens(captions, timestamp)
+            return
 
         for c in captions:
             if type(c) in ASSFormatter.DISPLAYED_CC_STATEMENTS:
@@ -545,3 +808,18 @@ class ASSFormatter(object):
                 # TODO: Warning of unhandled characters
                 pass
                 # print str(type(c))
+
+    def format_tokens(self, tokens, timestamp):
+        """Format a tokens.Tokens stream of closed caption info into text for an .ASS file"""
+        handlers = ASSFormatter.DISPLAYED_CC_STATEMENTS
+        control_handlers = ASSFormatter.DISPLAYED_CONTROL_CODES
+        for code, param in zip(tokens.codes, tokens.params):
+            if code == Tokens.TEXT:
+                self.open_file()
+                self._current_lines[-1] += tokens.values[param]
+            elif code == Tokens.OBJECT:
+                value = tokens.values[param]
+                if type(value) in handlers:
+                    handlers[type(value)](self, value, timestamp)
+            elif code in control_handlers:
+                control_handlers[code](self, tokens.value(code, param), timestamp)
@@ -28,6 +28,7 @@ from arib.mpeg.ts import PESPacket
 from arib.data_group import DataGroup
 from arib.secret_key import SECRET_KEY
 from arib.secret_key import CLIENT_ID
+from arib.tokens import Tokens
 
 
 class Pos(object):
@@ -333,6 +334,13 @@ class ASSFormatter(object):
         code_set.DRCS15: drcs,
     }
 
+    # handlers of the above keyed by control code, for tokens.Tokens streams
+    DISPLAYED_CONTROL_CODES = {
+        c.CODE: handler
+        for c, handler in DISPLAYED_CC_STATEMENTS.items()
+        if getattr(c, "CODE", None) is not None
+    }
+
     def __init__(self, ass_file=None, width=960, height=540, video_filename="unknown"):
         """
         :param width: width of target screen in pixels
@@ -353,6 +361,9 @@ class ASSFormatter(object):
 
     def format(self, captions, timestamp):
         """Format ARIB closed caption info tinto text for an .ASS file"""
+        if isinstance(captions, Tokens):
+            self.format_tokens(captions, timestamp)
+            return
 
         for c in captions:
             if type(c) in ASSFormatter.DISPLAYED_CC_STATEMENTS:
@@ -363,6 +374,22 @@ class ASSFormatter(object):
                 pass
                 # print str(type(c))
 
+    def format_tokens(self, tokens, timestamp):
+        """Format a tokens.Tokens stream of closed caption info into text for an .ASS file"""
+        handlers = ASSFormatter.DISPLAYED_CC_STATEMENTS
+        control_handlers = ASSFormatter.DISPLAYED_CONTROL_CODES
+        for code, param in zip(tokens.codes, tokens.params):
+            if code == Tokens.TEXT:
+                # as kanji() and the other character handlers do, a run at a time
+                if self._current_style != "small":
+                    self._current_lines[-1] += tokens.values[param]
+            elif code == Tokens.OBJECT:
+                value = tokens.values[param]
+                if type(value) in handlers:
+                    handlers[type(value)](self, value, timestamp)
+            elif code in control_handlers:
+                control_handlers[code](self, tokens.value(code, param), timestamp)
+
 
 def main():
     parser = argparse.ArgumentParser(description="Auto translate jp CCs in MPEG TS file.")
@@ -12,7 +12,10 @@ an ARIB data group
 
 """
 
+import sys
+
 from arib import read
+from arib.arib_exceptions import DecodingError
 from arib.decoder import Decoder
 from arib.drcs_cache import DRCS_CACHE
 from arib.drcs_cache import DrcsGlyph
@@ -90,10 +93,13 @@ class StatementBody(object):
             raise ValueError
         self._data_unit_size = data_unit._data_unit_size
         # self._payload = f.read(self._data_unit_size)
-        self._payload = StatementBody.parse_contents(f, self._data_unit_size)
+        self._payload = StatementBody.parse_tokens(f, self._data_unit_size)
         # print str(self._payload)
 
     def payload(self):
+        """Decoded statement as a tokens.Tokens stream. (parse_contents() decodes
+        statement bytes to a list of statement objects instead.)
+        """
         return self._payload
 
     @staticmethod
@@ -125,6 +131,14 @@ class StatementBody(object):
                 statements.append(statement)
         return statements
 
+    @staticmethod
+    def parse_tokens(f, bytes_to_read):
+        """
+        Read caption data from binary file as parse_contents() does,
+        but return a compact tokens.Tokens stream
+        """
+        return Decoder().decode_tokens(f, bytes_to_read)
+
 
 # class DRCSFont is Deprecated in favor of drcs_cache.DrcsGlyph
 
@@ -132,9 +146,10 @@ class StatementBody(object):
 class DRCSCharacter(object):
     """DRCS character parsed by DRCS2ByteCharacter class"""
 
-    def __init__(self, f):
+    def __init__(self, f, end=None):
         """
         :param f: file descriptor we're reading from
+        :param end: position of the end of the DRCS data unit, if known
         """
         self._character_code = read.usb(f)  # 16-bit from stream
         self._number_of_font = read.ucb(f)  # keep doing whatever you need with this
@@ -156,7 +171,7 @@ class DRCSCharacter(object):
             set_id = 0
             char_code = drcs0_pack(hi, lo)  # pack row/cell into a single int
 
-        glyph = DrcsGlyph(f)
+        glyph = DrcsGlyph(f, end)
         DRCS_CACHE.put(set_id, char_code, glyph)
         # If we're debugging, dump the DRCS character in some basic way to stdout
         if DRCS_DEBUG:
@@ -181,9 +196,16 @@ class DRCS1ByteCharacter(object):
             raise ValueError
         self._data_unit_size = data_unit._data_unit_size
         self._characters = []
+        end = f.tell() + self._data_unit_size
         self._number_of_code = read.ucb(f)
-        for i in range(self._number_of_code):
-            self._characters.append(DRCSCharacter(f))
+        try:
+            for i in range(self._number_of_code):
+                self._characters.append(DRCSCharacter(f, end))
+        except DecodingError as e:
+            # skip the rest of the data unit rather than reading glyphs out of its neighbors.
+            # (stdout may be carrying the decoded text or .ass file)
+            print("Warning: " + str(e), file=sys.stderr)
+            f.seek(end)
 
     def payload(self):
         return self._payload
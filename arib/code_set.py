@@ -716,6 +716,10 @@ class Kanji(object):
 
     FINAL_BYTE = 0x42
 
+    # 94x94 row/cell table of decoded characters (gaiji rows included).
+    # Built on first use by Kanji.table()
+    TABLE = None
+
     def __init__(self, b, f):
         """Read from stream two bytes
         :param b: initial byte value read
@@ -725,21 +729,9 @@ class Kanji(object):
         """
         # read the second byte of the 2 byte kanji
         b2 = read.ucb(f)
-        self._args = []
-        self._args.append(b)
-        self._args.append(b2)
+        self._args = [b, b2]
 
-        if Gaiji.is_gaiji(self._args):
-            # character is outside the shif-jis code set
-            self._character = Gaiji.decode(self._args)
-        else:
-            # form utf-8 encoding of character
-            s = "".join("{:02x}".format(a | 0x80) for a in self._args)
-            h = bytes.fromhex(s)  # was: s.decode('hex')
-            try:
-                self._character = h.decode("euc-jisx0213")
-            except UnicodeDecodeError:
-                self._character = "◻"
+        self._character = Kanji.lookup(b, b2)
         if DEBUG:
             print(
                 "[{b}][{b2}]-->{char}".format(b=hex(b), b2=hex(b2), char=self._character).encode(
@@ -754,10 +746,50 @@ class Kanji(object):
         """stringify"""
         return self._character
 
+    @staticmethod
+    def lookup(b, b2):
+        """Return the character for a 2 byte kanji, via Kanji.TABLE where possible"""
+        row = (b & 0x7F) - 0x21
+        cell = (b2 & 0x7F) - 0x21
+        if 0 <= row < 94 and 0 <= cell < 94:
+            return (Kanji.TABLE or Kanji.table())[row * 94 + cell]
+        return Kanji.decode_character(b, b2)
+
+    @staticmethod
+    def decode_character(b, b2):
+        """Decode a 2 byte kanji character without the help of Kanji.TABLE"""
+        args = [b, b2]
+        if Gaiji.is_gaiji(args):
+            # character is outside the shif-jis code set
+            return Gaiji.decode(args)
+        # form utf-8 encoding of character
+        h = bytes((b | 0x80, b2 | 0x80))
+        try:
+            return h.decode("euc-jisx0213")
+        except UnicodeDecodeError:
+            return "◻"
+
+    @staticmethod
+    def table():
+        """Return the 94x94 table of characters indexed by row * 94 + cell (both from 0),
+        building it if need be.
+        """
+        if Kanji.TABLE is None:
+            Kanji.TABLE = [
+                Kanji.decode_character(row, cell)
+                for row in range(0x21, 0x7F)
+                for cell in range(0x21, 0x7F)
+            ]
+        return Kanji.TABLE
+
     @staticmethod
     def decode(b, f):
         return Kanji(b, f)
 
+    @staticmethod
+    def character(b, f):
+        return Kanji.lookup(b, read.ucb(f))
+
 
 class Alphanumeric(object):
     FINAL_BYTE = 0x4A
@@ -770,8 +802,7 @@ class Alphanumeric(object):
             val = int(b) & 0xFF
 
         self._args = [val]
-        ch = bytes([val]).decode("ascii")  # strict ASCII
-        self._character = "¥" if ch == "\\" else ch
+        self._character = Alphanumeric.character(val, f)
 
     def __len__(self):
         return len(self._args)
@@ -783,6 +814,11 @@ class Alphanumeric(object):
     def decode(b, f):
         return Alphanumeric(b, f)
 
+    @staticmethod
+    def character(b, f):
+        ch = bytes([b]).decode("ascii")  # strict ASCII
+        return "¥" if ch == "\\" else ch
+
 
 @staticmethod
 def decode(b, f):
@@ -797,9 +833,7 @@ class Hiragana(object):
         self._args = []
         self._args.append(b)
 
-        upper_nibble = (b >> 4) & 0x07
-        lower_nibble = b & 0x0F
-        self._character = Hiragana.ENCODING[lower_nibble][upper_nibble]
+        self._character = Hiragana.character(b, f)
 
     def __len__(self):
         return len(self._args)
@@ -812,6 +846,12 @@ class Hiragana(object):
     def decode(b, f):
         return Hiragana(b, f)
 
+    @staticmethod
+    def character(b, f):
+        upper_nibble = (b >> 4) & 0x07
+        lower_nibble = b & 0x0F
+        return Hiragana.ENCODING[lower_nibble][upper_nibble]
+
     # single byte hiragana coding table ARIB STD-B24 table 7-7 pg.50
     ENCODING = {
         0x0: {
@@ -953,9 +993,7 @@ class Katakana(object):
         self._args = []
         self._args.append(b)
 
-        upper_nibble = (b >> 4) & 0x07
-        lower_nibble = b & 0x0F
-        self._character = Katakana.ENCODING[lower_nibble][upper_nibble]
+        self._character = Katakana.character(b, f)
 
     def __len__(self):
         return len(self._args)
@@ -968,6 +1006,12 @@ class Katakana(object):
     def decode(b, f):
         return Katakana(b, f)
 
+    @staticmethod
+    def character(b, f):
+        upper_nibble = (b >> 4) & 0x07
+        lower_nibble = b & 0x0F
+        return Katakana.ENCODING[lower_nibble][upper_nibble]
+
     # single byte katakana coding table ARIB STD-B24 table 7-6 pg.49
     ENCODING = {
         0x0: {
@@ -1658,6 +1702,16 @@ CODE_SET_TABLE = {
 }
 
 
+# Code sets whose characters can be decoded straight to text without building
+# an instance per character, with their character size in bytes
+TEXT_CODE_SETS = {
+    Kanji.decode: (Kanji.character, 2),
+    Alphanumeric.decode: (Alphanumeric.character, 1),
+    Hiragana.decode: (Hiragana.character, 1),
+    Katakana.decode: (Katakana.character, 1),
+}
+
+
 def in_code_set_table(b):
     """Is this in the code table"""
     return b in CODE_SET_TABLE
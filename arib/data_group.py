@@ -10,13 +10,18 @@ Data group container is the primary container in an ARIB closed
 caption and teletext elementary stream.
 
 """
+import os
 import sys
+import mmap
+import zlib
+import binascii
 from arib import read
 from arib.read import EOFError
 import traceback
 
 from arib.closed_caption import CaptionStatementData
 from arib.closed_caption import CaptionManagementData
+from arib.drcs_cache import DRCS_CACHE
 
 DEBUG = False
 
@@ -117,53 +122,154 @@ class DataGroup(object):
         return ((self._group_id >> 2) & (~0x20)) == 0
 
 
+# Every data group begins with these bytes (data identifier, private stream id
+# and PES data packet header length)
+DATA_GROUP_START = b"\x80\xff\xf0"
+DATA_GROUP_HEADER_SIZE = 8
+DATA_GROUP_CRC_SIZE = 2
+
+# How much of the file to search for a data group start at a time
+SEARCH_BLOCK_SIZE = 64 * 1024
+
+
+def is_data_group_start(f, pos):
+    """
+    Check whether a data group start pattern found at pos looks like the real thing:
+    its group id should be valid, and the data group (as sized by its data_group_size)
+    should pass its CRC-16 check.
+    :param f: file object opened in 'rb' (or read.ByteReader)
+    :param pos: position of the start pattern
+    :return: True if the candidate looks like a data group
+    """
+    f.seek(pos)
+    header = f.read(DATA_GROUP_HEADER_SIZE)
+    if len(header) < DATA_GROUP_HEADER_SIZE:
+        # truncated. let the parser run into the eof.
+        return True
+    group_id = header[3] >> 2
+    if (group_id & (~0x20)) > DataGroup.GroupA_Caption_Statement_lang8:
+        return False
+    data_group_size = (header[6] << 8) | header[7]
+    body = f.read(data_group_size + DATA_GROUP_CRC_SIZE)
+    if len(body) < data_group_size + DATA_GROUP_CRC_SIZE:
+        return True
+    # CRC-16 (ITU-T) runs from the data group id through to the CRC itself
+    return binascii.crc_hqx(body, binascii.crc_hqx(header[len(DATA_GROUP_START) :], 0)) == 0
+
+
 def find_data_group_start(f):
     """
     Find the start of the next data group in a binary file.
-    :param f: file object opened in 'rb'
+    The file is searched a large block at a time and candidates are confirmed
+    via is_data_group_start() before being accepted.
+    :param f: file object opened in 'rb' (or read.ByteReader)
     :return: True if a start pattern is found (and file pos is set to it), else False
     """
-    start_pattern = b"\x80\xff\xf0"
-    window = bytearray()
+    start_pattern = DATA_GROUP_START
+    overlap = len(start_pattern) - 1
+    block_pos = f.tell()
+    carry = b""
 
-    c = f.read(1)
-    while c:
-        filepos = f.tell()  # position *after* reading this byte
-        window += c
-        if len(window) > len(start_pattern):
-            # keep only the last N bytes
-            del window[: -len(start_pattern)]
+    block = f.read(SEARCH_BLOCK_SIZE)
+    while block:
+        # carry the tail of the last block over in case the pattern straddles blocks
+        data = carry + block
+        data_pos = block_pos - len(carry)
+        i = data.find(start_pattern)
+        while i >= 0:
+            if is_data_group_start(f, data_pos + i):
+                # rewind to the start of the matched pattern
+                f.seek(data_pos + i)
+                return True
+            i = data.find(start_pattern, i + 1)
+        carry = data[-overlap:]
+        block_pos += len(block)
+        f.seek(block_pos)
+        block = f.read(SEARCH_BLOCK_SIZE)
 
-        if bytes(window) == start_pattern:
-            # rewind to the start of the matched pattern
-            f.seek(filepos - len(start_pattern))
-            return True
+    return False
 
-        c = f.read(1)
 
-    return False
+class RetransmissionCache(object):
+    """Decode a caption data group only once, however many times it's retransmitted.
+    Broadcasters resend caption management data (and at times statement data) over
+    and over. A copy is recognized by its data group id and version byte (which also
+    tells Group A from Group B) and a CRC-32 of the whole data group, compared against
+    the last data group seen with the same id. The DataGroup decoded from the first
+    copy is handed back again, so results are the same as decoding every copy.
+    """
+
+    def __init__(self):
+        self._last = {}
+        self._skipped = 0
+
+    def data_group(self, data):
+        """
+        :param data: bytes-like data group, starting at its 0x80 0xff 0xf0 header
+        :return: DataGroup decoded from data (or from an identical earlier copy)
+        """
+        if len(data) < DATA_GROUP_HEADER_SIZE:
+            return DataGroup(read.ByteReader(data))
+        group_id = data[3]
+        data_group_size = (data[6] << 8) | data[7]
+        # DRCS glyphs are looked up as statements are decoded, so a DRCS
+        # redefinition since the last copy means decoding again.
+        key = (
+            zlib.crc32(data[: DATA_GROUP_HEADER_SIZE + data_group_size + DATA_GROUP_CRC_SIZE]),
+            DRCS_CACHE.generation(),
+        )
+        last = self._last.get(group_id)
+        if last is not None and last[0] == key:
+            self._skipped += 1
+            return last[1]
+        data_group = DataGroup(read.ByteReader(data))
+        self._last[group_id] = (key, data_group)
+        return data_group
+
+    def skipped(self):
+        """Number of retransmitted data groups not decoded again"""
+        return self._skipped
 
 
 def next_data_group(filepath):
-    f = open(filepath, "rb")
+    """Generator of the data groups in an elementary stream (.es) file.
+    The file is memory mapped and parsed in place via a read.ByteReader.
+    """
+    with open(filepath, "rb") as _file:
+        if os.fstat(_file.fileno()).st_size == 0:
+            return
+        _map = mmap.mmap(_file.fileno(), 0, prot=mmap.PROT_READ)
+        try:
+            yield from _next_data_group(read.ByteReader(_map))
+        finally:
+            try:
+                _map.close()
+            except BufferError:
+                # views into the map are still held. it's freed with them.
+                pass
+
+
+def _next_data_group(f):
     try:
         data_group = DataGroup(f)
         while data_group:
             yield data_group
-            try:
-                data_group = DataGroup(f)
-            except EOFError:
-                break
-            except Exception:
-                print("Exception thrown while parsing data group from .es.")
-                traceback.print_exc(file=sys.stdout)
-                print("Looking for new data group in .es")
-                found = find_data_group_start(f)
-                if found:
+            data_group = None
+            # parse the next data group, looking for the start of a new one
+            # for as long as what's found won't parse
+            while data_group is None:
+                try:
+                    data_group = DataGroup(f)
+                except EOFError:
+                    return
+                except Exception:
+                    print("Exception thrown while parsing data group from .es.")
+                    traceback.print_exc(file=sys.stdout)
+                    print("Looking for new data group in .es")
+                    if not find_data_group_start(f):
+                        print("Data group not found. Bailing.")
+                        return
                     print("Data group found. Continuing.")
-                    continue
-                print("Data group not found. Bailing.")
-                break
     except EOFError:
         # we can quite rightly run into eof here. in that case just bail
         pass
@@ -171,5 +277,3 @@ def next_data_group(filepath):
         if DEBUG:
             print("Exception throw while parsing data group from .es")
             traceback.print_exc(file=sys.stdout)
-    finally:
-        f.close()
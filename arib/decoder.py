@@ -8,12 +8,14 @@ DATE: Friday, March 15th 2014
 
 """
 
+import functools
+
 from arib import read
-from arib.control_characters import is_control_character
-from arib.control_characters import handle_control_character
 import arib.control_characters as control_char
 from arib import code_set
 from arib.arib_exceptions import DecodingError
+from arib.tokens import Tokens
+from arib.tokens import PLAIN_CONTROL_CHARACTERS
 
 DEBUG = False
 
@@ -53,6 +55,65 @@ def is_gr_character(char):
     return ub > 0x09
 
 
+# Code areas of ARIB STD-B24 figure 7-1, less the control characters
+# (SP and DEL) found at their edges
+GL_AREA = slice(0x21, 0x7F)
+GR_AREA = slice(0xA0, 0x100)
+
+
+def _control_character_entry(handler):
+    """Adapt a control character handler to a dispatch table entry"""
+
+    def entry(b, f):
+        return handler(f)
+
+    return entry
+
+
+def _undefined_entry(b, f):
+    """Dispatch table entry for bytes that decode to nothing"""
+    return None
+
+
+def _build_default_table():
+    """Dispatch table of all 256 byte values for a decoder in its default state:
+    Kanji invoked into the GL area and Hiragana into the GR area.
+    """
+    table = [_undefined_entry] * 256
+    for code, handler in control_char.COMMAND_TABLE.items():
+        table[code] = _control_character_entry(handler)
+    table[GL_AREA] = [code_set.Kanji.decode] * (GL_AREA.stop - GL_AREA.start)
+    table[GR_AREA] = [code_set.Hiragana.decode] * (GR_AREA.stop - GR_AREA.start)
+    return table
+
+
+DEFAULT_TABLE = _build_default_table()
+
+# Control characters which change the decoder's encoding state
+ENCODING_CONTROL_CODES = frozenset(
+    [
+        control_char.LS0.CODE,
+        control_char.LS1.CODE,
+        control_char.SS2.CODE,
+        control_char.SS3.CODE,
+        control_char.ESC.CODE,
+    ]
+)
+
+# Control characters which can go into a token stream without decoding them
+UNDECODED_CONTROL_CODES = frozenset(PLAIN_CONTROL_CHARACTERS) - ENCODING_CONTROL_CODES
+
+# Decoding straight to text for characters, by byte value, in the default state.
+# See code_set.TEXT_CODE_SETS
+DEFAULT_TEXT_TABLE = [None] * 256
+DEFAULT_TEXT_TABLE[GL_AREA] = [code_set.TEXT_CODE_SETS[code_set.Kanji.decode]] * (
+    GL_AREA.stop - GL_AREA.start
+)
+DEFAULT_TEXT_TABLE[GR_AREA] = [code_set.TEXT_CODE_SETS[code_set.Hiragana.decode]] * (
+    GR_AREA.stop - GR_AREA.start
+)
+
+
 class Decoder(object):
     """Decode a stream of bytes into an array
     of classes representing a decoded teletext packet payload
@@ -78,6 +139,20 @@ class Decoder(object):
         self._GL = self._G0
         self._GR = self._G2
 
+        # Every byte value is dispatched through this table. Control characters
+        # which change the encoding state get methods of this decoder, and the GL
+        # and GR areas hold the decode functions of their current code sets.
+        self._table = table = list(DEFAULT_TABLE)
+        table[control_char.LS0.CODE] = self._locking_shift_0
+        table[control_char.LS1.CODE] = self._locking_shift_1
+        table[control_char.SS2.CODE] = self._single_shift_2
+        table[control_char.SS3.CODE] = self._single_shift_3
+        table[control_char.ESC.CODE] = self._escape
+        self._gl_decode = code_set.Kanji.decode
+        self._gr_decode = code_set.Hiragana.decode
+        # Text decoding for the same (where the code set supports it)
+        self._text_table = list(DEFAULT_TEXT_TABLE)
+
     def decode(self, f):
         """Return an object representing the current character"""
         b = read.ucb(f)
@@ -90,72 +165,139 @@ class Decoder(object):
         # to G0, G2, G3, G4 invocation?
         # 3) What is the designation (active encoding) for the current invocation.
         # e.g. is g0 loaded with 2 byte kanji? or single byte hiragana etc?
-        statement = None
-        # handle the current character for current encoding
-        if is_control_character(b):
-            statement = handle_control_character(b, f)
-        elif is_gl_character(b):
-            statement = self._GL(b, f)
-        elif is_gr_character(b):
-            statement = self._GR(b, f)
-
-        # possible internal encoding state change via returned control character.
-        self.handle_encoding_change(statement)
+        # All of which is kept up to date in the dispatch table.
+        if self._single_shift is None:
+            return self._table[b](b, f)
+        return self._decode_single_shifted(b, f)
 
-        return statement
-
-    def handle_encoding_change(self, control_code):
-        """Given first character c, read from f and change current
-        encoding appropriately
+    def decode_tokens(self, f, bytes_to_read):
+        """Decode bytes_to_read bytes of statement into a tokens.Tokens instance.
+        Characters are decoded straight to text and merged into runs, and control
+        characters without parameters are never instantiated.
         """
-        # print 'handle_encoding_change'
+        tokens = Tokens()
+        codes = tokens.codes
+        params = tokens.params
+        run = []
+        bytes_read = 0
+        text_table = self._text_table
+        table = self._table
+        if type(f) is read.ByteReader:
+            ucb = f.ucb
+        else:
+            ucb = functools.partial(read.ucb, f)
+        while bytes_read < bytes_to_read:
+            b = ucb()
+            if self._single_shift is None:
+                character = text_table[b]
+                if character is not None:
+                    run.append(character[0](b, f))
+                    bytes_read += character[1]
+                    continue
+                if run:
+                    tokens.append_text("".join(run))
+                    run = []
+                if b in UNDECODED_CONTROL_CODES:
+                    codes.append(b)
+                    params.append(0)
+                    bytes_read += 1
+                    continue
+                statement = table[b](b, f)
+            else:
+                if run:
+                    tokens.append_text("".join(run))
+                    run = []
+                statement = self._decode_single_shifted(b, f)
+            if statement:
+                bytes_read += len(statement)
+                tokens.append(statement)
+        if run:
+            tokens.append_text("".join(run))
+        tokens.trim()
+        return tokens
+
+    def _decode_single_shifted(self, b, f):
         # If we have a saved control set hanging around, this means the current
         # was set by SINGLE (NON LOCKING) SHIFT, so revert back to the saved
-        if self._single_shift:
-            self._GL.set(self._single_shift)
-            self._single_shift = None
+        # after decoding one character.
+        if is_gl_character(b) or is_gr_character(b):
+            statement = self._table[b](b, f)
+            self._end_single_shift()
+            return statement
+        self._end_single_shift()
+        return self._table[b](b, f)
 
-        # Handle single byte dedicated control codes
-        if isinstance(control_code, control_char.LS0):
-            if DEBUG:
-                print("switching _GL to table G0")
-            self._GL = self._G0
-            return
-        if isinstance(control_code, control_char.LS1):
-            if DEBUG:
-                print("switching GL to table G1")
-            self._GL = self._G1
-            return
-        if isinstance(control_code, control_char.SS2):
-            # this is a single shift operator, so store the current mapping
-            # The stored value will be set back to active after decoding one character
-            if DEBUG:
-                print("setting table GL to single shift G2")
-            self._single_shift = self._GL.get()
-            self._GL = self._G2
-            return
-        if isinstance(control_code, control_char.SS3):
-            # this is a single shift operator, so store the current mapping
-            # The stored value will be set back to active after decoding one character
-            if DEBUG:
-                print("setting table GL to single shift GL")
-            self._single_shift = self._GL.get()
-            self._GL = self._G3
-            return
+    def _update_table(self):
+        """Point the GL and GR areas of the dispatch table at their current code sets"""
+        gl_decode = self._GL.get()
+        if gl_decode is not self._gl_decode:
+            self._table[GL_AREA] = [gl_decode] * (GL_AREA.stop - GL_AREA.start)
+            self._text_table[GL_AREA] = [code_set.TEXT_CODE_SETS.get(gl_decode)] * (
+                GL_AREA.stop - GL_AREA.start
+            )
+            self._gl_decode = gl_decode
+        gr_decode = self._GR.get()
+        if gr_decode is not self._gr_decode:
+            self._table[GR_AREA] = [gr_decode] * (GR_AREA.stop - GR_AREA.start)
+            self._text_table[GR_AREA] = [code_set.TEXT_CODE_SETS.get(gr_decode)] * (
+                GR_AREA.stop - GR_AREA.start
+            )
+            self._gr_decode = gr_decode
+
+    def _end_single_shift(self):
+        self._GL.set(self._single_shift)
+        self._single_shift = None
+        self._update_table()
+
+    def _locking_shift_0(self, b, f):
+        if DEBUG:
+            print("switching _GL to table G0")
+        statement = control_char.LS0.handler(f)
+        self._GL = self._G0
+        self._update_table()
+        return statement
 
-        if not isinstance(control_code, control_char.ESC):
-            return
+    def _locking_shift_1(self, b, f):
+        if DEBUG:
+            print("switching GL to table G1")
+        statement = control_char.LS1.handler(f)
+        self._GL = self._G1
+        self._update_table()
+        return statement
+
+    def _single_shift_2(self, b, f):
+        # this is a single shift operator, so store the current mapping
+        # The stored value will be set back to active after decoding one character
+        if DEBUG:
+            print("setting table GL to single shift G2")
+        statement = control_char.SS2.handler(f)
+        self._single_shift = self._GL.get()
+        self._GL = self._G2
+        self._update_table()
+        return statement
 
+    def _single_shift_3(self, b, f):
+        # this is a single shift operator, so store the current mapping
+        # The stored value will be set back to active after decoding one character
+        if DEBUG:
+            print("setting table GL to single shift GL")
+        statement = control_char.SS3.handler(f)
+        self._single_shift = self._GL.get()
+        self._GL = self._G3
+        self._update_table()
+        return statement
+
+    def _escape(self, b, f):
+        control_code = control_char.ESC.handler(f)
         if control_code.is_invocation():
             if DEBUG:
                 print("control code invocation.")
             control_code.invoke(self)
-            return
-
-        if control_code.is_designation():
+        elif control_code.is_designation():
             if DEBUG:
                 print("control code designation")
             control_code.designate(self)
-            return
-
-        raise DecodingError()
+        else:
+            raise DecodingError()
+        self._update_table()
+        return control_code
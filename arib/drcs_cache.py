@@ -1,8 +1,12 @@
 from dataclasses import dataclass
-from typing import Tuple, Optional
+from typing import Callable, Tuple, Optional
 from collections import OrderedDict
+import contextlib
+import contextvars
 import threading
 from arib import read
+from arib.arib_exceptions import DecodingError
+from arib.drcs_decoder import drcs_unpack_to_bitmap
 
 
 def normalize_94(b: int) -> int:
@@ -54,19 +58,36 @@ class DrcsGlyph:
     baseline: int = 0
     advance: int = 0
 
-    def __init__(self, f):
-        b = read.ucb(f)  # 1 byte: [font_id(4 bits)][mode(4 bits)]
+    # font id/mode, depth, width and height bytes
+    HEADER_SIZE = 4
+    DEPTHS = (1, 2, 4)
+
+    def __init__(self, f, end: Optional[int] = None):
+        """
+        :param f: file descriptor or read.ByteReader we're reading from
+        :param end: position the glyph must end by (end of its data unit), if known
+        """
+        if end is not None and f.tell() + DrcsGlyph.HEADER_SIZE > end:
+            raise DecodingError("DRCS glyph header runs past the end of its data unit")
+        b, depth_bits, width, height = read.buffer(f, DrcsGlyph.HEADER_SIZE)
+        # 1 byte: [font_id(4 bits)][mode(4 bits)]
         self.font_id = (b & 0xF0) >> 4
         self.mode = b & 0x0F
 
         # Many DRCS variants then carry depth/width/height as single bytes:
-        self.depth_bits = read.ucb(f)  # expect 1, 2, or 4
-        self.width = read.ucb(f)
-        self.height = read.ucb(f)
+        if depth_bits not in DrcsGlyph.DEPTHS:
+            raise DecodingError(f"Unsupported DRCS glyph depth: {depth_bits}")
+        self.depth_bits = depth_bits
+        self.width = width
+        self.height = height
 
         pixels = self.width * self.height
         bytes_needed = (pixels * self.depth_bits + 7) // 8
-        self.bitmap = bytearray(read.ucb(f) for _ in range(bytes_needed))
+        if end is not None and f.tell() + bytes_needed > end:
+            raise DecodingError(
+                f"DRCS glyph {width}x{height}x{depth_bits} runs past the end of its data unit"
+            )
+        self.bitmap = read.buffer(f, bytes_needed)
 
     # def __str__(self):
     #     px = ""
@@ -88,6 +109,15 @@ class DrcsGlyph:
     #         px += "\n"
     #     return px
 
+    def pack(self) -> bytes:
+        """The glyph in the form it's read from (header then bitmap)"""
+        header = bytes((self.font_id << 4 | self.mode, self.depth_bits, self.width, self.height))
+        return header + bytes(self.bitmap)
+
+    def content_key(self) -> Tuple[int, int, int, bytes]:
+        """Hashable key of everything that determines how this glyph is drawn"""
+        return (self.width, self.height, self.depth_bits, bytes(self.bitmap))
+
     def __str__(self):
         # expand to 2D pixels
         pixels = drcs_unpack_to_bitmap(self.width, self.height, self.bitmap, depth=self.depth_bits)
@@ -103,57 +133,8 @@ class DrcsGlyph:
         else:
             chars = ["?"]  # fallback
 
-        lines = []
-        for row in pixels:
-            line = "".join(chars[val] if val < len(chars) else "?" for val in row)
-            lines.append(line)
-
-        return "\n".join(lines)
-
-
-def drcs_unpack_to_bitmap(width, height, data, depth=2):
-    """
-    width, height: pixels
-    data: bytes/bytearray (packed: left->right, top->bottom)
-    depth: bits per pixel (1, 2, or 4)
-    returns: 2D list [height][width] with values 0..(2**depth-1)
-    """
-    assert depth in (1, 2, 4), "Handle common DRCS depths; extend if needed."
-
-    if depth == 1:
-        masks_shifts = [(1 << (7 - i), 7 - i) for i in range(8)]  # 8 px/byte
-    elif depth == 2:
-        masks_shifts = [((3 << 6), 6), ((3 << 4), 4), ((3 << 2), 2), ((3 << 0), 0)]  # 4 px/byte
-    else:  # depth == 4
-        masks_shifts = [((0xF << 4), 4), ((0xF << 0), 0)]  # 2 px/byte
-
-    px_per_byte = len(masks_shifts)
-    total_px = width * height
-    expected_bytes = (total_px + px_per_byte - 1) // px_per_byte
-
-    # Be lenient: if the stream is short, pad; if it's long, ignore extras.
-    if len(data) < expected_bytes:
-        data = bytes(data) + bytes(expected_bytes - len(data))
-    elif len(data) > expected_bytes:
-        data = data[:expected_bytes]
-
-    out = [[0] * width for _ in range(height)]
-    x = y = 0
-
-    for b in data:
-        for mask, shift in masks_shifts:
-            if y >= height:
-                break
-            val = (b & mask) >> shift
-            out[y][x] = val
-            x += 1
-            if x >= width:
-                x = 0
-                y += 1
-        if y >= height:
-            break
-
-    return out
+        palette = chars + ["?"] * (256 - len(chars))
+        return "\n".join("".join(map(palette.__getitem__, row)) for row in pixels)
 
 
 def drcs_unpack_glyph(glyph: DrcsGlyph):
@@ -162,11 +143,25 @@ def drcs_unpack_glyph(glyph: DrcsGlyph):
     )
 
 
-class _DrcsCache:
-    def __init__(self, max_glyphs: int = 4096):
+class DrcsCache:
+    """LRU cache of the DRCS glyphs defined so far in a stream, keyed on (set id, code)"""
+
+    def __init__(self, max_glyphs: int = 4096, max_drawings: Optional[int] = None):
+        """
+        :param max_glyphs: glyphs kept before the least recently used is dropped
+        :param max_drawings: glyph contents whose drawings are kept (max_glyphs if None).
+          Drawings are also dropped with their glyph's last definition.
+        """
         self._lock = threading.RLock()
         self._store: "OrderedDict[Tuple[int,int], DrcsGlyph]" = OrderedDict()
         self._max = max_glyphs
+        self._generation = 0
+        # rendered drawings of glyphs, keyed on DrcsGlyph.content_key() then render
+        # callable. Least recently used first.
+        self._drawings: "OrderedDict[Tuple[int, int, int, bytes], dict[Callable, str]]" = (
+            OrderedDict()
+        )
+        self._max_drawings = max_glyphs if max_drawings is None else max_drawings
 
     def _key(self, set_id: int, code: int) -> Tuple[int, int]:
         return (set_id, code)
@@ -176,11 +171,13 @@ class _DrcsCache:
             k = self._key(set_id, code)
             if k in self._store:
                 # re-definition: overwrite and move to end (LRU refresh)
-                del self._store[k]
+                self._forget_drawing(self._store.pop(k), glyph)
             self._store[k] = glyph
+            self._generation += 1
             # enforce LRU limit
             while len(self._store) > self._max:
-                self._store.popitem(last=False)
+                _, evicted = self._store.popitem(last=False)
+                self._forget_drawing(evicted)
 
     def get(self, set_id: int, code: int) -> Optional[DrcsGlyph]:
         with self._lock:
@@ -194,10 +191,91 @@ class _DrcsCache:
     def clear(self) -> None:
         with self._lock:
             self._store.clear()
+            self._drawings.clear()
+            self._generation += 1
+
+    def drawing(self, glyph: Optional[DrcsGlyph], render: Callable[[DrcsGlyph], str]) -> str:
+        """Return render(glyph), memoized on the glyph's content until its code is redefined.
+        Used to draw the same DRCS glyph over and over without rebuilding it each time.
+        Drawings are kept per render callable, so it should be a long lived one.
+        Glyphs needn't be in the cache (sidecar glyphs aren't), so the drawings are an
+        LRU cache of their own too.
+        """
+        if glyph is None:
+            return render(glyph)
+        key = glyph.content_key()
+        with self._lock:
+            drawings = self._drawings.get(key)
+            if drawings is None:
+                drawings = self._drawings[key] = {}
+                while len(self._drawings) > self._max_drawings:
+                    self._drawings.popitem(last=False)
+            else:
+                self._drawings.move_to_end(key)
+            drawing = drawings.get(render)
+            if drawing is None:
+                drawing = render(glyph)
+                drawings[render] = drawing
+            return drawing
+
+    def drawings(self) -> int:
+        """Number of glyph contents with drawings kept"""
+        with self._lock:
+            return len(self._drawings)
+
+    def _forget_drawing(self, old: DrcsGlyph, new: Optional[DrcsGlyph] = None) -> None:
+        key = old.content_key()
+        if new is None or new.content_key() != key:
+            self._drawings.pop(key, None)
+
+    def generation(self) -> int:
+        """Count of changes made to the cache. Changes whenever a glyph is (re)defined."""
+        return self._generation
+
+
+# the cache used by the current thread (or asyncio task). See use_drcs_cache()
+_current_cache: "contextvars.ContextVar[DrcsCache]" = contextvars.ContextVar(
+    "drcs_cache", default=DrcsCache()
+)
+
+
+@contextlib.contextmanager
+def use_drcs_cache(cache: DrcsCache):
+    """Make DRCS_CACHE refer to cache within the with block (in this thread or task only).
+    Lets several conversions run side by side, each with its own glyphs.
+    """
+    token = _current_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _current_cache.reset(token)
+
+
+class _CurrentDrcsCache:
+    """Forwards to the DrcsCache in use by the current thread or task"""
+
+    def put(self, set_id: int, code: int, glyph: DrcsGlyph) -> None:
+        _current_cache.get().put(set_id, code, glyph)
+
+    def get(self, set_id: int, code: int) -> Optional[DrcsGlyph]:
+        return _current_cache.get().get(set_id, code)
+
+    def clear(self) -> None:
+        _current_cache.get().clear()
+
+    def drawing(self, glyph: Optional[DrcsGlyph], render: Callable[[DrcsGlyph], str]) -> str:
+        return _current_cache.get().drawing(glyph, render)
+
+    def generation(self) -> int:
+        return _current_cache.get().generation()
+
+    def current(self) -> DrcsCache:
+        return _current_cache.get()
 
 
 # a module level static cache. Access this cache in other modules to set/get characters.
-DRCS_CACHE = _DrcsCache()
+# Unless use_drcs_cache() says otherwise, it's one process wide cache.
+DRCS_CACHE = _CurrentDrcsCache()
 
 
 # Helper for 2-byte DRCS-0 code:
@@ -11,7 +11,52 @@ bmp = drcs_unpack_to_bitmap(font._width, font._height, font._pixels, depth=font.
 path = bitmap_to_ass_path(bmp, alpha_threshold=1)
 text = ass_draw_dialogue(path, x=100, y=200)
 
+Bitmaps are unpacked a whole byte at a time, through a table of the pixels
+in each of the 256 byte values (or via NumPy, if it's installed).
+
 """
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _pixel_table(depth):
+    """The pixels (leftmost first) packed into each byte value at the given depth"""
+    px_per_byte = 8 // depth
+    mask = (1 << depth) - 1
+    return [
+        bytes((b >> (8 - depth * (i + 1))) & mask for i in range(px_per_byte)) for b in range(256)
+    ]
+
+
+PIXEL_TABLES = {depth: _pixel_table(depth) for depth in (1, 2, 4)}
+
+
+class DrcsBitmap(object):
+    """Unpacked DRCS bitmap: one byte per pixel, row after row.
+    Indexes like the 2D list [height][width] it replaces: bitmap[y] is the row y
+    and bitmap[y][x] the value (0..2**depth-1) of the pixel at x, y.
+    """
+
+    __slots__ = ("width", "height", "pixels")
+
+    def __init__(self, width, height, pixels):
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.height:
+            raise IndexError("DRCS bitmap row out of range")
+        return self.pixels[y * self.width : (y + 1) * self.width]
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield self.pixels[y * self.width : (y + 1) * self.width]
 
 
 def drcs_unpack_to_bitmap(width, height, data, depth=2):
@@ -19,41 +64,25 @@ def drcs_unpack_to_bitmap(width, height, data, depth=2):
     width, height: pixels
     data: bytes/bytearray (packed: left->right, top->bottom)
     depth: bits per pixel (1, 2, or 4)
-    returns: 2D list [height][width] with values 0..(2**depth-1)
+    returns: DrcsBitmap of height rows of width values 0..(2**depth-1)
     """
     assert depth in (1, 2, 4), "Handle common DRCS depths; extend if needed."
 
-    if depth == 1:
-        masks_shifts = [(1 << (7 - i), 7 - i) for i in range(8)]  # 8 px/byte
-    elif depth == 2:
-        masks_shifts = [((3 << 6), 6), ((3 << 4), 4), ((3 << 2), 2), ((3 << 0), 0)]  # 4 px/byte
-    else:  # depth == 4
-        masks_shifts = [((0xF << 4), 4), ((0xF << 0), 0)]  # 2 px/byte
-
-    px_per_byte = len(masks_shifts)
+    px_per_byte = 8 // depth
     total_px = width * height
     expected_bytes = (total_px + px_per_byte - 1) // px_per_byte
 
     # Be lenient: if the stream is short, pad; if it's long, ignore extras.
+    data = bytes(data[:expected_bytes])
     if len(data) < expected_bytes:
-        data = bytes(data) + bytes(expected_bytes - len(data))
-    elif len(data) > expected_bytes:
-        data = data[:expected_bytes]
-
-    out = [[0] * width for _ in range(height)]
-    x = y = 0
-
-    for b in data:
-        for mask, shift in masks_shifts:
-            if y >= height:
-                break
-            val = (b & mask) >> shift
-            out[y][x] = val
-            x += 1
-            if x >= width:
-                x = 0
-                y += 1
-        if y >= height:
-            break
-
-    return out
+        data += bytes(expected_bytes - len(data))
+
+    if numpy is not None:
+        packed = numpy.frombuffer(data, dtype=numpy.uint8)
+        shifts = numpy.arange(8 - depth, -1, -depth, dtype=numpy.uint8)
+        pixels = ((packed[:, None] >> shifts) & ((1 << depth) - 1)).tobytes()
+    else:
+        pixels = b"".join(map(PIXEL_TABLES[depth].__getitem__, data))
+
+    # the last byte may hold padding past the final pixel
+    return DrcsBitmap(width, height, pixels[:total_px])
@@ -20,6 +20,7 @@ from arib.closed_caption import StatementBody
 import arib.code_set as code_set
 import arib.control_characters as control_characters
 from arib.data_group import next_data_group
+from arib.tokens import Tokens
 
 # print out some additional info for DRCS values
 from arib.closed_caption import set_DRCS_debug
@@ -77,6 +78,8 @@ def formatter(statements, timestamp):
     # line = ''.join(s for s in statements if type(s) in DISPLAYED_CC_STATEMENTS)
     # return line
     allowed = tuple(DISPLAYED_CC_STATEMENTS)
+    if isinstance(statements, Tokens):
+        return statements.to_string(allowed)
     return "".join(str(s) for s in statements if isinstance(s, allowed))
 
 
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+Module: timeline
+Desc: Find the byte offsets of times in an MPEG TS file, off PCRs sampled through it.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+Times are seconds since the first PCR of the file (on the PCR PID), the same time line
+arib-ts2ass gives captions. The 33 bit clock is allowed to wrap, and across a discontinuity
+(the PCR stepping backward, or forward by more than TS.PCR_MAX_GAP from one PCR to the
+next) time carries on from where it was.
+
+The file is memory mapped and PCRs are read from packet aligned positions spread through
+it, so only the pages holding those packets are read. Where the PCR steps too far between
+two of them, more are looked at in between until the discontinuity (if any) is found.
+
+"""
+
+import os
+import sys
+import mmap
+import bisect
+import argparse
+
+from arib.mpeg.ts import TS
+from arib.mpeg.ts import PSI
+
+# bytes between the PCRs first sampled through the file
+SAMPLE_BYTES = 4 * 1024 * 1024
+# bytes searched for the PAT and PMT when the PCR PID isn't given
+PSI_SCAN_BYTES = 16 * 1024 * 1024
+# a time is looked up to within this many packets
+SEARCH_PACKETS = 64
+
+
+def find_pcr_pid(filename, max_bytes=PSI_SCAN_BYTES):
+    """
+    PCR PID of the program carrying closed captions, as found in the PMT near the start of
+    the file. Failing that, the first PID carrying a PCR.
+    :return: PID, or -1 if no PCR was found
+    """
+    ts = TS(filename)
+    ts.set_range(0, max_bytes)
+    pcr_pids = []
+
+    def OnCaptionPID(caption_pid, pcr_pid):
+        if pcr_pid != PSI.NULL_PID:
+            pcr_pids.insert(0, pcr_pid)
+            ts.stop()
+
+    def OnPCR(pid, pcr):
+        if not pcr_pids:
+            pcr_pids.append(pid)
+
+    ts.OnCaptionPID = OnCaptionPID
+    ts.OnPCR = OnPCR
+    ts.Parse()
+    return pcr_pids[0] if pcr_pids else -1
+
+
+class PCRTimeline(object):
+    """
+    Maps times to byte offsets in a TS file by binary search on the PCRs of the
+    packets sampled through a memory map of it.
+    Points on the time line are (offset, PCR, 90kHz ticks since the first PCR) tuples.
+    """
+
+    def __init__(self, filename, pcr_pid=-1, sample_bytes=SAMPLE_BYTES):
+        """
+        :param filename: MPEG TS file
+        :param pcr_pid: PID carrying the PCR. Found from the PMT if < 0
+        :param sample_bytes: bytes between the PCRs first sampled
+        """
+        self.filename = filename
+        self.pcr_pid = pcr_pid if pcr_pid >= 0 else find_pcr_pid(filename)
+        with open(filename, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) if self.size else b""
+        try:
+            self._points = self._sample(sample_bytes)
+        except BaseException:
+            self.close()
+            raise
+        self._ticks = [p[2] for p in self._points]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = b""
+
+    def duration(self):
+        """Seconds from the first PCR to the last one sampled"""
+        return float(self._ticks[-1]) / TS.PCR_HZ
+
+    def find(self, seconds):
+        """
+        The points either side of a time: the last PCR at or before it and the first
+        one after it, to within SEARCH_PACKETS packets.
+        :param seconds: seconds since the first PCR
+        :return: (before, after). before is None for times before the first PCR,
+          after is None for times past the last PCR sampled.
+        """
+        target = round(seconds * TS.PCR_HZ)
+        i = bisect.bisect_right(self._ticks, target)
+        if i == 0:
+            return None, self._points[0]
+        if i == len(self._points):
+            return self._points[-1], None
+        lo, hi = self._points[i - 1], self._points[i]
+        while hi[0] - lo[0] > SEARCH_PACKETS * TS.PACKET_SIZE:
+            found = self._pcr_at(self._middle(lo[0], hi[0]), hi[0])
+            if found is None:
+                # no PCR in the upper half, so none closer to hi
+                break
+            offset, pcr = found
+            # lo and hi are on the same side of any discontinuity
+            point = (offset, pcr, lo[2] + TS.pcr_delta(lo[1], pcr))
+            if point[2] <= target:
+                lo = point
+            else:
+                hi = point
+        return lo, hi
+
+    def byte_range(self, start=None, end=None):
+        """
+        Byte offsets of the packets to parse to cover a time range.
+        :param start: seconds since the first PCR (start of file if None)
+        :param end: seconds since the first PCR (end of file if None)
+        :return: (start offset, end offset or None, start point or None). Parsing begins
+          at the PCR packet of the start point, so its PCR gives the time there.
+        """
+        start_offset, start_point = 0, None
+        if start is not None:
+            start_point, _ = self.find(start)
+            if start_point is not None:
+                start_offset = start_point[0]
+        end_offset = None
+        if end is not None:
+            _, end_point = self.find(end)
+            if end_point is not None:
+                end_offset = max(end_point[0], start_offset)
+        return start_offset, end_offset, start_point
+
+    def _sample(self, sample_bytes):
+        first = self._pcr_at(0) if self.pcr_pid >= 0 else None
+        if first is None:
+            raise ValueError(f"No PCR found in {self.filename}")
+        points = [first + (0,)]
+        step = max(sample_bytes // TS.PACKET_SIZE, 1) * TS.PACKET_SIZE
+        for pos in range(first[0] + step, self.size, step):
+            found = self._pcr_at(pos, pos + step)
+            if found is not None:
+                points.extend(self._bridge(points[-1], found))
+        return points
+
+    def _bridge(self, a, b):
+        """
+        Points from just after point a up to the PCR b at a later offset, with times
+        worked out from a's. If the PCR steps too far between them, look in between
+        for where it jumps.
+        :param a: (offset, pcr, ticks) point
+        :param b: (offset, pcr)
+        :return: list of points, ending with b's
+        """
+        delta = TS.pcr_delta(a[1], b[1])
+        if 0 <= delta <= TS.PCR_MAX_GAP:
+            return [b + (a[2] + delta,)]
+        found = self._pcr_at(self._middle(a[0], b[0]), b[0])
+        if found is None:
+            found = self._pcr_at(a[0] + TS.PACKET_SIZE, b[0])
+        if found is None:
+            # a and b are consecutive PCRs, with a discontinuity between them.
+            # time stands still across it.
+            return [b + (a[2],)]
+        points = self._bridge(a, found)
+        return points + self._bridge(points[-1], b)
+
+    @staticmethod
+    def _middle(lo, hi):
+        """Packet aligned offset half way between two packet offsets (and past lo)"""
+        packets = (hi - lo) // TS.PACKET_SIZE
+        return lo + max(packets // 2, 1) * TS.PACKET_SIZE
+
+    def _pcr_at(self, pos, end=None):
+        """
+        The first PCR on the PCR PID in a packet starting at or after pos (and before end).
+        :return: (offset, pcr) or None
+        """
+        data = self._map
+        size = TS.PACKET_SIZE
+        end = self.size if end is None else min(end, self.size)
+        while pos + size <= end:
+            if data[pos] != TS.SYNC_BYTE:
+                pos = TS.sync_offset(data, pos)
+                if pos < 0:
+                    break
+                continue
+            pid = ((data[pos + 1] & 0x1F) << 8) | data[pos + 2]
+            if pid == self.pcr_pid:
+                pcr = TS.get_pcr(data[pos : pos + size])
+                if pcr > 0:
+                    return pos, pcr
+            pos += size
+        return None
+
+
+def find_time_range(filename, start=None, end=None, pcr_pid=-1):
+    """
+    Byte offsets of the packets in a TS file between two times.
+    :param filename: MPEG TS file
+    :param start: seconds since the first PCR (start of file if None)
+    :param end: seconds since the first PCR (end of file if None)
+    :param pcr_pid: PID carrying the PCR. Found from the PMT if < 0
+    :return: (start offset, end offset or None, start point or None). See
+      PCRTimeline.byte_range()
+    """
+    with PCRTimeline(filename, pcr_pid) as timeline:
+        return timeline.byte_range(start, end)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the byte offsets of times in an MPEG TS file off its PCRs."
+    )
+    parser.add_argument("infile", help="Input filename (MPEG2 Transport Stream File)", type=str)
+    parser.add_argument("times", help="Times (seconds since the first PCR)", type=float, nargs="*")
+    parser.add_argument("--pcr-pid", help="PID carrying the PCR.", type=int, default=-1)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.infile):
+        print("Input filename :" + args.infile + " does not exist.")
+        sys.exit(-1)
+
+    with PCRTimeline(args.infile, args.pcr_pid) as timeline:
+        print(f"PCR PID: {timeline.pcr_pid} duration: {timeline.duration():.3f} s")
+        for t in args.times:
+            before, after = timeline.find(t)
+            print(f"{t:.3f} s: after {before} before {after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,10 @@ DATE: Thursday, October 20th 2016
 """
 import os
 import sys
+import time
+import stat
+import queue
+import threading
 import argparse
 import struct
 
@@ -16,10 +20,22 @@ import struct
 import mmap
 
 
+class SyncError(Exception):
+    """Data that should be TS packets has no sync byte where a packet should start
+    (and none within a packet's length of it either), so isn't a transport stream."""
+
+
 class ES:
     """very minimalistic Elementary Stream handling"""
 
     STREAM_ID_INDEX = 3
+    # start code, stream id and PES packet length: what's needed to know what a PES
+    # carries and how long it is
+    PES_PREFIX_SIZE = 6
+
+    # PES stream_id values carrying private data (ARIB closed captions)
+    PRIVATE_STREAM_1 = 0xBD
+    PRIVATE_STREAM_2 = 0xBF
 
     @staticmethod
     def pes_packet_check_formedness(payload):
@@ -36,17 +52,50 @@ class ES:
     def get_pes_stream_id(payload):
         return payload[ES.STREAM_ID_INDEX]
 
+    @staticmethod
+    def is_private_stream(payload):
+        """Does this PES carry private data (as opposed to video or audio)?"""
+        if len(payload) <= ES.STREAM_ID_INDEX:
+            return False
+        stream_id = payload[ES.STREAM_ID_INDEX]
+        return stream_id == ES.PRIVATE_STREAM_1 or stream_id == ES.PRIVATE_STREAM_2
+
     @staticmethod
     def get_pes_packet_length(payload):
-        if len(payload) < 6:
+        if len(payload) < ES.PES_PREFIX_SIZE:
             return 0
         # we add 6 for start code, stream id and pes packet length itself
-        return struct.unpack(">H", payload[4:6])[0] + 6
+        return struct.unpack(">H", payload[4:6])[0] + ES.PES_PREFIX_SIZE
 
     @staticmethod
     def get_pes_flags(payload):
         return struct.unpack(">H", payload[6:8])[0]
 
+    @staticmethod
+    def get_pts(payload):
+        """Presentation Time Stamp (33 bits, 90kHz) from the PES header.
+        Returns None if the header carries none.
+        """
+        if len(payload) < 14 or not ES.has_pes_header(payload):
+            return None
+        # PTS_DTS_flags are the top two bits of the second flags byte: 0b10 or 0b11 mean a PTS
+        if not payload[7] & 0x80:
+            return None
+        return (
+            ((payload[9] & 0x0E) << 29)
+            | (payload[10] << 22)
+            | ((payload[11] & 0xFE) << 14)
+            | (payload[12] << 7)
+            | (payload[13] >> 1)
+        )
+
+    @staticmethod
+    def has_pes_header(payload):
+        """Does this PES carry the optional PES header (flags, PTS...)?
+        private_stream_2 (and padding etc.) go straight from the packet length to data.
+        """
+        return payload[ES.STREAM_ID_INDEX] != ES.PRIVATE_STREAM_2 and (payload[6] & 0xC0) == 0x80
+
     @staticmethod
     def get_pes_header_length(payload):
         # 6 is initial prefix, streamid and then pes packet length
@@ -72,6 +121,120 @@ class ES:
         return pes_packet_len == payload_len
 
 
+class PSI:
+    """very minimalistic Program Specific Information (PAT and PMT) handling"""
+
+    PAT_PID = 0x0000
+    NULL_PID = 0x1FFF
+
+    # table_id values
+    PAT_TABLE_ID = 0x00
+    PMT_TABLE_ID = 0x02
+
+    # PMT stream_type for PES carrying private data (ARIB captions among others)
+    STREAM_TYPE_PRIVATE_PES = 0x06
+
+    # Descriptor tags and values identifying an ARIB closed caption component
+    # (ARIB TR-B14 / STD-B10)
+    STREAM_IDENTIFIER_DESCRIPTOR = 0x52
+    DATA_COMPONENT_DESCRIPTOR = 0xFD
+    CAPTION_COMPONENT_TAGS = range(0x30, 0x38)
+    CAPTION_DATA_COMPONENT_ID = 0x0008
+
+    CRC_SIZE_BYTES = 4
+    _CRC_TABLE = None
+
+    @staticmethod
+    def crc32(data):
+        """CRC-32/MPEG-2 as used to protect PSI sections.
+        Running it over a whole section (CRC included) gives 0 when it's intact.
+        """
+        if PSI._CRC_TABLE is None:
+            table = []
+            for i in range(256):
+                crc = i << 24
+                for _ in range(8):
+                    crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+                table.append(crc & 0xFFFFFFFF)
+            PSI._CRC_TABLE = table
+        table = PSI._CRC_TABLE
+        crc = 0xFFFFFFFF
+        for b in data:
+            crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ b]
+        return crc
+
+    @staticmethod
+    def get_section_length(section):
+        """Total length of a PSI section including its 3 byte header.
+        Returns 0 if not enough of the section is present to know.
+        """
+        if len(section) < 3:
+            return 0
+        return (((section[1]) & 0x0F) << 8 | (section[2])) + 3
+
+    @staticmethod
+    def parse_pat(section):
+        """Return a dictionary of program number to PMT PID from a complete PAT section"""
+        programs = {}
+        end = PSI.get_section_length(section) - PSI.CRC_SIZE_BYTES
+        for i in range(8, end - 3, 4):
+            program_number = ((section[i]) << 8) | (section[i + 1])
+            pid = (((section[i + 2]) & 0x1F) << 8) | (section[i + 3])
+            # program number 0 points at the network information table
+            if program_number != 0:
+                programs[program_number] = pid
+        return programs
+
+    @staticmethod
+    def parse_pmt(section):
+        """Return (PCR PID, [(stream_type, elementary PID, ES info descriptors), ...])
+        from a complete PMT section
+        """
+        end = PSI.get_section_length(section) - PSI.CRC_SIZE_BYTES
+        pcr_pid = (((section[8]) & 0x1F) << 8) | (section[9])
+        program_info_length = (((section[10]) & 0x0F) << 8) | (section[11])
+        i = 12 + program_info_length
+        streams = []
+        while i + 5 <= end:
+            stream_type = section[i]
+            pid = (((section[i + 1]) & 0x1F) << 8) | (section[i + 2])
+            es_info_length = (((section[i + 3]) & 0x0F) << 8) | (section[i + 4])
+            es_info = bytes(section[i + 5 : i + 5 + es_info_length])
+            streams.append((stream_type, pid, es_info))
+            i += 5 + es_info_length
+        return (pcr_pid, streams)
+
+    @staticmethod
+    def descriptors(data):
+        """Generator of (tag, body) pairs from a descriptor loop"""
+        i = 0
+        while i + 2 <= len(data):
+            tag = data[i]
+            length = data[i + 1]
+            yield (tag, data[i + 2 : i + 2 + length])
+            i += 2 + length
+
+    @staticmethod
+    def is_arib_caption_component(stream_type, es_info):
+        """Does this PMT entry describe an ARIB closed caption stream?
+        That's a private PES whose stream identifier descriptor carries a caption
+        component tag (0x30-0x37), or failing that one whose data component
+        descriptor carries the caption data_component_id (0x0008).
+        """
+        if stream_type != PSI.STREAM_TYPE_PRIVATE_PES:
+            return False
+        component_tag = None
+        data_component_id = None
+        for tag, body in PSI.descriptors(es_info):
+            if tag == PSI.STREAM_IDENTIFIER_DESCRIPTOR and len(body) >= 1:
+                component_tag = body[0]
+            elif tag == PSI.DATA_COMPONENT_DESCRIPTOR and len(body) >= 2:
+                data_component_id = ((body[0]) << 8) | (body[1])
+        if component_tag is not None:
+            return component_tag in PSI.CAPTION_COMPONENT_TAGS
+        return data_component_id == PSI.CAPTION_DATA_COMPONENT_ID
+
+
 class TS(object):
     """very minimalistic Transport stream handling"""
 
@@ -120,37 +283,130 @@ class TS(object):
     PCR_START_INDEX = 6
     PCR_SIZE_BYTES = 6
 
+    # PCR (and PTS) base values count a 90kHz clock in 33 bits, so wrap every ~26.5 hours
+    PCR_HZ = 90000
+    PCR_WRAP = 1 << 33
+    # PCRs must be sent at least every 100ms. A jump bigger than this between
+    # one PCR and the next on the same PID is taken as a discontinuity.
+    PCR_MAX_GAP = 10 * PCR_HZ
+
+    # Number of packets pulled in per read when not memory mapping the file
+    CHUNK_PACKETS = 4096
+
+    # Pipelined reads (see set_pipelined()): buffers in the ring, and packets per buffer
+    PIPELINE_BUFFERS = 4
+    PIPELINE_PACKETS = 8192
+
     @staticmethod
-    def next_packet(filename, memorymap=True):
-        """Generator to remove a series of TS packets from a TS file"""
+    def next_packet(filename, memorymap=True, start=0, end=None, pipelined=False):
+        """Generator to remove a series of TS packets from a TS file
+        Packets are yielded as memoryview slices over a memory map of the file
+        (or over large packet aligned reads) so no copy or allocation is made
+        per packet. A view remains valid for as long as the caller holds it.
+        :param start: byte offset to start from. Should be the start of a packet.
+        :param end: byte offset to stop at (end of file if None)
+        :param pipelined: read the file on a thread of its own (see PipelinedReader).
+          Packet views are then only valid until the next one after them is taken.
+        """
+        if pipelined:
+            yield from PipelinedReader(filename, start, end).packets()
+            return
+
         with open(filename, "rb") as f:
 
             # memory map the file if necessary (prob requires 64 bit systems)
-            _file = f
             if memorymap:
-                _file = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
+                if os.fstat(f.fileno()).st_size == 0:
+                    return
+                _map = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ)
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    # read ahead of the pages faulted in, as posix_fadvise() does for reads
+                    _map.madvise(mmap.MADV_SEQUENTIAL)
+                try:
+                    yield from TS._split_packets(memoryview(_map)[start:end])
+                finally:
+                    try:
+                        _map.close()
+                    except BufferError:
+                        # caller still holds packet views. map is freed with them.
+                        pass
+                return
+
+            chunk_size = TS.PACKET_SIZE * TS.CHUNK_PACKETS
+            tail = b""
+            TS.advise_sequential(f, start, end)
+            f.seek(start)
+            remaining = float("inf") if end is None else end - start
+            while remaining > 0:
+                data = f.read(int(min(chunk_size, remaining)))
+                remaining -= len(data)
+                if not data:
+                    break
+                if tail:
+                    data = tail + data
+                consumed = yield from TS._split_packets(memoryview(data))
+                tail = data[consumed:]
 
-            while True:
-                packet = _file.read(TS.PACKET_SIZE)
-                if packet:
-                    # first byte SHOULD be the sync byte
-                    # but if it isn't find one.
-                    if packet[0] != TS.SYNC_BYTE:
-                        start_byte = 0
-                        print(packet[0])
-                        for i in range(start_byte, TS.PACKET_SIZE):
-                            if packet[i] == TS.SYNC_BYTE:
-                                start_byte = i
-                                break
-                        # didn't find a new start? FAIL
-                        if start_byte == 0:
-                            raise Exception("failure to find sync byte in ts packet size.")
-                            continue
-                        remainder = _file.read(TS.PACKET_SIZE - start_byte)
-                        packet = packet[start_byte:] + remainder
-                    yield packet
-                else:
+    @staticmethod
+    def _split_packets(view):
+        """Generator yielding 188 byte packet views out of a larger buffer view.
+        Returns the offset of the first byte not consumed (a trailing partial packet).
+        """
+        size = TS.PACKET_SIZE
+        block = size * TS.CHUNK_PACKETS
+        sync = bytes([TS.SYNC_BYTE])
+        end = len(view)
+        pos = 0
+        while pos + size <= end:
+            # check the sync bytes of a whole block of packets at once and
+            # hand out every packet up to the first one that's out of sync.
+            block_end = pos + min(block, (end - pos) // size * size)
+            sync_bytes = bytes(view[pos:block_end:size])
+            in_sync = len(sync_bytes) - len(sync_bytes.lstrip(sync))
+            for offset in range(pos, pos + in_sync * size, size):
+                yield view[offset : offset + size]
+            pos += in_sync * size
+            if in_sync == len(sync_bytes):
+                continue
+            # first byte SHOULD be the sync byte
+            # but if it isn't find one.
+            for i in range(pos + 1, pos + size):
+                if view[i] == TS.SYNC_BYTE:
+                    pos = i
                     break
+            else:
+                # didn't find a new start? FAIL
+                raise SyncError("failure to find sync byte in ts packet size.")
+        return pos
+
+    @staticmethod
+    def advise_sequential(f, start=0, end=None):
+        """Tell the OS a file will be read from start to end in order, so it reads ahead
+        further (where posix_fadvise() is available)
+        """
+        if not hasattr(os, "posix_fadvise"):
+            return
+        length = 0 if end is None else max(end - start, 0)
+        try:
+            os.posix_fadvise(f.fileno(), start, length, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+    @staticmethod
+    def sync_offset(view, pos=0):
+        """Offset of the first packet starting at or after pos in a buffer of packets,
+        i.e. the first sync byte followed by sync bytes a packet and two packets on.
+        Returns -1 if there is none.
+        """
+        size = TS.PACKET_SIZE
+        end = len(view)
+        while pos < end:
+            if view[pos] == TS.SYNC_BYTE and all(
+                view[p] == TS.SYNC_BYTE for p in range(pos + size, min(pos + 3 * size, end), size)
+            ):
+                return pos
+            pos += 1
+        return -1
 
     @staticmethod
     def check_packet_formedness(packet):
@@ -159,7 +415,7 @@ class TS(object):
             raise Exception("Provided input packet string not of correct size")
 
         if packet[0] != TS.SYNC_BYTE:
-            raise Exception("Provided input packet does not begin with correct sync byte.")
+            raise SyncError("Provided input packet does not begin with correct sync byte.")
 
     @staticmethod
     def get_transport_error_indicator(packet):
@@ -232,6 +488,14 @@ class TS(object):
         """
         return float(pcr_t2 - pcr_t1) / 90000.0 + offset
 
+    @staticmethod
+    def pcr_delta(pcr_t1, pcr_t2):
+        """Signed difference in 90kHz ticks from one PCR (or PTS) base value to another,
+        allowing for the clock having wrapped in between.
+        """
+        half = TS.PCR_WRAP // 2
+        return (pcr_t2 - pcr_t1 + half) % TS.PCR_WRAP - half
+
     @staticmethod
     def get_payload_length(packet):
         """Payload length from an 188 byte ts packet"""
@@ -240,76 +504,474 @@ class TS(object):
 
     @staticmethod
     def get_payload(packet):
-        """return a byte array deep copy of 188 byte ts packet payload"""
+        """return the payload of a 188 byte ts packet.
+        This is a slice of the packet, so a memoryview packet yields a view (no copy).
+        """
         # payload_len = get_payload_length(packet)
         adaptation_field_len = TS.get_adaptation_field_length(packet)
         header_size = 4 + adaptation_field_len
         return packet[header_size:]
 
     def __init__(self, filename):
-        self._filename = filename
-        self._total_filesize = os.path.getsize(filename)
+        """
+        :param filename: TS file to parse, or a StreamSource to read packets from.
+          None when packets will be pushed in via parse_buffer() (e.g. as they're received)
+        """
+        if isinstance(filename, StreamSource):
+            self._source = filename
+            self._filename = filename.name
+            self._total_filesize = filename.size()
+        elif filename is None:
+            self._source = None
+            self._filename = None
+            self._total_filesize = None
+        else:
+            self._source = None
+            self._filename = filename
+            self._total_filesize = os.path.getsize(filename)
         self._read_size = 0
+        self._packet_count = 0
+        self._start = 0
+        self._end = None
+        self._pipelined = False
+        self._stopped = False
         self.Progress = None
         self.OnTSPacket = None
         self.OnESPacket = None
         self.OnTSPacketError = None
         self.OnESPacketError = None
+        self.OnCaptionPID = None
+        self.OnPCR = None
         self._elementary_streams = {}
+        self._pid_filter = None
+        # Program Specific Information state
+        self._sections = {}
+        self._pmt_pids = set()
+        self._private_pes_pids = None
+        self._caption_pid = -1
+        self._pcr_pid = -1
+
+    def set_pid_filter(self, pids):
+        """Only process TS packets carrying one of the given PIDs
+        (e.g. the PCR PID plus the closed caption PID).
+        Packets on any other PID are dropped after reading their PID, without
+        any payload handling, progress update or callback.
+        :param pids: iterable of integer PIDs, or None to process every PID.
+        """
+        self._pid_filter = None if pids is None else frozenset(pids)
+
+    def set_range(self, start=0, end=None):
+        """Only parse the packets between two byte offsets of the file.
+        :param start: offset of the first packet to parse. Should be the start of a packet.
+        :param end: offset to stop at (end of file if None)
+        """
+        self._start = start
+        self._end = end
+
+    def set_pipelined(self, pipelined=True):
+        """Have Parse() read the file on a thread of its own, overlapping reading with
+        parsing and decoding (see PipelinedReader). Worthwhile where reads are slow
+        (network storage, cold caches) rather than CPU bound.
+        """
+        self._pipelined = pipelined
+
+    def stop(self):
+        """Have Parse() return once the packet being handled is done with"""
+        self._stopped = True
+
+    def set_pcr_pid(self, pid):
+        """PID carrying the program clock reference, if it's known before the PMT is seen.
+        OnPCR is only invoked for this PID (for any PID carrying a PCR until it's known).
+        """
+        self._pcr_pid = pid
+
+    def bytes_read(self):
+        """Bytes parsed so far, up to the last packet handled (since the start of the range)"""
+        return self._read_size
+
+    def caption_pid(self):
+        """PID of the ARIB closed caption stream as found in the PMT, or -1"""
+        return self._caption_pid
+
+    def pcr_pid(self):
+        """PCR PID of the program carrying closed captions as found in the PMT, or -1"""
+        return self._pcr_pid
+
+    def _handle_psi_packet(self, pid, pusi, payload):
+        """Put together PAT and PMT sections and handle them once complete"""
+        if pusi:
+            if not payload:
+                return
+            # skip the pointer field
+            section = bytearray(payload[1 + payload[0] :])
+        elif pid in self._sections:
+            section = self._sections[pid]
+            section += payload
+        else:
+            return
+
+        section_length = PSI.get_section_length(section)
+        if section_length == 0 or len(section) < section_length:
+            self._sections[pid] = section
+            return
+        self._sections.pop(pid, None)
+        del section[section_length:]
+        if PSI.crc32(section) != 0:
+            return
+
+        table_id = section[0]
+        if pid == PSI.PAT_PID and table_id == PSI.PAT_TABLE_ID:
+            self._pmt_pids.update(PSI.parse_pat(section).values())
+        elif table_id == PSI.PMT_TABLE_ID:
+            self._handle_pmt(section)
+
+    def _handle_pmt(self, section):
+        pcr_pid, streams = PSI.parse_pmt(section)
+        if self._private_pes_pids is None:
+            self._private_pes_pids = set()
+        for stream_type, pid, es_info in streams:
+            if stream_type == PSI.STREAM_TYPE_PRIVATE_PES:
+                self._private_pes_pids.add(pid)
+            if self._caption_pid < 0 and PSI.is_arib_caption_component(stream_type, es_info):
+                self._caption_pid = pid
+                self._pcr_pid = pcr_pid
+                if self.OnCaptionPID:
+                    self.OnCaptionPID(pid, pcr_pid)
 
     def Parse(self):
         """Go through the .ts file, and invoke a callback on each TS packet and ES packet
         Also invoke progress callbacks and packet error callbacks as appropriate
         """
+        self._stopped = False
+        self._packet_count = 0
+        if self._source is not None:
+            if self._start or self._end is not None:
+                raise ValueError("A byte range can't be parsed from a stream")
+            # no progress when the size isn't known
+            total_size = self._total_filesize
+            packets = self._source.packets()
+        else:
+            end = self._total_filesize
+            if self._end is not None:
+                end = min(self._end, end)
+            total_size = max(end - self._start, 1)
+            packets = TS.next_packet(
+                self._filename,
+                start=self._start,
+                end=self._end,
+                pipelined=self._pipelined,
+            )
+        self.parse_packets(packets, total_size)
+
+    def parse_buffer(self, data):
+        """Handle the whole TS packets in a buffer (a UDP datagram, say) as Parse() would.
+        Can be called over and over as data arrives.
+        """
+        self.parse_packets(TS._split_packets(memoryview(data)))
+
+    def parse_packets(self, packets, total_size=None):
+        """Invoke the callbacks for a series of TS packets.
+        :param packets: iterable of 188 byte packets
+        :param total_size: total bytes to be parsed, for progress callbacks (None for none)
+        """
         prev_percent_read = 0
-        for packet in TS.next_packet(self._filename):
+        packet_count = self._packet_count
+        for packet_count, packet in enumerate(packets, packet_count + 1):
+            if self._stopped:
+                break
+            # PID allowlist fast path. Reject unwanted packets off their two PID bytes.
+            # (the filter may be changed by callbacks as we go)
+            pid = ((packet[1] & 0x1F) << 8) | packet[2]
+            if self._pid_filter is not None and pid not in self._pid_filter:
+                continue
+
             # check_packet_formedness(packet)
             # pei = TS.get_transport_error_indicator(packet)
             pusi = TS.get_payload_start(packet)
-            pid = TS.get_pid(packet)
             # tsc = TS.get_tsc(packet)
 
             # per .ts packet handler
             if self.OnTSPacket:
                 self.OnTSPacket(packet)
 
+            # program clock reference handler. Only PCR PID packets need be looked at.
+            if self.OnPCR and (self._pcr_pid < 0 or pid == self._pcr_pid):
+                pcr = TS.get_pcr(packet)
+                if pcr > 0:
+                    self.OnPCR(pid, pcr)
+
             # Update a progress callback
-            self._read_size += TS.PACKET_SIZE
-            percent_read = (self._read_size / float(self._total_filesize)) * 100
-            new_percent_read = int(percent_read * 100)
-            if new_percent_read != prev_percent_read and self.Progress:
-                self.Progress(self._read_size, self._total_filesize, percent_read)
-                prev_percent_read = new_percent_read
+            self._read_size = packet_count * TS.PACKET_SIZE
+            if self.Progress and total_size:
+                percent_read = (self._read_size / float(total_size)) * 100
+                new_percent_read = int(percent_read * 100)
+                if new_percent_read != prev_percent_read:
+                    self.Progress(self._read_size, total_size, percent_read)
+                    prev_percent_read = new_percent_read
 
             # adaptation_field_control = TS.get_adaptation_field_control(packet)
             # continuity_counter = TS.get_continuity_counter(packet)
 
+            # Program Specific Information tells us where the captions are
+            if pid == PSI.PAT_PID or pid in self._pmt_pids:
+                self._handle_psi_packet(pid, pusi, TS.get_payload(packet))
+                continue
+
             # put together PES from payloads
+            # Only private data streams (i.e. ARIB closed captions) are reassembled.
+            # Anything else (video, audio) is dropped immediately rather than being
+            # buffered up until the next payload unit start.
+            # Once a PMT has been seen, only its private PES PIDs need be looked at.
+            if self._private_pes_pids is not None and pid not in self._private_pes_pids:
+                continue
             payload = TS.get_payload(packet)
+            streams = self._elementary_streams
             if pusi:
-                if not ES.pes_packet_check_formedness(payload):
-                    if pid in self._elementary_streams:
-                        self._elementary_streams[pid] = None
-                    continue
-                # pes_id = ES.get_pes_stream_id(payload)
-                self._elementary_streams[pid] = bytearray(payload)
+                es = bytearray(payload)
+                streams[pid] = es
+                checked = False
+            elif pid in streams:
+                # TODO: check packet sequence counter
+                es = streams[pid]
+                checked = len(es) >= ES.PES_PREFIX_SIZE
+                es += payload
             else:
-                if pid in self._elementary_streams:
-                    # TODO: check packet sequence counter
-                    if not self._elementary_streams[pid]:
-                        self._elementary_streams[pid] = bytearray()
-                    self._elementary_streams[pid] += bytearray(payload)
-                else:
-                    # TODO: throw. this situaiton means out of order packets
-                    pass
-            if pid in self._elementary_streams and ES.pes_packet_complete(
-                self._elementary_streams[pid]
+                # Either a stream we don't reassemble or out of order packets
+                continue
+
+            if len(es) < ES.PES_PREFIX_SIZE:
+                # the start of the PES is split over packets (a payload shortened by
+                # adaptation field stuffing). Wait for the rest of its length field.
+                continue
+            if not checked and (
+                not ES.pes_packet_check_formedness(es) or not ES.is_private_stream(es)
             ):
-                # TODO: handle packet contents here (callback)
-                es = self._elementary_streams[pid]
-                if self.OnESPacket:
-                    header_size = ES.get_pes_header_length(es)
-                    self.OnESPacket(pid, es, header_size)
+                del streams[pid]
+                continue
+            pes_packet_len = ES.get_pes_packet_length(es)
+            if len(es) < pes_packet_len:
+                continue
+            del streams[pid]
+            if len(es) > pes_packet_len:
+                # overran the declared PES length (lost packets or unbounded PES)
+                continue
+            if self.OnESPacket:
+                header_size = ES.get_pes_header_length(es)
+                self.OnESPacket(pid, es, header_size)
+        self._packet_count = packet_count
+
+
+class StreamSource(object):
+    """
+    TS packets read from a pipe, standard input, a FIFO or a file that's still being written.
+    Data is read with readinto() into one buffer that's used over and over, so packets
+    are handed out as views that are only valid until the next read. (TS.Parse copies out
+    all it keeps.)
+    With follow=True, reaching the end of the data waits for more to be appended, as for
+    a recording in progress, until idle_timeout seconds pass without any.
+    """
+
+    # name of standard input
+    STDIN = "-"
+
+    # seconds between checks for more data when following
+    POLL_INTERVAL = 0.2
+
+    def __init__(
+        self,
+        f,
+        name=None,
+        follow=False,
+        idle_timeout=None,
+        buffer_packets=TS.CHUNK_PACKETS,
+        closefd=True,
+    ):
+        """
+        :param f: binary file object, opened unbuffered (buffering=0)
+        :param name: name to give the source (the filename)
+        :param follow: at the end of the data, wait for more
+        :param idle_timeout: when following, stop after this many seconds without new data
+          (None to wait for ever)
+        :param buffer_packets: size of the read buffer, in packets
+        :param closefd: close f on close()
+        """
+        self._f = f
+        self.name = name if name is not None else getattr(f, "name", "<stream>")
+        self.follow = follow
+        self.idle_timeout = idle_timeout
+        self._buffer_size = buffer_packets * TS.PACKET_SIZE
+        self._closefd = closefd
+
+    @staticmethod
+    def open(path, follow=False, idle_timeout=None):
+        """
+        StreamSource reading a file, FIFO or (for StreamSource.STDIN) standard input.
+        See StreamSource()
+        """
+        if path == StreamSource.STDIN:
+            f = open(sys.stdin.fileno(), "rb", buffering=0, closefd=False)
+            return StreamSource(f, path, follow, idle_timeout)
+        return StreamSource(open(path, "rb", buffering=0), path, follow, idle_timeout)
+
+    @staticmethod
+    def is_stream(path):
+        """Is path something that can only be read as a stream (standard input or a FIFO)?"""
+        if path == StreamSource.STDIN:
+            return True
+        try:
+            return not stat.S_ISREG(os.stat(path).st_mode)
+        except OSError:
+            return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        if self._f is not None and self._closefd:
+            self._f.close()
+        self._f = None
+
+    def size(self):
+        """Total bytes that will be read, if known: the size of a regular file that's not
+        being followed. None otherwise.
+        """
+        if self.follow:
+            return None
+        try:
+            st = os.fstat(self._f.fileno())
+        except (OSError, AttributeError, ValueError):
+            return None
+        return st.st_size if stat.S_ISREG(st.st_mode) else None
+
+    def packets(self):
+        """Generator of the TS packets read, as memoryviews over the read buffer"""
+        buf = bytearray(self._buffer_size)
+        view = memoryview(buf)
+        filled = 0
+        idle_since = None
+        while True:
+            n = self._f.readinto(view[filled:])
+            if not n:
+                if not self.follow:
+                    break
+                now = time.monotonic()
+                idle_since = idle_since or now
+                if self.idle_timeout is not None and now - idle_since >= self.idle_timeout:
+                    break
+                time.sleep(StreamSource.POLL_INTERVAL)
+                continue
+            idle_since = None
+            filled += n
+            consumed = yield from TS._split_packets(view[:filled])
+            # keep any partial packet at the end for the next read to complete
+            tail = filled - consumed
+            view[:tail] = bytes(view[consumed:filled])
+            filled = tail
+
+
+class PipelinedReader(object):
+    """
+    Reads a TS file on a thread of its own, so the parsing thread needn't wait on reads.
+    The reader thread fills a ring of large buffers with readinto() and hands each over
+    through a bounded queue as it fills. The parsing thread hands buffers back once done
+    with their packets. With every buffer full and waiting, the reader blocks until one is
+    handed back, so it's never more than the ring ahead.
+    """
+
+    def __init__(
+        self,
+        filename,
+        start=0,
+        end=None,
+        buffers=None,
+        buffer_packets=None,
+    ):
+        """
+        :param filename: TS file to read
+        :param start: byte offset to start from. Should be the start of a packet.
+        :param end: byte offset to stop at (end of file if None)
+        :param buffers: buffers in the ring (TS.PIPELINE_BUFFERS if None)
+        :param buffer_packets: size of each buffer in packets (TS.PIPELINE_PACKETS if None)
+        """
+        buffers = buffers or TS.PIPELINE_BUFFERS
+        buffer_packets = buffer_packets or TS.PIPELINE_PACKETS
+        self.filename = filename
+        self.start = start
+        self.end = end
+        self._buffers = [bytearray(buffer_packets * TS.PACKET_SIZE) for _ in range(buffers)]
+        # indexes of buffers free to read into, and of (index, bytes read) full ones.
+        # None ends the full queue, or an exception the reader thread raised.
+        self._free = queue.Queue()
+        self._full = queue.Queue(buffers + 1)
+        self._stopping = False
+
+    def _read(self):
+        """Reader thread"""
+        try:
+            with open(self.filename, "rb", buffering=0) as f:
+                TS.advise_sequential(f, self.start, self.end)
+                f.seek(self.start)
+                remaining = float("inf") if self.end is None else self.end - self.start
+                while remaining > 0:
+                    index = self._free.get()
+                    if self._stopping:
+                        return
+                    view = memoryview(self._buffers[index])
+                    limit = int(min(len(view), remaining))
+                    filled = 0
+                    # fill the buffer. (reads of network storage may come up short)
+                    while filled < limit:
+                        n = f.readinto(view[filled:limit])
+                        if not n:
+                            break
+                        filled += n
+                    if not filled:
+                        break
+                    remaining -= filled
+                    self._full.put((index, filled))
+                    if filled < limit:
+                        break
+            self._full.put(None)
+        except BaseException as e:
+            self._full.put(e)
+
+    def packets(self):
+        """Generator of the file's TS packets, as memoryviews over the read buffers.
+        A view is only valid until the next one after it is taken.
+        """
+        for index in range(len(self._buffers)):
+            self._free.put(index)
+        thread = threading.Thread(target=self._read, name="ts-reader", daemon=True)
+        thread.start()
+        tail = b""
+        try:
+            while True:
+                item = self._full.get()
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                index, filled = item
+                data = memoryview(self._buffers[index])[:filled]
+                if tail:
+                    # a packet split across buffers (only when out of packet alignment)
+                    data = memoryview(tail + data)
+                consumed = yield from TS._split_packets(data)
+                tail = bytes(data[consumed:])
+                self._free.put(index)
+        finally:
+            # wake the reader if it's waiting on a free buffer, and let it finish
+            self._stopping = True
+            self._free.put(0)
+            while thread.is_alive():
+                try:
+                    self._full.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
 
 
 # GLOBALS TO KEEP TRACK OF STATE
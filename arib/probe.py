@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+"""
+Module: probe
+Desc: Find out quickly whether an MPEG TS file carries ARIB closed captions.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+Parses the file from the start, stopping as soon as a PMT names a closed caption
+component or caption management data turns up (which also gives the caption languages),
+or once a byte or time budget runs out. The results are printed as JSON:
+
+  {"file": "recording.ts", "captions": true, "pid": 304, "pcr_pid": 256,
+   "languages": ["jpn"], "found_by": "pmt", "stopped": "found",
+   "bytes_read": 564, "seconds": 0.0, "error": null}
+
+A file that turns out not to be a transport stream stops the probe with "stopped": "error"
+and the reason in "error".
+
+"""
+
+import io
+import os
+import sys
+import json
+import argparse
+import contextlib
+
+from arib import read
+from arib.data_group import DataGroup
+from arib.drcs_cache import DrcsCache
+from arib.drcs_cache import use_drcs_cache
+
+from arib.mpeg.ts import TS
+from arib.mpeg.ts import PSI
+from arib.mpeg.ts import SyncError
+
+# default budgets: bytes of the file and seconds of stream time (by PCR) to look through
+MAX_BYTES = 64 * 1024 * 1024
+MAX_SECONDS = 30.0
+
+# how the captions were found
+FOUND_BY_PMT = "pmt"
+FOUND_BY_MANAGEMENT_DATA = "management_data"
+
+# why the probe stopped
+STOPPED_FOUND = "found"
+STOPPED_BYTE_BUDGET = "byte_budget"
+STOPPED_TIME_BUDGET = "time_budget"
+STOPPED_END_OF_FILE = "end_of_file"
+STOPPED_ERROR = "error"
+
+SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(text):
+    """Bytes from a size like 65536, 512K, 64M or 2G"""
+    suffix = text[-1:].upper()
+    if suffix in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[suffix])
+    return int(text)
+
+
+class CaptionProbe(object):
+    """
+    Looks through the start of an MPEG TS file for ARIB closed captions.
+    """
+
+    def __init__(self, infilename, max_bytes=MAX_BYTES, max_seconds=MAX_SECONDS, languages=False):
+        """
+        :param infilename: MPEG TS file to probe
+        :param max_bytes: give up after this many bytes of the file (None for no limit)
+        :param max_seconds: give up after this many seconds of stream time (None for no limit)
+        :param languages: don't stop at a PMT caption component but carry on (parsing only
+          the caption PID) until caption management data gives the caption languages
+        """
+        self.infilename = infilename
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.languages = languages
+
+        self.pid = -1
+        self.pcr_pid = -1
+        self.language_codes = []
+        self.found_by = None
+        self.stopped = STOPPED_END_OF_FILE
+        self.error = None
+        self.initial_timestamp = None
+        self.last_pcr = None
+        self.ts = None
+
+    def run(self):
+        """Parse the file until captions are found or a budget runs out
+        :return: the results as a dict. See results()
+        """
+        self.ts = TS(self.infilename)
+        if self.max_bytes is not None:
+            self.ts.set_range(0, self.max_bytes)
+        self.ts.OnCaptionPID = self.OnCaptionPID
+        self.ts.OnESPacket = self.OnESPacket
+        self.ts.OnPCR = self.OnPCR
+        # management data may define DRCS glyphs. keep them out of the process wide cache.
+        with use_drcs_cache(DrcsCache()):
+            try:
+                self.ts.Parse()
+            except SyncError as e:
+                self.stopped = STOPPED_ERROR
+                self.error = str(e)
+        if self.stopped == STOPPED_END_OF_FILE and self.max_bytes is not None:
+            if os.path.getsize(self.infilename) > self.max_bytes:
+                self.stopped = STOPPED_BYTE_BUDGET
+        return self.results()
+
+    def results(self):
+        """
+        :return: dict of
+          captions: True if closed captions were found
+          pid, pcr_pid: PIDs of the caption stream and its PCR (None if not known)
+          languages: ISO 639 language codes of the captions, from caption management data
+          found_by: what the captions were found by ('pmt' or 'management_data')
+          stopped: why the probe stopped ('found', 'byte_budget', 'time_budget',
+            'end_of_file' or 'error')
+          bytes_read: bytes of the file looked through
+          seconds: seconds of stream time looked through (None if there was no PCR)
+          error: why the file couldn't be parsed, when stopped is 'error' (else None)
+        """
+        seconds = None
+        if self.last_pcr is not None:
+            seconds = float(TS.pcr_delta(self.initial_timestamp, self.last_pcr)) / TS.PCR_HZ
+        return {
+            "file": self.infilename,
+            "captions": self.pid >= 0,
+            "pid": self.pid if self.pid >= 0 else None,
+            "pcr_pid": self.pcr_pid if self.pcr_pid >= 0 else None,
+            "languages": self.language_codes,
+            "found_by": self.found_by,
+            "stopped": self.stopped,
+            "bytes_read": self.ts.bytes_read() if self.ts else 0,
+            "seconds": seconds,
+            "error": self.error,
+        }
+
+    def stop(self, reason):
+        self.stopped = reason
+        self.ts.stop()
+
+    def OnPCR(self, pcr_pid, pcr):
+        """
+        Callback invoked on a PCR (at the PCR PID once the PMT names it).
+        Used to keep to the time budget.
+        """
+        if self.initial_timestamp is None:
+            self.initial_timestamp = pcr
+        self.last_pcr = pcr
+        if self.max_seconds is not None:
+            if TS.pcr_delta(self.initial_timestamp, pcr) > self.max_seconds * TS.PCR_HZ:
+                self.stop(STOPPED_TIME_BUDGET)
+
+    def OnCaptionPID(self, caption_pid, pcr_pid):
+        """
+        Callback invoked when the PMT identifies the ARIB closed caption stream.
+        """
+        self.pid = caption_pid
+        if pcr_pid != PSI.NULL_PID:
+            self.pcr_pid = pcr_pid
+        self.found_by = self.found_by or FOUND_BY_PMT
+        if not self.languages:
+            self.stop(STOPPED_FOUND)
+            return
+        # wait for caption management data on the caption PID
+        pids = [caption_pid]
+        if self.pcr_pid >= 0:
+            pids.append(self.pcr_pid)
+        self.ts.set_pid_filter(pids)
+
+    def OnESPacket(self, current_pid, packet, header_size):
+        """
+        Callback invoked on each private data PES. Stops at caption management data.
+        """
+        if self.pid >= 0 and current_pid != self.pid:
+            return
+        try:
+            data_group = DataGroup(read.ByteReader(memoryview(packet)[header_size:]))
+        except Exception:
+            # not a caption data group, a damaged or truncated one
+            return
+        if not data_group.is_management_data():
+            return
+        management_data = data_group.payload()
+        self.language_codes = [
+            management_data.language_code(language)
+            for language in range(management_data.num_languages())
+        ]
+        if self.pid < 0:
+            self.pid = current_pid
+            self.found_by = FOUND_BY_MANAGEMENT_DATA
+        self.stop(STOPPED_FOUND)
+
+
+def probe(ts_path, max_bytes=MAX_BYTES, max_seconds=MAX_SECONDS, languages=False):
+    """
+    Find out whether an MPEG TS file carries ARIB closed captions, reading no more of it
+    than needed.
+    :param ts_path: MPEG TS file to probe
+    :param max_bytes: give up after this many bytes of the file (None for no limit)
+    :param max_seconds: give up after this many seconds of stream time (None for no limit)
+    :param languages: carry on past a PMT caption component until caption management data
+      gives the caption languages
+    :return: dict of results. See CaptionProbe.results()
+    """
+    return CaptionProbe(str(ts_path), max_bytes, max_seconds, languages).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Find out whether an MPEG TS file carries ARIB closed captions, and on which PID "
+            "and in which languages. Prints the results as JSON and exits with status 0 if "
+            "captions were found (and the file could be parsed)."
+        )
+    )
+    parser.add_argument("infile", help="Input filename (MPEG2 Transport Stream File)", type=str)
+    parser.add_argument(
+        "--max-bytes",
+        help="Give up after this many bytes of the file (suffixes K, M and G allowed; 0 for no "
+        "limit). Default: 64M.",
+        type=parse_size,
+        default=MAX_BYTES,
+    )
+    parser.add_argument(
+        "--max-seconds",
+        help="Give up after this many seconds of stream time (0 for no limit). Default: 30.",
+        type=float,
+        default=MAX_SECONDS,
+    )
+    parser.add_argument(
+        "-l",
+        "--languages",
+        help=(
+            "Don't stop at a PMT caption component, carry on until caption management data "
+            "gives the caption languages."
+        ),
+        action="store_true",
+    )
+    parser.add_argument("--indent", help="Indent the JSON output.", type=int, default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.infile):
+        print("Input filename :" + args.infile + " does not exist.", file=sys.stderr)
+        sys.exit(-1)
+
+    # keep anything the decoder prints from mixing in with the JSON
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = probe(
+            args.infile,
+            max_bytes=args.max_bytes or None,
+            max_seconds=args.max_seconds or None,
+            languages=args.languages,
+        )
+    print(json.dumps(results, indent=args.indent, ensure_ascii=False))
+    sys.exit(0 if results["captions"] and results["stopped"] != STOPPED_ERROR else -1)
+
+
+if __name__ == "__main__":
+    main()
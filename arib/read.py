@@ -18,42 +18,79 @@ class EOFError(Exception):
     pass
 
 
-def split_buffer(length, buf):
-    """Split provided array at index `length`, returning (prefix, remaining).
-
-    NOTE: Mutates `buf` by popping from the front.
+# precompiled unpackers
+_UCHAR = struct.Struct("B")
+_USHORT = struct.Struct(">H")
+_UINT = struct.Struct(">L")
+_ULONGLONG = struct.Struct(">Q")
+
+
+class ByteReader(object):
+    """Cursor over an in memory buffer (bytes, bytearray, mmap or memoryview).
+    Values are unpacked straight out of the buffer at the current offset,
+    so nothing is copied or rebuilt as we go.
+    Any of the read functions below (and so every parser) accepts one of these
+    in place of a binary file.
     """
-    a = []
-    if len(buf) < length:
-        return (a, buf)
-    for _ in range(length):
-        a.append(buf.pop(0))
-    return (a, buf)
 
+    def __init__(self, data, offset=0):
+        self._view = memoryview(data).cast("B")
+        self._pos = offset
+        self._end = len(self._view)
 
-def _join_to_bytes(seq):
-    """Join a sequence of elements into bytes.
+    def tell(self):
+        return self._pos
 
-    Accepts:
-      - ints (0..255)
-      - 1-byte `bytes`/`bytearray`
-      - 1-char `str` (interpreted as raw byte via ord)
-    """
-    out = bytearray()
-    for el in seq:
-        if isinstance(el, int):
-            out.append(el & 0xFF)
-        elif isinstance(el, (bytes, bytearray)):
-            if len(el) != 1:
-                raise ValueError("Expected 1-byte items in buffer list")
-            out.extend(el)
-        elif isinstance(el, str):
-            if len(el) != 1:
-                raise ValueError("Expected 1-char strings in buffer list")
-            out.append(ord(el) & 0xFF)
-        else:
-            raise TypeError(f"Unsupported element type in buffer list: {type(el)!r}")
-    return bytes(out)
+    def seek(self, pos):
+        self._pos = pos
+
+    def remaining(self):
+        return self._end - self._pos
+
+    def read(self, n=-1):
+        """File-like read. Returns up to n bytes (all remaining if n < 0)."""
+        pos = self._pos
+        end = self._end if n < 0 else min(pos + n, self._end)
+        self._pos = end
+        return bytes(self._view[pos:end])
+
+    def _advance(self, n):
+        pos = self._pos
+        if pos + n > self._end:
+            raise EOFError()
+        self._pos = pos + n
+        return pos
+
+    def ucb(self):
+        pos = self._pos
+        if pos >= self._end:
+            raise EOFError()
+        self._pos = pos + 1
+        return self._view[pos]
+
+    def usb(self):
+        return _USHORT.unpack_from(self._view, self._advance(2))[0]
+
+    def ui3b(self):
+        pos = self._advance(3)
+        v = self._view
+        return (v[pos] << 16) | (v[pos + 1] << 8) | v[pos + 2]
+
+    def uib(self):
+        return _UINT.unpack_from(self._view, self._advance(4))[0]
+
+    def ulb(self):
+        return _ULONGLONG.unpack_from(self._view, self._advance(8))[0]
+
+    def view(self, size):
+        """Return the next size bytes as a memoryview (no copy)"""
+        pos = self._advance(size)
+        return self._view[pos : pos + size]
+
+    def buffer(self, size):
+        """Return the next size bytes as bytes"""
+        pos = self._advance(size)
+        return bytes(self._view[pos : pos + size])
 
 
 def dump_list(lst):
@@ -83,53 +120,49 @@ def _read_exact_file(f, n):
     return data
 
 
-def _read_exact_any(f, n):
-    """Read exactly n bytes from either a list buffer or a file-like."""
-    if isinstance(f, list):
-        chunk, _ = split_buffer(n, f)
-        if len(chunk) < n:
-            raise EOFError()
-        return _join_to_bytes(chunk)
-    else:
-        return _read_exact_file(f, n)
-
-
 def ucb(f):
-    """Read unsigned char (1 byte) from binary file or buffer."""
-    b = _read_exact_any(f, 1)
-    return struct.unpack("B", b)[0]
+    """Read unsigned char (1 byte) from binary file or ByteReader."""
+    if type(f) is ByteReader:
+        return f.ucb()
+    return _UCHAR.unpack(_read_exact_file(f, 1))[0]
 
 
 def usb(f):
-    """Read unsigned short (2 bytes, big-endian) from binary file or buffer."""
-    b = _read_exact_any(f, 2)
-    if DEBUG and not isinstance(f, list):
+    """Read unsigned short (2 bytes, big-endian) from binary file or ByteReader."""
+    if type(f) is ByteReader:
+        return f.usb()
+    b = _read_exact_file(f, 2)
+    if DEBUG:
         # In Py3, indexing bytes gives ints already.
         print("usb: " + hex(b[0]) + ":" + hex(b[1]))
-    return struct.unpack(">H", b)[0]
+    return _USHORT.unpack(b)[0]
 
 
 def ui3b(f):
-    """Read a 3-byte unsigned integer (big-endian) from binary file or buffer."""
-    three = _read_exact_any(f, 3)
+    """Read a 3-byte unsigned integer (big-endian) from binary file or ByteReader."""
+    if type(f) is ByteReader:
+        return f.ui3b()
+    three = _read_exact_file(f, 3)
     # Prepend zero byte to make 4 bytes for struct.unpack of >I
-    return struct.unpack(">I", b"\x00" + three)[0]
-    # Alternatively: return int.from_bytes(three, 'big')
+    return _UINT.unpack(b"\x00" + three)[0]
 
 
 def uib(f):
-    """Read unsigned 4-byte integer (big-endian) from binary file or buffer."""
-    b4 = _read_exact_any(f, 4)
-    return struct.unpack(">L", b4)[0]
-    # Alternatively prefer '>I' in modern code.
+    """Read unsigned 4-byte integer (big-endian) from binary file or ByteReader."""
+    if type(f) is ByteReader:
+        return f.uib()
+    return _UINT.unpack(_read_exact_file(f, 4))[0]
 
 
 def ulb(f):
-    """Read unsigned long long (8 bytes, big-endian) from binary file or buffer."""
-    b8 = _read_exact_any(f, 8)
-    return struct.unpack(">Q", b8)[0]
+    """Read unsigned long long (8 bytes, big-endian) from binary file or ByteReader."""
+    if type(f) is ByteReader:
+        return f.ulb()
+    return _ULONGLONG.unpack(_read_exact_file(f, 8))[0]
 
 
 def buffer(f, size):
-    """Read N raw bytes from either a file or list."""
-    return _read_exact_any(f, size)
+    """Read N raw bytes from either a file or ByteReader."""
+    if type(f) is ByteReader:
+        return f.buffer(size)
+    return _read_exact_file(f, size)
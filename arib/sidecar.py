@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+"""
+Module: sidecar
+Desc: Store decoded closed caption events alongside a TS file and render them again later.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+arib-ts2ass --sidecar FILE writes every decoded statement along with its time and the
+DRCS glyphs it uses. arib-render then turns that file into an .ass (or text) subtitle
+file with whatever options, without demuxing and decoding the TS file again.
+
+The file is a header followed by records, all big endian:
+
+  magic          MAGIC (8 bytes)
+  glyph record   'G' then the glyph as DrcsGlyph.pack() gives it. Glyphs are
+                 numbered in the order they're written.
+  event record   'E' then
+                   time     8 byte float: seconds since the first PCR (NaN if none yet)
+                   codes    4 byte count then 1 byte per token
+                   params   2 bytes per token
+                   data     4 byte length then bytes
+                   values   4 byte count then per value:
+                              'T' 4 byte length then utf-8 text
+                              'O' 4 byte length then a JSON object:
+                                  {"module": ..., "type": class name, "state": {...},
+                                   "glyph": glyph number, for DRCS characters}
+                              'N' for values that could not be stored
+
+"""
+
+import sys
+import math
+import json
+import struct
+import argparse
+from array import array
+from pathlib import Path
+
+import arib.code_set as code_set
+import arib.control_characters as control_characters
+from arib.read import ByteReader
+from arib.arib_exceptions import DecodingError
+from arib.drcs_cache import DrcsGlyph
+from arib.tokens import Tokens
+from arib.tokens import TEXT_STATEMENTS
+from arib.ass import ASSFormatter
+from arib.ass import DRCS_PATH_RECTS
+from arib.ass import DRCS_PATH_STRATEGIES
+from arib.ass import asstime
+
+MAGIC = b"ARIBCC\x00\x01"
+
+GLYPH_RECORD = ord("G")
+EVENT_RECORD = ord("E")
+
+TEXT_VALUE = ord("T")
+OBJECT_VALUE = ord("O")
+NO_VALUE = ord("N")
+
+_TIME = struct.Struct(">d")
+_COUNT = struct.Struct(">L")
+
+# modules whose classes may be stored as object values
+OBJECT_MODULES = {m.__name__: m for m in (code_set, control_characters)}
+
+# statements shown by the text format
+TEXT_FORMAT_STATEMENTS = TEXT_STATEMENTS + (control_characters.SP,)
+
+RENDER_FORMATS = ("ass", "txt")
+
+
+class SidecarWriter(object):
+    """Writes caption events, and the DRCS glyphs they use, to a sidecar file"""
+
+    def __init__(self, filepath):
+        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(filepath, "wb")
+        self._f.write(MAGIC)
+        # glyph number of each glyph written so far, by id()
+        self._glyphs = {}
+        # and the glyphs themselves, so ids are not reused while we're writing
+        self._glyph_refs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        if self._f:
+            self._f.close()
+            self._f = None
+
+    def event(self, statement, time_s):
+        """
+        Write one decoded statement.
+        :param statement: tokens.Tokens (or list of statement objects)
+        :param time_s: seconds since the first PCR, or None if there's been none yet
+        """
+        if not isinstance(statement, Tokens):
+            tokens = Tokens()
+            for s in statement:
+                tokens.append(s)
+            statement = tokens
+        values = [self._value(v, code) for v, code in self._values_of(statement)]
+        parts = [
+            bytes((EVENT_RECORD,)),
+            _TIME.pack(math.nan if time_s is None else time_s),
+            _COUNT.pack(len(statement.codes)),
+            bytes(statement.codes),
+            struct.pack(f">{len(statement.params)}H", *statement.params),
+            _COUNT.pack(len(statement.data)),
+            bytes(statement.data),
+            _COUNT.pack(len(values)),
+        ]
+        parts.extend(values)
+        self._f.write(b"".join(parts))
+
+    @staticmethod
+    def _values_of(tokens):
+        # the token code each value belongs to
+        codes = [None] * len(tokens.values)
+        for code, param in zip(tokens.codes, tokens.params):
+            if code == Tokens.TEXT or code == Tokens.OBJECT:
+                codes[param] = code
+        return zip(tokens.values, codes)
+
+    def _value(self, value, code):
+        if code == Tokens.TEXT:
+            text = value.encode("utf-8")
+            return bytes((TEXT_VALUE,)) + _COUNT.pack(len(text)) + text
+        obj = self._object(value)
+        if obj is None:
+            return bytes((NO_VALUE,))
+        obj = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        return bytes((OBJECT_VALUE,)) + _COUNT.pack(len(obj)) + obj
+
+    def _object(self, value):
+        """JSON-able description of a statement object, or None if it can't be stored"""
+        cls = type(value)
+        if cls.__module__ not in OBJECT_MODULES:
+            return None
+        obj = {"type": cls.__name__, "module": cls.__module__}
+        state = dict(vars(value))
+        if "glyph" in state:
+            glyph = state.pop("glyph")
+            obj["glyph"] = None if glyph is None else self._glyph(glyph)
+        for v in state.values():
+            if not isinstance(v, (int, str, list)) or (
+                isinstance(v, list) and not all(isinstance(x, int) for x in v)
+            ):
+                return None
+        obj["state"] = state
+        return obj
+
+    def _glyph(self, glyph):
+        n = self._glyphs.get(id(glyph))
+        if n is None:
+            n = len(self._glyphs)
+            self._glyphs[id(glyph)] = n
+            self._glyph_refs.append(glyph)
+            self._f.write(bytes((GLYPH_RECORD,)) + glyph.pack())
+        return n
+
+
+def read_sidecar(filepath):
+    """
+    Generator of the (tokens.Tokens, time) events in a sidecar file.
+    time is seconds since the first PCR, or None.
+    """
+    with open(filepath, "rb") as f:
+        data = f.read()
+    if data[: len(MAGIC)] != MAGIC:
+        raise DecodingError(f"{filepath} is not a caption sidecar file")
+    f = ByteReader(data, len(MAGIC))
+    glyphs = []
+    while f.remaining():
+        record = f.ucb()
+        if record == GLYPH_RECORD:
+            glyphs.append(DrcsGlyph(f))
+        elif record == EVENT_RECORD:
+            yield _read_event(f, glyphs)
+        else:
+            raise DecodingError(f"Unknown sidecar record type {record:#x}")
+
+
+def _read_event(f, glyphs):
+    time_s = _TIME.unpack(f.buffer(_TIME.size))[0]
+    tokens = Tokens()
+    count = f.uib()
+    tokens.codes = array("B", f.buffer(count))
+    tokens.params = array("H", f.buffer(count * 2))
+    if sys.byteorder == "little":
+        tokens.params.byteswap()
+    tokens.data = bytearray(f.buffer(f.uib()))
+    for _ in range(f.uib()):
+        kind = f.ucb()
+        if kind == TEXT_VALUE:
+            tokens.values.append(f.buffer(f.uib()).decode("utf-8"))
+        elif kind == OBJECT_VALUE:
+            tokens.values.append(_read_object(json.loads(f.buffer(f.uib())), glyphs))
+        else:
+            tokens.values.append(None)
+    return tokens, None if math.isnan(time_s) else time_s
+
+
+def _read_object(obj, glyphs):
+    module = OBJECT_MODULES.get(obj["module"])
+    cls = getattr(module, obj["type"], None)
+    if not isinstance(cls, type):
+        return None
+    value = cls.__new__(cls)
+    vars(value).update(obj["state"])
+    if "glyph" in obj:
+        value.glyph = None if obj["glyph"] is None else glyphs[obj["glyph"]]
+    return value
+
+
+def render(
+    sidecar,
+    outfilename,
+    fmt="ass",
+    tmax=5,
+    time_offset=0.0,
+    verbose=False,
+    disable_drcs=False,
+    drcs_path=DRCS_PATH_RECTS,
+    atomic=False,
+):
+    """
+    Render the caption events in a sidecar file into a subtitle file.
+    :param fmt: one of RENDER_FORMATS
+    :return: True if a (nonempty) file was written
+    """
+    if fmt not in RENDER_FORMATS:
+        raise ValueError(f"Unknown render format: {fmt!r}")
+    if fmt == "txt":
+        return _render_text(sidecar, outfilename, time_offset)
+
+    ass = None
+    try:
+        for tokens, time_s in read_sidecar(sidecar):
+            if not ass:
+                ass = ASSFormatter(
+                    tmax=tmax,
+                    video_filename=outfilename,
+                    verbose=verbose,
+                    disable_drcs=disable_drcs,
+                    drcs_path=drcs_path,
+                    atomic=atomic,
+                )
+            # same as ConversionSession: no offset until the first PCR
+            ass.format(tokens, 0 if time_s is None else time_s + time_offset)
+    except BaseException:
+        if ass:
+            ass.close(commit=False)
+        raise
+    if not ass:
+        return False
+    ass.close()
+    return ass.file_written()
+
+
+def _render_text(sidecar, outfilename, time_offset):
+    written = False
+    with open(outfilename, "w", encoding="utf-8") as f:
+        for tokens, time_s in read_sidecar(sidecar):
+            text = tokens.to_string(TEXT_FORMAT_STATEMENTS)
+            if text.strip():
+                t = 0 if time_s is None else time_s + time_offset
+                f.write(f"{asstime(t)} {text}\n")
+                written = True
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Render the closed caption events saved by arib-ts2ass --sidecar into a "
+            "subtitle file, without decoding the MPEG TS file again."
+        )
+    )
+    parser.add_argument("infile", help="Input filename (caption sidecar file)", type=str)
+    parser.add_argument(
+        "-o", "--outfile", help="Output filename (infile + format if not given)", type=str
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="Output format: .ass subtitles or timed plain text.",
+        choices=RENDER_FORMATS,
+        default="ass",
+    )
+    parser.add_argument("-q", "--quiet", help="Does not write to stdout.", action="store_true")
+    parser.add_argument(
+        "-t", "--tmax", help="Subtitle display time limit (seconds).", type=int, default=5
+    )
+    parser.add_argument(
+        "-m",
+        "--timeoffset",
+        help=(
+            "Shift all time values in generated .ass file "
+            "by indicated floating point offset in seconds."
+        ),
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--disable-drcs",
+        help="Disable emitting .ass drawing code for runtime (dynamic) DRCS characters.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--drcs-path",
+        help="How DRCS character drawings are built (see arib-ts2ass).",
+        choices=DRCS_PATH_STRATEGIES,
+        default=DRCS_PATH_RECTS,
+    )
+    parser.add_argument(
+        "--atomic",
+        help="Only rename the .ass file into place once it is complete.",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    outfilename = args.outfile or args.infile + "." + args.format
+    written = render(
+        args.infile,
+        outfilename,
+        fmt=args.format,
+        tmax=args.tmax,
+        time_offset=args.timeoffset,
+        verbose=not args.quiet,
+        disable_drcs=args.disable_drcs,
+        drcs_path=args.drcs_path,
+        atomic=args.atomic,
+    )
+    if not written:
+        if not args.quiet:
+            print("*** Sorry. No nonempty closed caption content found in " + args.infile + " ***")
+        sys.exit(-1)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# vim: set ts=2 expandtab:
+"""
+Module: tokens.py
+Desc: Compact token stream representation of decoded closed caption statements
+
+Decoding a statement body into one object per character (Kanji, Hiragana, SP...)
+produces a great many small, short lived objects. A Tokens instance holds the same
+statement as:
+
+  codes   array of one token code per token
+  params  array of one parameter per token (index into values or offset into data)
+  data    the parameter bytes of control characters like APS, COL, CSI and ESC
+  values  runs of consecutive characters merged into single strings, and the
+          few statements that are kept whole (DRCS characters, macros...)
+
+Control characters without parameters are stored by their control code alone.
+Control characters with parameters are decoded again from data when asked for.
+
+"""
+from array import array
+
+import arib.code_set as code_set
+import arib.control_characters as control_characters
+from arib.read import ByteReader
+
+# Code sets whose characters are merged into text runs
+TEXT_STATEMENTS = (
+    code_set.Kanji,
+    code_set.Alphanumeric,
+    code_set.Hiragana,
+    code_set.Katakana,
+)
+
+# Control characters with no parameters. These are stored by control code only.
+PLAIN_CONTROL_CHARACTERS = {
+    c.CODE: c
+    for c in (
+        control_characters.NUL,
+        control_characters.SP,
+        control_characters.DEL,
+        control_characters.BEL,
+        control_characters.APB,
+        control_characters.APF,
+        control_characters.APD,
+        control_characters.APU,
+        control_characters.CS,
+        control_characters.APR,
+        control_characters.LS1,
+        control_characters.LS0,
+        control_characters.SS2,
+        control_characters.SS3,
+        control_characters.BKF,
+        control_characters.RDF,
+        control_characters.GRF,
+        control_characters.YLF,
+        control_characters.BLF,
+        control_characters.MGF,
+        control_characters.CNF,
+        control_characters.WHF,
+        control_characters.SSZ,
+        control_characters.MSZ,
+        control_characters.NSZ,
+    )
+}
+
+PLAIN_CONTROL_TYPES = frozenset(PLAIN_CONTROL_CHARACTERS.values())
+
+# stringified versions of the above, which don't vary
+PLAIN_CONTROL_STRINGS = {code: str(c(None)) for code, c in PLAIN_CONTROL_CHARACTERS.items()}
+
+# Control characters with parameters, which keep the bytes they were read from in _args
+PARAMETER_CONTROL_CHARACTERS = {
+    c.CODE: c
+    for c in (
+        control_characters.ESC,
+        control_characters.APS,
+        control_characters.COL,
+        control_characters.FLC,
+        control_characters.CSI,
+        control_characters.TIME,
+    )
+}
+
+PARAMETER_CONTROL_TYPES = frozenset(PARAMETER_CONTROL_CHARACTERS.values())
+
+
+class Tokens(object):
+    """Decoded statement body as a compact token stream"""
+
+    __slots__ = ("codes", "params", "data", "values")
+
+    # token codes other than control codes. Control codes are all in the
+    # C0 and C1 areas (or SP and DEL), so GL values never collide with them.
+    TEXT = 0x21
+    OBJECT = 0x22
+
+    def __init__(self):
+        self.codes = array("B")
+        self.params = array("H")
+        self.data = bytearray()
+        self.values = []
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        """Iterate (code, value) pairs. value is the string of a TEXT token, the
+        statement of an OBJECT token or control character with parameters and
+        None for control characters without parameters.
+        """
+        for code, param in zip(self.codes, self.params):
+            yield code, self.value(code, param)
+
+    def value(self, code, param):
+        """Value of the token with the given code and parameter. See __iter__()"""
+        if code == Tokens.TEXT or code == Tokens.OBJECT:
+            return self.values[param]
+        if code in PARAMETER_CONTROL_CHARACTERS:
+            return control_characters.COMMAND_TABLE[code](ByteReader(self.data, param))
+        return None
+
+    def append_text(self, text):
+        """Add a run of characters"""
+        self.codes.append(Tokens.TEXT)
+        self.params.append(len(self.values))
+        self.values.append(text)
+
+    def append_control(self, code):
+        """Add a control character with no parameters"""
+        self.codes.append(code)
+        self.params.append(0)
+
+    def trim(self):
+        """Release the space set aside for appending more tokens"""
+        self.codes = array("B", self.codes)
+        self.params = array("H", self.params)
+        self.data = bytearray(self.data)
+
+    def append(self, statement):
+        """Add a decoded statement object, storing it as compactly as possible.
+        Consecutive characters are not merged here. See Decoder.decode_tokens()
+        """
+        statement_type = type(statement)
+        if statement_type in PARAMETER_CONTROL_TYPES:
+            self.codes.append(statement_type.CODE)
+            self.params.append(len(self.data))
+            self.data.extend(statement._args)
+        elif statement_type in TEXT_STATEMENTS:
+            self.append_text(str(statement))
+        elif statement_type in PLAIN_CONTROL_TYPES:
+            self.append_control(statement_type.CODE)
+        else:
+            self.codes.append(Tokens.OBJECT)
+            self.params.append(len(self.values))
+            self.values.append(statement)
+
+    def to_string(self, statement_types):
+        """Join the string versions of tokens of the given statement types.
+        Text runs are included if any of the TEXT_STATEMENTS types are.
+        :param statement_types: tuple of statement classes
+        """
+        text = any(t in statement_types for t in TEXT_STATEMENTS)
+        parts = []
+        for code, param in zip(self.codes, self.params):
+            if code == Tokens.TEXT:
+                if text:
+                    parts.append(self.values[param])
+            elif code == Tokens.OBJECT:
+                if isinstance(self.values[param], statement_types):
+                    parts.append(str(self.values[param]))
+            elif code in PLAIN_CONTROL_CHARACTERS:
+                if PLAIN_CONTROL_CHARACTERS[code] in statement_types:
+                    parts.append(PLAIN_CONTROL_STRINGS[code])
+            elif PARAMETER_CONTROL_CHARACTERS[code] in statement_types:
+                parts.append(str(self.value(code, param)))
+        return "".join(parts)
@@ -18,168 +18,432 @@ from arib.read import EOFError
 
 from arib.closed_caption import next_data_unit
 from arib.closed_caption import StatementBody
-from arib.data_group import DataGroup
+from arib.data_group import RetransmissionCache
+from arib.drcs_cache import DrcsCache
+from arib.drcs_cache import use_drcs_cache
 from arib.arib_exceptions import FileOpenError
 
 from arib.mpeg.ts import TS
 from arib.mpeg.ts import ES
+from arib.mpeg.ts import PSI
+from arib.mpeg.ts import StreamSource
+from arib.mpeg.timeline import PCRTimeline
 
 from arib.ass import ASSFormatter
+from arib.ass import ASS_STDOUT
+from arib.ass import DRCS_PATH_RECTS
+from arib.ass import DRCS_PATH_STRATEGIES
+from arib.sidecar import SidecarWriter
 
-# GLOBALS TO KEEP TRACK OF STATE
-initial_timestamp = None
-elapsed_time_s = 0
-pid = -1
-VERBOSE = False
-SILENT = False
 DEBUG = False
-ass = None
-infilename = ""
-outfilename = ""
-tmax = 0
-disable_drcs = False
 
+# Ways of timing captions
+TIMING_PCR = "pcr"  # by the last PCR seen before the caption PES
+TIMING_PTS = "pts"  # by the PTS in the caption PES header
+TIMING_MODES = (TIMING_PCR, TIMING_PTS)
 
-def OnProgress(bytes_read, total_bytes, percent):
-    """
-    Callback method invoked on a change in file progress percent (not every packet)
-    Meant as a lower frequency callback to update onscreen progress percent or something.
-    :param bytes_read:
-    :param total_bytes:
-    :param percent:
-    :return:
-    """
-    global VERBOSE
-    global SILENT
-    if not VERBOSE and not SILENT:
-        sys.stdout.write("progress: %.2f%%   \r" % (percent))
-        sys.stdout.flush()
 
-
-def OnTSPacket(packet):
+def parse_time(text):
     """
-    Callback invoked on the successful extraction of a single TS packet from a ts file
-    :param packet: The entire packet (header and payload) as a string
-    :return: None
+    Seconds from a time given as seconds, MM:SS or HH:MM:SS (seconds may have a fraction)
+    :raises ValueError: if text isn't a time
     """
-    global initial_timestamp
-    global elapsed_time_s
-    global time_offset
-
-    # pcr (program count record) can be used to calculate elapsed time in seconds
-    # we've read through the .ts file
-    pcr = TS.get_pcr(packet)
-    if pcr > 0:
-        current_timestamp = pcr
-        initial_timestamp = initial_timestamp or current_timestamp
-        delta = current_timestamp - initial_timestamp
-        elapsed_time_s = float(delta) / 90000.0 + time_offset
+    seconds = 0.0
+    for field in text.split(":"):
+        seconds = seconds * 60 + float(field)
+    if text.count(":") > 2 or seconds < 0:
+        raise ValueError(f"Not a time: {text!r}")
+    return seconds
 
 
-def OnESPacket(current_pid, packet, header_size):
+class ConversionSession(object):
     """
-    Callback invoked on the successful extraction of an Elementary Stream packet from the
-    Transport Stream file packets.
-    :param current_pid: The TS Program ID for the TS packets this info originated from
-    :param packet: The ENTIRE ES packet, header and payload-- which may have been assembled
-      from multiple TS packet payloads.
-    :param header_size: Size of the header in bytes (characters in the string). Provided to more
-      easily separate the packet into header and payload.
-    :return: None
+    Everything involved in converting one MPEG TS file into one .ass subtitle file:
+    the TS parser, timing state, .ass formatter and DRCS glyph cache.
+    Sessions share no state, so a single process can run any number of them,
+    one after the other or side by side in separate threads.
     """
-    global pid
-    global VERBOSE
-    global SILENT
-    global elapsed_time_s
-    global ass
-    global infilename
-    global outfilename
-    global tmax
-    global time_offset
-
-    if pid >= 0 and current_pid != pid:
-        return
-
-    try:
-        payload = ES.get_pes_payload(packet)
-        f = list(payload)
-        data_group = DataGroup(f)
-        if not data_group.is_management_data():
-            # We now have a Data Group that contains caption data.
-            # We take out its payload, but this is further divided into 'Data Unit' structures
-            caption = data_group.payload()
-            # iterate through the Data Units in this payload via another generator.
-            for data_unit in next_data_unit(caption):
-                # we're only interested in those Data Units which are
-                # "statement body" to get CC data.
-                if not isinstance(data_unit.payload(), StatementBody):
-                    continue
-
-                if not ass:
-                    v = not SILENT
-                    ass = ASSFormatter(
-                        tmax=tmax, video_filename=outfilename, verbose=v, disable_drcs=disable_drcs
-                    )
-
-                ass.format(data_unit.payload().payload(), elapsed_time_s)
-
-                # this code used to sed the PID we're scanning via first successful ARIB decode
-                # but i've changed it below to draw present CC language info form ARIB
-                # management data. Leaving this here for reference.
-                # if pid < 0 and not SILENT:
-                #  pid = current_pid
-                #  print("Found Closed Caption data in PID: " + str(pid))
-                #  print("Will now only process this PID to improve performance.")
 
+    def __init__(
+        self,
+        infilename,
+        outfilename=None,
+        pid=-1,
+        pcr_pid=-1,
+        tmax=5,
+        time_offset=0.0,
+        verbose=False,
+        silent=True,
+        disable_drcs=False,
+        drcs_path=DRCS_PATH_RECTS,
+        atomic=False,
+        sidecar=None,
+        timing=TIMING_PCR,
+        start=None,
+        end=None,
+        follow=False,
+        idle_timeout=None,
+        pipelined=False,
+    ):
+        """
+        :param infilename: MPEG TS file to convert. A FIFO or "-" (standard input) is read
+          as a stream.
+        :param outfilename: .ass file to write, or "-" for standard output.
+          infilename + '.ass' if None (standard output for standard input)
+        :param pid: PID of the closed caption PES. Found from the PMT if < 0
+        :param pcr_pid: PID of the PCR. Together with pid, all other PIDs are skipped
+        :param tmax: subtitle display time limit (seconds)
+        :param time_offset: shift all times in the .ass file by this many seconds
+        :param verbose: verbose output
+        :param silent: write nothing to stdout
+        :param disable_drcs: don't emit .ass drawing code for DRCS characters
+        :param drcs_path: how DRCS characters are drawn. One of DRCS_PATH_STRATEGIES
+        :param atomic: only rename the .ass file into place once complete
+        :param sidecar: also write decoded caption events to this file, for arib-render
+        :param timing: how captions are timed. One of TIMING_MODES
+        :param start: only convert captions from this many seconds into the file (since its
+          first PCR). The part of the file before is found by PCR search, and not parsed.
+        :param end: only convert captions up to this many seconds into the file
+        :param follow: at the end of the file wait for more to be written, as for a recording
+          in progress. Ends after idle_timeout seconds without more, or on KeyboardInterrupt.
+        :param idle_timeout: seconds to wait for more of a followed file (None for no limit)
+        :param pipelined: read the file on a thread of its own, overlapping reading with
+          decoding (regular files only). See TS.set_pipelined()
+        """
+        self.infilename = infilename
+        if outfilename is None:
+            outfilename = ASS_STDOUT if infilename == StreamSource.STDIN else infilename + ".ass"
+        self.outfilename = outfilename
+        self.pid = pid
+        self.pcr_pid = pcr_pid
+        self.tmax = tmax
+        self.time_offset = time_offset
+        self.verbose = verbose
+        self.silent = silent
+        self.disable_drcs = disable_drcs
+        self.drcs_path = drcs_path
+        self.atomic = atomic
+        self.sidecar = sidecar
+        self.timing = timing
+        self.start = start
+        self.end = end
+        self.follow = follow
+        self.idle_timeout = idle_timeout
+        self.pipelined = pipelined
+        # Dialogue lines are flushed out as they're written when reading a stream
+        self.live = False
+
+        # first and last PCR seen, and 90kHz ticks since the first PCR of the file
+        # at the first one. The clock carries on across discontinuities.
+        self.initial_timestamp = None
+        self.last_pcr = None
+        self.clock_ticks = 0
+        # (offset, pcr, ticks) point on the file's PCR time line parsing began at
+        self.start_point = None
+        # seconds since the first PCR (None until there is one) and the same with time_offset
+        self.pcr_time_s = None
+        self.elapsed_time_s = 0
+        self.sidecar_writer = None
+        self.ass = None
+        self.ts = None
+        self.drcs_cache = DrcsCache()
+        self.retransmissions = RetransmissionCache()
+
+    def run(self):
+        """Parse the whole TS file, writing the .ass file as closed captions are found.
+        The .ass file is closed before returning (or discarded on error, if atomic).
+        """
+        source = None
+        if self.follow or StreamSource.is_stream(self.infilename):
+            if self.start is not None or self.end is not None:
+                raise ValueError("A time range can only be converted from a regular file")
+            source = StreamSource.open(self.infilename, self.follow, self.idle_timeout)
+            self.live = True
+            ts = TS(source)
         else:
-            # management data
-            management_data = data_group.payload()
-            numlang = management_data.num_languages()
-            if pid < 0 and numlang > 0:
-                for language in range(numlang):
-                    if not SILENT:
-                        print(
-                            "Closed caption management data for language: "
-                            + management_data.language_code(language)
-                            + " available in PID: "
-                            + str(current_pid)
+            ts = TS(self.infilename)
+            ts.set_pipelined(self.pipelined)
+        if self.start is not None or self.end is not None:
+            with PCRTimeline(self.infilename, self.pcr_pid) as timeline:
+                self.pcr_pid = timeline.pcr_pid
+                start_offset, end_offset, self.start_point = timeline.byte_range(
+                    self.start, self.end
+                )
+            ts.set_range(start_offset, end_offset)
+        self.begin(ts)
+
+        with use_drcs_cache(self.drcs_cache):
+            try:
+                self.ts.Parse()
+            except KeyboardInterrupt:
+                # that's how following a recording in progress is ended. keep what we have.
+                if not self.follow:
+                    self.finish(commit=False)
+                    raise
+            except BaseException:
+                self.finish(commit=False)
+                raise
+            finally:
+                if source:
+                    source.close()
+        self.finish()
+
+    def begin(self, ts=None):
+        """
+        Hook the session up to a TS parser. run() does this itself. Otherwise call it
+        before feeding packets in as they're received via feed().
+        :param ts: mpeg.ts.TS to take packets from. One fed by feed() if None.
+        """
+        if ts is None:
+            ts = TS(None)
+            self.live = True
+        self.ts = ts
+        if self.pid >= 0 and self.pcr_pid >= 0:
+            self.ts.set_pid_filter([self.pid, self.pcr_pid])
+
+        self.ts.Progress = self.OnProgress
+        if self.pcr_pid >= 0:
+            self.ts.set_pcr_pid(self.pcr_pid)
+        self.ts.OnPCR = self.OnPCR
+        self.ts.OnESPacket = self.OnESPacket
+        self.ts.OnCaptionPID = self.OnCaptionPID
+
+        if self.sidecar:
+            self.sidecar_writer = SidecarWriter(self.sidecar)
+
+    def feed(self, data):
+        """
+        Parse the next TS packets of a live stream (see begin()), writing out Dialogue
+        lines as captions are completed.
+        :param data: bytes-like holding whole 188 byte TS packets (a UDP datagram, say)
+        """
+        with use_drcs_cache(self.drcs_cache):
+            self.ts.parse_buffer(data)
+
+    def finish(self, commit=True):
+        """Close the .ass file (and sidecar). Safe to call more than once.
+        :param commit: False to discard an atomic .ass file
+        """
+        if self.sidecar_writer:
+            self.sidecar_writer.close()
+        if self.ass:
+            self.ass.close(commit)
+
+    def found_captions(self):
+        """True if closed caption statements were found"""
+        return self.pid >= 0 and self.ass is not None
+
+    def file_written(self):
+        """True if an .ass file was written"""
+        return self.ass is not None and self.ass.file_written()
+
+    def dialogue_lines(self):
+        """Number of Dialogue lines written to the .ass file"""
+        return self.ass.dialogue_lines() if self.ass else 0
+
+    def OnProgress(self, bytes_read, total_bytes, percent):
+        """
+        Callback method invoked on a change in file progress percent (not every packet)
+        Meant as a lower frequency callback to update onscreen progress percent or something.
+        :param bytes_read:
+        :param total_bytes:
+        :param percent:
+        :return:
+        """
+        if not self.verbose and not self.silent:
+            sys.stdout.write("progress: %.2f%%   \r" % (percent))
+            sys.stdout.flush()
+
+    def start_ticks(self, timestamp):
+        """90kHz ticks since the first PCR of the file at the first PCR (or PTS) seen"""
+        if self.start_point is None:
+            return 0
+        _, pcr, ticks = self.start_point
+        return ticks + TS.pcr_delta(pcr, timestamp)
+
+    def OnPCR(self, pcr_pid, pcr):
+        """
+        Callback invoked on a PCR at the PCR PID (any PID until the PMT names it).
+        In PCR timing mode captions are timed by the last one.
+        In PTS timing mode the first one is the time base caption PTS are measured from
+        (unless a caption came before it, when that caption's PTS is).
+        :param pcr_pid: The TS Program ID the PCR was found on
+        :param pcr: 33 bit PCR base
+        :return: None
+        """
+        if self.last_pcr is None:
+            # (in PTS timing mode a caption before any PCR may have set the time base)
+            if self.initial_timestamp is None:
+                self.initial_timestamp = pcr
+                self.clock_ticks = self.start_ticks(pcr)
+        else:
+            delta = TS.pcr_delta(self.last_pcr, pcr)
+            # across a discontinuity time carries on from the last PCR
+            if 0 <= delta <= TS.PCR_MAX_GAP:
+                self.clock_ticks += delta
+        self.last_pcr = pcr
+
+        if self.timing == TIMING_PTS:
+            # that's all the PCR is needed for. From here on only the caption PID need be parsed.
+            self.ts.OnPCR = None
+            if self.pid >= 0:
+                self.ts.set_pid_filter([self.pid])
+            return
+        self.pcr_time_s = float(self.clock_ticks) / TS.PCR_HZ
+        self.elapsed_time_s = self.pcr_time_s + self.time_offset
+
+    def update_pts_time(self, packet):
+        """Time captions by the PTS in the header of the caption PES packet (PTS timing mode)"""
+        pts = ES.get_pts(packet)
+        if pts is None:
+            # keep the time of the last caption that had a PTS
+            return
+        if self.initial_timestamp is None:
+            # no PCR seen yet. measure from the first PTS instead.
+            self.initial_timestamp = pts
+            self.clock_ticks = self.start_ticks(pts)
+        # captions may be stamped a little before the first PCR (they're shown from
+        # the start), and the clock wraps
+        delta = TS.pcr_delta(self.initial_timestamp, pts)
+        self.pcr_time_s = float(max(self.clock_ticks + delta, 0)) / TS.PCR_HZ
+        self.elapsed_time_s = self.pcr_time_s + self.time_offset
+
+    def OnCaptionPID(self, caption_pid, pcr_pid):
+        """
+        Callback invoked when the PMT identifies the ARIB closed caption stream.
+        From here on only the caption PID and the PCR PID need be parsed.
+        :param caption_pid: The TS Program ID carrying ARIB closed caption PES
+        :param pcr_pid: The TS Program ID carrying the program clock reference
+        :return: None
+        """
+        if self.pid >= 0 and self.pid != caption_pid:
+            return
+        if self.pid < 0 and not self.silent:
+            print("Found ARIB closed caption stream in PID: " + str(caption_pid))
+            print("Will now only process this PID to improve performance.")
+        self.pid = caption_pid
+        pids = [caption_pid]
+        if pcr_pid != PSI.NULL_PID and self.ts.OnPCR:
+            pids.append(pcr_pid)
+        self.ts.set_pid_filter(pids)
+
+    def OnESPacket(self, current_pid, packet, header_size):
+        """
+        Callback invoked on the successful extraction of an Elementary Stream packet from the
+        Transport Stream file packets.
+        :param current_pid: The TS Program ID for the TS packets this info originated from
+        :param packet: The ENTIRE ES packet, header and payload-- which may have been assembled
+          from multiple TS packet payloads.
+        :param header_size: Size of the header in bytes (characters in the string). Provided to
+          more easily separate the packet into header and payload.
+        :return: None
+        """
+        if self.pid >= 0 and current_pid != self.pid:
+            return
+
+        if self.timing == TIMING_PTS:
+            self.update_pts_time(packet)
+
+        try:
+            # retransmitted copies of a data group are only decoded once
+            data_group = self.retransmissions.data_group(memoryview(packet)[header_size:])
+            if not data_group.is_management_data():
+                # We now have a Data Group that contains caption data.
+                # We take out its payload, but this is further divided into 'Data Unit' structures
+                caption = data_group.payload()
+                # iterate through the Data Units in this payload via another generator.
+                for data_unit in next_data_unit(caption):
+                    # we're only interested in those Data Units which are
+                    # "statement body" to get CC data.
+                    if not isinstance(data_unit.payload(), StatementBody):
+                        continue
+
+                    if not self.ass:
+                        self.ass = ASSFormatter(
+                            tmax=self.tmax,
+                            video_filename=self.outfilename,
+                            verbose=not self.silent,
+                            disable_drcs=self.disable_drcs,
+                            drcs_path=self.drcs_path,
+                            atomic=self.atomic,
+                            live=self.live,
                         )
-                        print("Will now only process this PID to improve performance.")
-                pid = current_pid
-
-    except EOFError:
-        pass
-    except FileOpenError as ex:
-        # allow IOErrors to kill application
-        raise ex
-    except Exception:
-        if not SILENT and pid >= 0:
-            print(
-                "Exception thrown while handling DataGroup in ES. This may be due to many factors"
-                + "such as file corruption or the .ts file using as yet unsupported features."
-            )
-            traceback.print_exc(file=sys.stdout)
 
+                    statement = data_unit.payload().payload()
+                    self.ass.format(statement, self.elapsed_time_s)
+                    if self.sidecar_writer:
+                        self.sidecar_writer.event(statement, self.pcr_time_s)
+
+                    # this code used to sed the PID we're scanning via first successful ARIB
+                    # decode but i've changed it below to draw present CC language info form
+                    # ARIB management data. Leaving this here for reference.
+                    # if pid < 0 and not SILENT:
+                    #  pid = current_pid
+                    #  print("Found Closed Caption data in PID: " + str(pid))
+                    #  print("Will now only process this PID to improve performance.")
+
+            else:
+                # management data
+                management_data = data_group.payload()
+                numlang = management_data.num_languages()
+                if self.pid < 0 and numlang > 0:
+                    for language in range(numlang):
+                        if not self.silent:
+                            print(
+                                "Closed caption management data for language: "
+                                + management_data.language_code(language)
+                                + " available in PID: "
+                                + str(current_pid)
+                            )
+                            print("Will now only process this PID to improve performance.")
+                    self.pid = current_pid
+
+        except EOFError:
+            pass
+        except FileOpenError as ex:
+            # allow IOErrors to kill application
+            raise ex
+        except Exception:
+            if not self.silent and self.pid >= 0:
+                print(
+                    "Exception thrown while handling DataGroup in ES. This may be due to many "
+                    + "factors such as file corruption or the .ts file using as yet unsupported "
+                    + "features."
+                )
+                traceback.print_exc(file=sys.stdout)
+
+
+def convert(ts_path, out_path=None, **opts):
+    """
+    Convert the closed captions in an MPEG TS file into an .ass subtitle file.
+    :param ts_path: MPEG TS file to convert
+    :param out_path: .ass file to write. ts_path + '.ass' if None
+    :param opts: any other ConversionSession arguments (pid, tmax, atomic...)
+    :return: the finished ConversionSession. See its found_captions() and file_written()
+    """
+    session = ConversionSession(str(ts_path), None if out_path is None else str(out_path), **opts)
+    session.run()
+    return session
 
-def main():
-    global pid
-    global VERBOSE
-    global SILENT
-    global infilename
-    global outfilename
-    global tmax
-    global time_offset
-    global disable_drcs
 
+def main():
     parser = argparse.ArgumentParser(
         description=(
             "Remove ARIB formatted Closed Caption information from an MPEG TS file "
             "and format the results as a standard .ass subtitle file."
         )
     )
-    parser.add_argument("infile", help="Input filename (MPEG2 Transport Stream File)", type=str)
     parser.add_argument(
-        "-o", "--outfile", help="Output filename (.ass subtitle file)", type=str, default=None
+        "infile",
+        help="Input filename (MPEG2 Transport Stream File, FIFO or - for standard input)",
+        type=str,
+    )
+    parser.add_argument(
+        "-o",
+        "--outfile",
+        help="Output filename (.ass subtitle file, or - for standard output)",
+        type=str,
+        default=None,
     )
     parser.add_argument(
         "-p",
@@ -191,6 +455,15 @@ def main():
         type=int,
         default=-1,
     )
+    parser.add_argument(
+        "--pcr-pid",
+        help=(
+            "Specify the PID carrying the program clock reference. When given along with "
+            "--pid, TS packets on all other PIDs are skipped to improve performance."
+        ),
+        type=int,
+        default=-1,
+    )
     parser.add_argument("-v", "--verbose", help="Verbose output.", action="store_true")
     parser.add_argument("-q", "--quiet", help="Does not write to stdout.", action="store_true")
     parser.add_argument(
@@ -211,36 +484,135 @@ def main():
         help="Disable emitting .ass drawing code for runtime (dynamic) DRCS characters.",
         action="store_true",
     )
+    parser.add_argument(
+        "--drcs-path",
+        help=(
+            "How DRCS character drawings are built: a rectangle per run of pixels on each "
+            "row (runs), runs merged down across rows (rects) or traced outlines (outline)."
+        ),
+        choices=DRCS_PATH_STRATEGIES,
+        default=DRCS_PATH_RECTS,
+    )
+    parser.add_argument(
+        "--atomic",
+        help=(
+            "Write the .ass file under a temporary name and only rename it to the output "
+            "filename once conversion completes, so it never holds partial output."
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--sidecar",
+        help=(
+            "Also write the decoded closed caption events to this file, so arib-render can "
+            "produce subtitles with other options without decoding the .ts file again."
+        ),
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--timing",
+        help=(
+            "Time captions by the last PCR seen before them (pcr) or by the PTS in their "
+            "PES header (pts). pts is frame accurate and skips everything but the caption "
+            "PID once the first PCR is found."
+        ),
+        choices=TIMING_MODES,
+        default=TIMING_PCR,
+    )
+    parser.add_argument(
+        "--start",
+        help=(
+            "Only convert captions from this time on (seconds, MM:SS or HH:MM:SS since the "
+            "start of the recording). Times in the .ass file stay relative to the start of "
+            "the recording."
+        ),
+        type=parse_time,
+        default=None,
+    )
+    parser.add_argument(
+        "--end",
+        help="Only convert captions up to this time (as for --start).",
+        type=parse_time,
+        default=None,
+    )
+    parser.add_argument(
+        "-f",
+        "--follow",
+        help=(
+            "At the end of the input file, wait for more to be written (as for a recording in "
+            "progress) and write Dialogue lines out as captions arrive. Ctrl-C to finish."
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        help="With --follow, finish after this many seconds without new data.",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--pipelined",
+        help=(
+            "Read the input file on a separate thread, so reading overlaps decoding. Faster "
+            "where reads are slow, as for network storage or files not in the page cache."
+        ),
+        action="store_true",
+    )
     args = parser.parse_args()
 
-    pid = args.pid
+    silent = args.quiet
+    verbose = args.verbose
     infilename = args.infile
-    outfilename = infilename + ".ass"
-    if args.outfile is not None:
-        outfilename = args.outfile
-    SILENT = args.quiet
-    VERBOSE = args.verbose
-    tmax = args.tmax
-    time_offset = args.timeoffset
-    disable_drcs = args.disable_drcs
-
-    if not os.path.exists(infilename) and not SILENT:
+    outfilename = args.outfile
+    if outfilename is None and infilename == StreamSource.STDIN:
+        outfilename = ASS_STDOUT
+    if outfilename == ASS_STDOUT:
+        # standard output is taken by the .ass file
+        silent = True
+
+    if infilename != StreamSource.STDIN and not os.path.exists(infilename) and not silent:
         print("Input filename :" + infilename + " does not exist.")
         sys.exit(-1)
 
-    ts = TS(infilename)
-
-    ts.Progress = OnProgress
-    ts.OnTSPacket = OnTSPacket
-    ts.OnESPacket = OnESPacket
+    if (args.start is not None or args.end is not None) and (
+        args.follow or StreamSource.is_stream(infilename)
+    ):
+        parser.error("--start and --end need a regular (seekable) input file")
+
+    session = convert(
+        infilename,
+        outfilename,
+        pid=args.pid,
+        pcr_pid=args.pcr_pid,
+        tmax=args.tmax,
+        time_offset=args.timeoffset,
+        verbose=verbose,
+        silent=silent,
+        disable_drcs=args.disable_drcs,
+        drcs_path=args.drcs_path,
+        atomic=args.atomic,
+        sidecar=args.sidecar,
+        timing=args.timing,
+        start=args.start,
+        end=args.end,
+        follow=args.follow,
+        idle_timeout=args.idle_timeout,
+        pipelined=args.pipelined,
+    )
 
-    ts.Parse()
+    if verbose and not silent:
+        print(
+            "Skipped decoding "
+            + str(session.retransmissions.skipped())
+            + " retransmitted caption data groups."
+        )
 
-    if pid < 0 and not SILENT:
+    if not session.found_captions() and not silent:
         print("*** Sorry. No ARIB subtitle content was found in file: " + infilename + " ***")
         sys.exit(-1)
 
-    if ass and not ass.file_written() and not SILENT:
+    if session.ass and not session.file_written() and not silent:
         print(
             "*** Sorry. No nonempty ARIB closed caption content found in file "
             + infilename
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+"""
+Module: ts2ass_batch
+Desc: Convert many MPEG transport stream files to .ass subtitle files over a pool of processes.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+Each worker process imports arib once and then runs a ts2ass.ConversionSession per file,
+so there's no interpreter start up to pay per file.
+
+A file found to have no closed captions gets an empty marker file where its .ass file
+would have gone (NO_CAPTIONS_SUFFIX added to its name), so later runs skip it too.
+
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import itertools
+import traceback
+import concurrent.futures
+
+from pathlib import Path
+
+from arib.ts2ass import convert
+from arib.ts2ass import TIMING_MODES
+from arib.ts2ass import TIMING_PCR
+from arib.ass import DRCS_PATH_RECTS
+from arib.ass import DRCS_PATH_STRATEGIES
+
+# marks a file converted without finding any captions (so no .ass file was written)
+NO_CAPTIONS_SUFFIX = ".no-captions"
+
+
+def is_glob(path):
+    return any(c in path for c in "*?[")
+
+
+def find_inputs(paths, pattern="*.ts", recursive=False):
+    """
+    Expand files, directories and glob patterns into the list of input files.
+    :param paths: file, directory or glob pattern strings
+    :param pattern: files to take from directories
+    :param recursive: search directories recursively
+    :return: list of (Path, Path relative to the directory or glob it was found under)
+      pairs, in order given and without repeats
+    """
+    found = {}
+    for path in paths:
+        if is_glob(path):
+            # the part of the pattern before any wildcards
+            parts = itertools.takewhile(lambda p: not is_glob(p), Path(path).parts)
+            base = Path(*parts)
+            matches = sorted(Path(p) for p in glob.glob(path, recursive=True))
+        elif os.path.isdir(path):
+            base = Path(path)
+            matches = sorted(base.rglob(pattern) if recursive else base.glob(pattern))
+        else:
+            matches = [Path(path)]
+            base = matches[0].parent
+        for m in matches:
+            if not m.is_dir():
+                found.setdefault(m, m.relative_to(base))
+    return list(found.items())
+
+
+def output_path(infile, outdir=None, relative=None):
+    """
+    .ass file written for infile. Named as ts2ass would, optionally in outdir.
+    :param relative: infile's path relative to the directory it was found under. Its
+      subdirectories are kept under outdir, so files with the same name don't collide.
+    """
+    outfile = infile.with_name(infile.name + ".ass")
+    if outdir is None:
+        return outfile
+    relative = Path(infile.name) if relative is None else relative
+    return Path(outdir) / relative.parent / outfile.name
+
+
+def no_captions_path(outfile):
+    """Marker file standing in for the .ass file of an input without captions"""
+    return Path(outfile).with_name(Path(outfile).name + NO_CAPTIONS_SUFFIX)
+
+
+def is_up_to_date(infile, outfile):
+    """True if outfile (or the marker of there being no captions) exists and is no older
+    than infile"""
+    try:
+        infile_mtime = os.stat(infile).st_mtime
+    except OSError:
+        return False
+    for path in (outfile, no_captions_path(outfile)):
+        try:
+            if os.stat(path).st_mtime >= infile_mtime:
+                return True
+        except OSError:
+            pass
+    return False
+
+
+def convert_one(infile, outfile, opts):
+    """
+    Convert a single file. Runs in a worker process.
+    :return: dict of results for the summary report
+    """
+    result = {
+        "input": str(infile),
+        "output": str(outfile),
+        "bytes": 0,
+        "seconds": 0.0,
+        "captions": False,
+        "dialogue_lines": 0,
+        "error": None,
+    }
+    start = time.perf_counter()
+    marker = no_captions_path(outfile)
+    try:
+        result["bytes"] = os.path.getsize(infile)
+        os.makedirs(os.path.dirname(outfile) or ".", exist_ok=True)
+        session = convert(infile, outfile, **opts)
+        result["captions"] = session.file_written()
+        result["dialogue_lines"] = session.dialogue_lines()
+        if result["captions"]:
+            if marker.exists():
+                marker.unlink()
+        else:
+            marker.touch()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        if opts.get("verbose"):
+            traceback.print_exc(file=sys.stdout)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def summarize(results, skipped, elapsed):
+    """Summary report of a batch run, as a dict"""
+    results = sorted(results, key=lambda r: r["input"])
+    converted = [r for r in results if r["error"] is None]
+    total_bytes = sum(r["bytes"] for r in converted)
+    return {
+        "files": len(results) + len(skipped),
+        "converted": len(converted),
+        "skipped": len(skipped),
+        "failed": len(results) - len(converted),
+        "with_captions": sum(1 for r in converted if r["captions"]),
+        "dialogue_lines": sum(r["dialogue_lines"] for r in converted),
+        "bytes": total_bytes,
+        "seconds": elapsed,
+        "mb_per_second": total_bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+        "results": results,
+        "skipped_files": [str(f) for f in skipped],
+    }
+
+
+def print_summary(summary):
+    print(
+        f"{summary['files']} files: {summary['converted']} converted, "
+        f"{summary['skipped']} up to date, {summary['failed']} failed."
+    )
+    print(
+        f"{summary['with_captions']} with closed captions "
+        f"({summary['dialogue_lines']} dialogue lines)."
+    )
+    print(
+        f"{summary['bytes'] / 1e6:.1f} MB in {summary['seconds']:.1f} s "
+        f"({summary['mb_per_second']:.1f} MB/s)."
+    )
+    for r in summary["results"]:
+        if r["error"] is not None:
+            print(f"FAILED {r['input']}: {r['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Remove ARIB formatted Closed Caption information from many MPEG TS files "
+            "and format the results as standard .ass subtitle files."
+        )
+    )
+    parser.add_argument(
+        "inputs",
+        help="Input files, directories (searched for .ts files) or glob patterns.",
+        nargs="+",
+        type=str,
+    )
+    parser.add_argument(
+        "-o",
+        "--outdir",
+        help=(
+            "Directory to write .ass files to (next to each input file if not specified). "
+            "Subdirectories of input directories and glob patterns are kept."
+        ),
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes (the number of CPUs if not specified).",
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "-r", "--recursive", help="Search input directories recursively.", action="store_true"
+    )
+    parser.add_argument(
+        "--pattern",
+        help="Files to convert in input directories (default: *.ts).",
+        type=str,
+        default="*.ts",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        help="Convert files even if their .ass file is newer than they are.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--report", help="Also write the summary report to this file as JSON.", type=str
+    )
+    parser.add_argument("-v", "--verbose", help="Verbose output.", action="store_true")
+    parser.add_argument("-q", "--quiet", help="Does not write to stdout.", action="store_true")
+    parser.add_argument(
+        "-t", "--tmax", help="Subtitle display time limit (seconds).", type=int, default=5
+    )
+    parser.add_argument(
+        "-m",
+        "--timeoffset",
+        help=(
+            "Shift all time values in generated .ass files "
+            "by indicated floating point offset in seconds."
+        ),
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--disable-drcs",
+        help="Disable emitting .ass drawing code for runtime (dynamic) DRCS characters.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--drcs-path",
+        help="How DRCS character drawings are built (see arib-ts2ass).",
+        choices=DRCS_PATH_STRATEGIES,
+        default=DRCS_PATH_RECTS,
+    )
+    parser.add_argument(
+        "--timing",
+        help="Time captions by PCR or by PTS (see arib-ts2ass).",
+        choices=TIMING_MODES,
+        default=TIMING_PCR,
+    )
+    parser.add_argument(
+        "--pipelined",
+        help="Read each input file on a separate thread (see arib-ts2ass).",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    silent = args.quiet
+    # outputs are always written atomically: a partial .ass file left by an interrupted
+    # run would otherwise look up to date to the next one.
+    opts = {
+        "tmax": args.tmax,
+        "time_offset": args.timeoffset,
+        "verbose": args.verbose and not silent,
+        "silent": not args.verbose or silent,
+        "disable_drcs": args.disable_drcs,
+        "drcs_path": args.drcs_path,
+        "atomic": True,
+        "timing": args.timing,
+        "pipelined": args.pipelined,
+    }
+
+    inputs = find_inputs(args.inputs, args.pattern, args.recursive)
+    outputs = {}
+    for infile, relative in inputs:
+        outfile = output_path(infile, args.outdir, relative)
+        if outfile in outputs:
+            parser.error(f"{outputs[outfile]} and {infile} would both be converted to {outfile}")
+        outputs[outfile] = infile
+    jobs = []
+    skipped = []
+    for outfile, infile in outputs.items():
+        if not args.force and is_up_to_date(infile, outfile):
+            skipped.append(infile)
+        else:
+            jobs.append((infile, outfile))
+
+    results = []
+    start = time.perf_counter()
+    if jobs:
+        workers = max(1, min(args.jobs, len(jobs)))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(convert_one, str(infile), str(outfile), opts)
+                for infile, outfile in jobs
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if not silent:
+                    status = "failed" if result["error"] else "done"
+                    if not result["error"] and not result["captions"]:
+                        status = "no captions"
+                    print(
+                        f"[{len(results)}/{len(jobs)}] {result['input']}: {status} "
+                        f"({result['seconds']:.1f} s)"
+                    )
+    summary = summarize(results, skipped, time.perf_counter() - start)
+
+    if not silent:
+        print_summary(summary)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    sys.exit(-1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
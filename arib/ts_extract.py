@@ -12,15 +12,16 @@ import sys
 import argparse
 import traceback
 from arib.read import EOFError
+from arib.read import ByteReader
 
 from arib.mpeg.ts import TS
-from arib.mpeg.ts import ES
 
 from arib.closed_caption import next_data_unit
 from arib.closed_caption import StatementBody
 import arib.code_set as code_set
 import arib.control_characters as control_characters
 from arib.data_group import DataGroup
+from arib.tokens import Tokens
 
 # print out some additional info for DRCS values
 from arib.closed_caption import set_DRCS_debug
@@ -87,6 +88,8 @@ def formatter(statements, timestamp):
     # line = ''.join([(s) for str(s) in statements if type(s) in DISPLAYED_CC_STATEMENTS])
     # return line
     allowed = tuple(DISPLAYED_CC_STATEMENTS)
+    if isinstance(statements, Tokens):
+        return statements.to_string(allowed)
     return "".join(str(s) for s in statements if isinstance(s, allowed))
 
 
@@ -145,8 +148,7 @@ def OnESPacket(current_pid, packet, header_size):
         return
 
     try:
-        payload = ES.get_pes_payload(packet)
-        f = list(payload)
+        f = ByteReader(packet, header_size)
         data_group = DataGroup(f)
         if not data_group.is_management_data():
             # We now have a Data Group that contains caption data.
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+"""
+Module: udp_ingest
+Desc: Caption live MPEG TS services received over UDP (or RTP) multicast, many at once.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+Each service gets a ServiceIngest: an asyncio DatagramProtocol that takes the TS packets
+out of each datagram (after the RTP header, if there is one) and queues them for a task
+feeding them to its own ts2ass.ConversionSession. Dialogue lines are written out to the
+service's .ass file as captions arrive.
+
+Queues are bounded. If a service's decoding falls behind, datagrams are dropped (and
+counted) rather than piling up. Lost RTP datagrams and continuity counter errors on the
+caption PID are counted too.
+
+>arib-udp2ass udp://239.1.1.1:1234=nhk.ass rtp://239.1.1.2:1234=etv.ass
+
+"""
+
+import sys
+import json
+import struct
+import socket
+import asyncio
+import argparse
+import ipaddress
+
+from arib.mpeg.ts import TS
+from arib.ts2ass import ConversionSession
+from arib.ts2ass import TIMING_MODES
+from arib.ts2ass import TIMING_PCR
+from arib.ass import DRCS_PATH_RECTS
+from arib.ass import DRCS_PATH_STRATEGIES
+
+# datagrams queued per service before they're dropped (7 packets each: ~5MB)
+QUEUE_DATAGRAMS = 4096
+# socket receive buffer asked for per service
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+
+SCHEMES = ("udp", "rtp")
+
+# RTP (RFC 3550) fixed header
+RTP_VERSION = 2
+RTP_HEADER_SIZE = 12
+RTP_PADDING_MASK = 0x20
+RTP_EXTENSION_MASK = 0x10
+RTP_CSRC_COUNT_MASK = 0x0F
+RTP_SEQUENCE_WRAP = 1 << 16
+
+
+def strip_rtp(datagram):
+    """
+    The TS packets in a datagram, after its RTP header if it has one.
+    Datagrams starting with a TS sync byte are taken as plain TS over UDP.
+    :return: (memoryview of the TS packets, RTP sequence number or None)
+    :raises ValueError: if the datagram is neither
+    """
+    view = memoryview(datagram)
+    if len(view) and view[0] == TS.SYNC_BYTE:
+        return view, None
+    if len(view) < RTP_HEADER_SIZE or view[0] >> 6 != RTP_VERSION:
+        raise ValueError("Datagram holds neither TS packets nor an RTP header")
+    flags = view[0]
+    sequence = (view[2] << 8) | view[3]
+    start = RTP_HEADER_SIZE + 4 * (flags & RTP_CSRC_COUNT_MASK)
+    if flags & RTP_EXTENSION_MASK:
+        if len(view) < start + 4:
+            raise ValueError("Truncated RTP header extension")
+        start += 4 + 4 * ((view[start + 2] << 8) | view[start + 3])
+    end = len(view)
+    if flags & RTP_PADDING_MASK:
+        end -= view[-1]
+    if start > end:
+        raise ValueError("Truncated RTP datagram")
+    return view[start:end], sequence
+
+
+def parse_service(spec):
+    """
+    (host, port, outfile) from a service given as udp://host:port[=outfile]
+    (or rtp://...). outfile is host_port.ass if not given.
+    """
+    url, _, outfile = spec.partition("=")
+    scheme, sep, address = url.partition("://")
+    if not sep or scheme not in SCHEMES:
+        raise ValueError(f"Not a udp:// or rtp:// service: {spec!r}")
+    host, _, port = address.lstrip("@").rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Service needs a host and port: {spec!r}")
+    return host, int(port), outfile or f"{host}_{port}.ass"
+
+
+def open_socket(host, port, interface="0.0.0.0", receive_buffer=RECEIVE_BUFFER_SIZE):
+    """
+    Non-blocking UDP socket receiving datagrams sent to host:port, joining the multicast
+    group on the given interface if host is a multicast address. (IPv4)
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        except OSError:
+            pass
+        if ipaddress.ip_address(host).is_multicast:
+            try:
+                # only receive this group's datagrams, where the OS allows binding to it
+                sock.bind((host, port))
+            except OSError:
+                sock.bind(("", port))
+            membership = struct.pack("4s4s", socket.inet_aton(host), socket.inet_aton(interface))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        else:
+            sock.bind((host, port))
+        sock.setblocking(False)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+class ServiceIngest(asyncio.DatagramProtocol):
+    """
+    Receives one live service and captions it: datagrams are queued as they're received
+    and run() feeds them to a ConversionSession.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        outfilename,
+        queue_size=QUEUE_DATAGRAMS,
+        idle_timeout=None,
+        **opts,
+    ):
+        """
+        :param host: address the service is sent to (multicast group or local address)
+        :param port: UDP port
+        :param outfilename: .ass file to write
+        :param queue_size: datagrams queued before more are dropped
+        :param idle_timeout: finish after this many seconds without a datagram (None: never)
+        :param opts: any other ConversionSession arguments (tmax, timing...)
+        """
+        self.host = host
+        self.port = port
+        self.name = f"{host}:{port}"
+        self.idle_timeout = idle_timeout
+        self.session = ConversionSession(self.name, outfilename, **opts)
+        self.queue_size = queue_size
+        # made once there's an event loop (see connection_made())
+        self.queue = None
+        self.transport = None
+
+        # counters
+        self.datagrams = 0
+        self.packets = 0
+        self.malformed = 0
+        self.queue_dropped = 0
+        self.rtp_lost = 0
+        self.cc_errors = 0
+        self._next_sequence = None
+        self._continuity_counter = -1
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.queue = asyncio.Queue(self.queue_size)
+
+    def datagram_received(self, data, addr):
+        self.datagrams += 1
+        try:
+            packets, sequence = strip_rtp(data)
+        except ValueError:
+            self.malformed += 1
+            return
+        if len(packets) % TS.PACKET_SIZE:
+            self.malformed += 1
+            return
+        if sequence is not None:
+            gap = 0
+            if self._next_sequence is not None:
+                gap = (sequence - self._next_sequence) % RTP_SEQUENCE_WRAP
+            # a jump back is a late (reordered) or repeated datagram, not a loss
+            if gap < RTP_SEQUENCE_WRAP // 2:
+                self.rtp_lost += gap
+                self._next_sequence = (sequence + 1) % RTP_SEQUENCE_WRAP
+        try:
+            self.queue.put_nowait(packets)
+        except asyncio.QueueFull:
+            self.queue_dropped += 1
+
+    async def run(self):
+        """Feed received packets to the session until cancelled (or idle_timeout passes
+        without any). The .ass file is finished off either way.
+        """
+        self.session.begin()
+        try:
+            while True:
+                try:
+                    packets = await asyncio.wait_for(self.queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                self.packets += len(packets) // TS.PACKET_SIZE
+                self.check_continuity(packets)
+                try:
+                    self.session.feed(packets)
+                except Exception:
+                    # no sync byte where a packet should start
+                    self.malformed += 1
+        finally:
+            self.session.finish()
+            if self.transport:
+                self.transport.close()
+
+    def check_continuity(self, packets):
+        """Count gaps in the continuity counter of the caption PID's packets"""
+        pid = self.session.pid
+        if pid < 0:
+            return
+        for i in range(0, len(packets), TS.PACKET_SIZE):
+            if (((packets[i + 1] & 0x1F) << 8) | packets[i + 2]) != pid:
+                continue
+            # the counter only goes up on packets carrying a payload
+            if not packets[i + 3] & 0x10:
+                continue
+            counter = packets[i + 3] & TS.CONTINUITY_COUNTER_MASK
+            last = self._continuity_counter
+            # (a packet may be sent twice)
+            if last >= 0 and counter != (last + 1) & TS.CONTINUITY_COUNTER_MASK and counter != last:
+                self.cc_errors += 1
+            self._continuity_counter = counter
+
+    def stats(self):
+        """Counters of the service as a dict"""
+        return {
+            "service": self.name,
+            "output": self.session.outfilename,
+            "caption_pid": self.session.pid if self.session.pid >= 0 else None,
+            "datagrams": self.datagrams,
+            "packets": self.packets,
+            "dialogue_lines": self.session.dialogue_lines(),
+            "malformed": self.malformed,
+            "queue_dropped": self.queue_dropped,
+            "rtp_lost": self.rtp_lost,
+            "cc_errors": self.cc_errors,
+        }
+
+
+async def serve(ingests, interface="0.0.0.0"):
+    """
+    Receive and caption the services of some ServiceIngests, until cancelled or they've all
+    gone idle.
+    :param interface: address of the network interface to join multicast groups on
+    """
+    loop = asyncio.get_running_loop()
+    for ingest in ingests:
+        sock = open_socket(ingest.host, ingest.port, interface)
+        await loop.create_datagram_endpoint(lambda ingest=ingest: ingest, sock=sock)
+    await asyncio.gather(*(ingest.run() for ingest in ingests))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Caption live MPEG TS services received over UDP or RTP (unicast or multicast), "
+            "writing .ass Dialogue lines as captions arrive."
+        )
+    )
+    parser.add_argument(
+        "services",
+        help="Services as udp://host:port=outfile.ass or rtp://host:port=outfile.ass",
+        nargs="+",
+        type=str,
+    )
+    parser.add_argument(
+        "-i",
+        "--interface",
+        help="Address of the network interface to join multicast groups on.",
+        type=str,
+        default="0.0.0.0",
+    )
+    parser.add_argument(
+        "--queue",
+        help="Datagrams queued per service before more are dropped.",
+        type=int,
+        default=QUEUE_DATAGRAMS,
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        help="Finish a service after this many seconds without data (default: never).",
+        type=float,
+        default=None,
+    )
+    parser.add_argument("-v", "--verbose", help="Verbose output.", action="store_true")
+    parser.add_argument(
+        "-q", "--quiet", help="Don't write the counters out at the end.", action="store_true"
+    )
+    parser.add_argument(
+        "-t", "--tmax", help="Subtitle display time limit (seconds).", type=int, default=5
+    )
+    parser.add_argument(
+        "-m",
+        "--timeoffset",
+        help="Shift all time values in generated .ass files by this many seconds.",
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--disable-drcs",
+        help="Disable emitting .ass drawing code for runtime (dynamic) DRCS characters.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--drcs-path",
+        help="How DRCS character drawings are built (see arib-ts2ass).",
+        choices=DRCS_PATH_STRATEGIES,
+        default=DRCS_PATH_RECTS,
+    )
+    parser.add_argument(
+        "--timing",
+        help="Time captions by PCR or by PTS (see arib-ts2ass).",
+        choices=TIMING_MODES,
+        default=TIMING_PCR,
+    )
+    args = parser.parse_args()
+
+    try:
+        services = [parse_service(s) for s in args.services]
+    except ValueError as e:
+        parser.error(str(e))
+
+    ingests = [
+        ServiceIngest(
+            host,
+            port,
+            outfile,
+            queue_size=args.queue,
+            idle_timeout=args.idle_timeout,
+            tmax=args.tmax,
+            time_offset=args.timeoffset,
+            verbose=args.verbose,
+            silent=not args.verbose,
+            disable_drcs=args.disable_drcs,
+            drcs_path=args.drcs_path,
+            timing=args.timing,
+        )
+        for host, port, outfile in services
+    ]
+    try:
+        asyncio.run(serve(ingests, args.interface))
+    except KeyboardInterrupt:
+        pass
+
+    if not args.quiet:
+        for ingest in ingests:
+            print(json.dumps(ingest.stats()))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Module: udp_replay
+Desc: Send an MPEG TS file out over UDP (or RTP) as a head-end would, for arib-udp2ass.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+Packets go out 7 to a datagram, paced by the PCR so the stream arrives at its own rate
+(or some multiple of it).
+
+>arib-udp-replay recording.ts udp://127.0.0.1:5000 --speed 10
+
+"""
+
+import os
+import sys
+import time
+import random
+import struct
+import socket
+import argparse
+
+from arib.mpeg.ts import TS
+from arib.udp_ingest import parse_service
+from arib.udp_ingest import RTP_VERSION
+from arib.udp_ingest import RTP_SEQUENCE_WRAP
+
+# TS packets per datagram. 7 * 188 bytes fits an ethernet MTU.
+PACKETS_PER_DATAGRAM = 7
+# RTP payload type of MPEG2 TS (RFC 3551)
+RTP_PAYLOAD_TYPE_MP2T = 33
+_RTP_HEADER = struct.Struct(">BBHLL")
+
+
+def replay(
+    filename,
+    host,
+    port,
+    rtp=False,
+    speed=1.0,
+    packets_per_datagram=PACKETS_PER_DATAGRAM,
+    ttl=1,
+):
+    """
+    Send a TS file to host:port.
+    :param rtp: put an RTP header on each datagram
+    :param speed: send at this many times the stream's rate, by its PCR (0: as fast as possible)
+    :param ttl: multicast time to live
+    :return: number of datagrams sent
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    address = (host, port)
+    ssrc = random.getrandbits(32)
+    sequence = random.getrandbits(16)
+    first_pcr = None
+    start = time.monotonic()
+    sent = 0
+    datagram = []
+
+    def send():
+        nonlocal sequence, sent
+        payload = b"".join(datagram)
+        datagram.clear()
+        if rtp:
+            timestamp = int((time.monotonic() - start) * TS.PCR_HZ) & 0xFFFFFFFF
+            header = _RTP_HEADER.pack(
+                RTP_VERSION << 6, RTP_PAYLOAD_TYPE_MP2T, sequence, timestamp, ssrc
+            )
+            sequence = (sequence + 1) % RTP_SEQUENCE_WRAP
+            payload = header + payload
+        sock.sendto(payload, address)
+        sent += 1
+
+    try:
+        for packet in TS.next_packet(filename):
+            datagram.append(packet)
+            pcr = TS.get_pcr(packet)
+            if pcr > 0 and speed > 0:
+                if first_pcr is None:
+                    first_pcr = pcr
+                # the clock can wrap (but not go backward much) while we replay
+                due = TS.pcr_delta(first_pcr, pcr) / TS.PCR_HZ / speed
+                delay = due - (time.monotonic() - start)
+                if delay > 0.005:
+                    time.sleep(delay)
+            if len(datagram) == packets_per_datagram:
+                send()
+        # the last few packets of the file, if they don't fill a datagram
+        if datagram:
+            send()
+    finally:
+        sock.close()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Send an MPEG TS file out over UDP or RTP, paced by its PCR."
+    )
+    parser.add_argument("infile", help="Input filename (MPEG2 Transport Stream File)", type=str)
+    parser.add_argument(
+        "destination", help="Where to send it: udp://host:port or rtp://host:port", type=str
+    )
+    parser.add_argument(
+        "--speed",
+        help="Send at this many times the stream's own rate (0: as fast as possible).",
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        "--packets",
+        help="TS packets per datagram.",
+        type=int,
+        default=PACKETS_PER_DATAGRAM,
+    )
+    parser.add_argument("--ttl", help="Multicast time to live.", type=int, default=1)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.infile):
+        print("Input filename :" + args.infile + " does not exist.")
+        sys.exit(-1)
+    try:
+        host, port, _ = parse_service(args.destination)
+    except ValueError as e:
+        parser.error(str(e))
+
+    sent = replay(
+        args.infile,
+        host,
+        port,
+        rtp=args.destination.startswith("rtp://"),
+        speed=args.speed,
+        packets_per_datagram=args.packets,
+        ttl=args.ttl,
+    )
+    print(f"Sent {sent} datagrams to {host}:{port}")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Module: data_group_resync
+Desc: Benchmark parsing the data groups of a damaged .es file, which has to find its way
+  back to the next data group start every time it hits damage.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+The damaged file is made from a tests/*.es file: runs of random bytes are written over it
+in places and blocks of random garbage inserted, always the same way for a given seed.
+The undamaged file is timed too.
+
+>python benchmarks/data_group_resync.py tests/aibou.es
+
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+
+from arib.data_group import next_data_group
+
+# damage done to the file: runs of random bytes written over it (up to RUN_BYTES long),
+# and blocks of random garbage inserted
+RUNS = 400
+RUN_BYTES = 64
+BLOCKS = 5
+BLOCK_BYTES = 2 * 1024 * 1024
+
+
+def damage(data, runs=RUNS, blocks=BLOCKS, block_bytes=BLOCK_BYTES, seed=6):
+    """Copy of data with runs of bytes overwritten and garbage blocks inserted"""
+    data = bytearray(data)
+    rng = random.Random(seed)
+    for _ in range(runs):
+        i = rng.randrange(len(data))
+        for k in range(rng.randrange(1, RUN_BYTES)):
+            if i + k < len(data):
+                data[i + k] = rng.randrange(256)
+    rng = random.Random(seed + 1)
+    for _ in range(blocks):
+        i = rng.randrange(len(data))
+        data[i:i] = rng.randbytes(block_bytes)
+    return bytes(data)
+
+
+def time_parse(filename, repeat):
+    """(data groups found, best time to parse them all of repeat runs)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # (resyncing announces itself on stdout)
+        with contextlib.redirect_stdout(io.StringIO()):
+            count = sum(1 for _ in next_data_group(filename))
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time parsing the data groups of an .es file, damaged and undamaged."
+    )
+    parser.add_argument("infile", help="Input filename (.es file)", type=str)
+    parser.add_argument("--repeat", help="Runs of each (best taken).", type=int, default=3)
+    parser.add_argument("--seed", help="Seed of the damage done.", type=int, default=6)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.infile):
+        print("Input filename :" + args.infile + " does not exist.")
+        sys.exit(-1)
+
+    with open(args.infile, "rb") as f:
+        data = f.read()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        damaged = os.path.join(tmpdir, "damaged.es")
+        with open(damaged, "wb") as f:
+            f.write(damage(data, seed=args.seed))
+        for name, filename in (("undamaged", args.infile), ("damaged", damaged)):
+            count, seconds = time_parse(filename, args.repeat)
+            size = os.path.getsize(filename)
+            print(
+                f"{name:>9}: {size / 1e6:5.1f} MB, {count} data groups in {seconds:6.2f} s "
+                f"({size / 1e6 / seconds:5.1f} MB/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Module: decode_statements
+Desc: Benchmark decoding the caption statements of .es files, characters and control
+  characters per second.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+The statement bodies are pulled out of the files once, then decoded over and over: to
+lists of statement objects (Decoder.decode() a character at a time) and to token streams
+(Decoder.decode_tokens()). Parsing the whole of the files is timed too.
+
+To compare with an earlier version, run it from a checkout of that version (it needs
+read.ByteReader) with PYTHONPATH pointing there.
+
+>python benchmarks/decode_statements.py tests/*.es
+
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+from arib import read
+from arib.closed_caption import StatementBody
+from arib.data_group import next_data_group
+
+# (older trees, to compare against, decode statements to objects only)
+TOKENS = hasattr(StatementBody, "parse_tokens")
+PARSE = "parse_tokens" if TOKENS else "parse_contents"
+
+
+def parse_all(filenames):
+    """Parse every data group of the files"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for filename in filenames:
+            for _ in next_data_group(filename):
+                pass
+
+
+def statement_bodies(filenames):
+    """(bytes, size) of every statement body in the files. The bytes are all those read
+    decoding it, which may run past its data unit's size."""
+    bodies = []
+    parse = getattr(StatementBody, PARSE)
+
+    def capture(f, bytes_to_read):
+        start = f.tell()
+        payload = parse(f, bytes_to_read)
+        end = f.tell()
+        f.seek(start)
+        bodies.append((bytes(read.buffer(f, end - start)), bytes_to_read))
+        return payload
+
+    setattr(StatementBody, PARSE, staticmethod(capture))
+    try:
+        parse_all(filenames)
+    finally:
+        setattr(StatementBody, PARSE, staticmethod(parse))
+    return bodies
+
+
+def best_of(repeat, fn, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def decode_objects(bodies):
+    for body, size in bodies:
+        StatementBody.parse_contents(read.ByteReader(body), size)
+
+
+def decode_tokens(bodies):
+    for body, size in bodies:
+        StatementBody.parse_tokens(read.ByteReader(body), size)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time decoding the caption statements of .es files."
+    )
+    parser.add_argument("infiles", help="Input filenames (.es files)", type=str, nargs="+")
+    parser.add_argument("--repeat", help="Runs of each (best taken).", type=int, default=5)
+    args = parser.parse_args()
+
+    for filename in args.infiles:
+        if not os.path.exists(filename):
+            print("Input filename :" + filename + " does not exist.")
+            sys.exit(-1)
+
+    bodies = statement_bodies(args.infiles)
+    # characters and control characters, each decoded to one statement object
+    count = 0
+    for body, size in bodies:
+        count += len(StatementBody.parse_contents(read.ByteReader(body), size))
+    print(f"{len(bodies)} statement bodies, {count} characters and control characters")
+
+    for name, fn, runs_over in (
+        ("statement objects", decode_objects, bodies),
+        ("token streams", decode_tokens, bodies),
+        ("whole .es parse", parse_all, args.infiles),
+    ):
+        if fn is decode_tokens and not TOKENS:
+            continue
+        seconds = best_of(args.repeat, fn, runs_over)
+        print(f"{name:>17}: {seconds:6.3f} s ({count / seconds / 1000:6.0f}k chars/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Module: dialog_append
+Desc: Benchmark building up an ASS Dialog line a character at a time, as the ASS formatter
+  does with decoded captions, and turning it into the line's text.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+Each run starts an empty ass.Dialog, adds characters to it one at a time with += (with
+an override tag before every few characters, with --tags) and then takes str() of it.
+
+To compare with an earlier version, run it from a checkout of that version with PYTHONPATH
+pointing there.
+
+>python benchmarks/dialog_append.py --chars 1000 50000
+
+"""
+
+import time
+import argparse
+
+from arib.ass import Dialog
+
+# the text added, a character at a time
+TEXT = "恋人タバコやめないの?また言う"
+# an override tag, as the size and color handlers add
+TAG = "{\\rsmall}{\\c&Hffffff&}"
+# characters between tags, with --tags
+TAG_EVERY = 8
+
+
+def build(chars, tags):
+    """Build a Dialog of chars characters and return its text"""
+    dialog = Dialog("")
+    text = TEXT
+    for n in range(chars):
+        if tags and n % TAG_EVERY == 0:
+            dialog += TAG
+        dialog += text[n % len(text)]
+    return str(dialog)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time building an ASS Dialog line a character at a time."
+    )
+    parser.add_argument(
+        "--chars",
+        help="Characters in the line (one run each).",
+        type=int,
+        nargs="+",
+        default=[1000, 50000],
+    )
+    parser.add_argument("--tags", help="Add an override tag now and then.", action="store_true")
+    parser.add_argument("--repeat", help="Runs of each (best taken).", type=int, default=5)
+    args = parser.parse_args()
+
+    for chars in args.chars:
+        # build enough lines for each timing to be measurable
+        lines = max(1, 200000 // chars)
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for _ in range(lines):
+                build(chars, args.tags)
+            seconds = (time.perf_counter() - start) / lines
+            best = seconds if best is None else min(best, seconds)
+        print(f"{chars:>7} chars: {best * 1000:8.3f} ms/line ({best / chars * 1e6:5.2f} us/char)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Module: drcs_paths
+Desc: Benchmark the ASS drawing paths made of the DRCS glyphs of .es files: bytes per glyph
+  and time per glyph, for each of the ways of drawing them (ass.DRCS_PATH_STRATEGIES).
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+The distinct glyphs defined in the files are collected once, then turned into paths over
+and over. Sizes are of the paths alone, as bitmap_to_ass_path() gives them.
+
+To compare with an earlier version, run it from a checkout of that version with PYTHONPATH
+pointing there. Versions without DRCS_PATH_STRATEGIES draw a rectangle per run of pixels
+on each row, reported as 'runs'.
+
+>python benchmarks/drcs_paths.py tests/*.es
+
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+import arib.ass as ass
+from arib.drcs_cache import DRCS_CACHE
+from arib.drcs_decoder import drcs_unpack_to_bitmap
+from arib.data_group import next_data_group
+
+# (older trees have the one way of drawing glyphs)
+STRATEGIES = getattr(ass, "DRCS_PATH_STRATEGIES", ("runs",))
+
+
+def glyph_bitmaps(filenames):
+    """Unpacked bitmaps of the distinct DRCS glyphs defined in the files"""
+    glyphs = {}
+    cache_type = type(DRCS_CACHE)
+    put = cache_type.put
+
+    def collect(self, set_id, code, glyph):
+        glyphs.setdefault(glyph.content_key(), glyph)
+        put(self, set_id, code, glyph)
+
+    cache_type.put = collect
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for filename in filenames:
+                for _ in next_data_group(filename):
+                    pass
+    finally:
+        cache_type.put = put
+    return [
+        drcs_unpack_to_bitmap(g.width, g.height, g.bitmap, depth=g.depth_bits)
+        for g in glyphs.values()
+    ]
+
+
+def path_of(bitmap, strategy):
+    if len(STRATEGIES) == 1:
+        return ass.bitmap_to_ass_path(bitmap, alpha_threshold=1)
+    return ass.bitmap_to_ass_path(bitmap, alpha_threshold=1, strategy=strategy)
+
+
+def best_of(repeat, bitmaps, strategy):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for bitmap in bitmaps:
+            path_of(bitmap, strategy)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the ASS drawing paths of the DRCS glyphs of .es files."
+    )
+    parser.add_argument("infiles", help="Input filenames (.es files)", type=str, nargs="+")
+    parser.add_argument("--repeat", help="Runs of each (best taken).", type=int, default=5)
+    args = parser.parse_args()
+
+    for filename in args.infiles:
+        if not os.path.exists(filename):
+            print("Input filename :" + filename + " does not exist.")
+            sys.exit(-1)
+
+    bitmaps = glyph_bitmaps(args.infiles)
+    if not bitmaps:
+        print("No DRCS glyphs found.")
+        sys.exit(-1)
+    print(f"{len(bitmaps)} distinct glyphs")
+    for strategy in STRATEGIES:
+        size = sum(len(path_of(bitmap, strategy)) for bitmap in bitmaps)
+        seconds = best_of(args.repeat, bitmaps, strategy)
+        print(
+            f"{strategy:>8}: {size / len(bitmaps):7.0f} bytes/glyph, "
+            f"{seconds / len(bitmaps) * 1e6:7.1f} us/glyph"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Module: kanji_decode
+Desc: Benchmark decoding 2 byte kanji: code_set.Kanji built from every row/cell of the
+  94x94 set, in GL and in GR.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+To compare with an earlier version, run it from a checkout of that version (it needs
+read.ByteReader) with PYTHONPATH pointing there. benchmarks/decode_statements.py times
+kanji as part of whole statements.
+
+>python benchmarks/kanji_decode.py
+
+"""
+
+import time
+import argparse
+
+from arib import read
+from arib import code_set
+
+# first and last byte of a row or cell in GL. GR bytes have the top bit set.
+FIRST_BYTE = 0x21
+LAST_BYTE = 0x7E
+GR_BIT = 0x80
+
+
+def kanji_bytes(gr=False):
+    """The byte pairs of every row/cell of the 94x94 set"""
+    top = GR_BIT if gr else 0
+    return bytes(
+        b | top
+        for row in range(FIRST_BYTE, LAST_BYTE + 1)
+        for cell in range(FIRST_BYTE, LAST_BYTE + 1)
+        for b in (row, cell)
+    )
+
+
+def decode_all(data):
+    """Decode every byte pair of data to a Kanji
+    :return: number decoded
+    """
+    f = read.ByteReader(data)
+    count = 0
+    for _ in range(len(data) // 2):
+        code_set.Kanji(read.ucb(f), f)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time decoding every 2 byte kanji.")
+    parser.add_argument("--repeat", help="Runs of each (best taken).", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, data in (("GL", kanji_bytes()), ("GR", kanji_bytes(gr=True))):
+        # the first run builds any tables
+        start = time.perf_counter()
+        count = decode_all(data)
+        first = time.perf_counter() - start
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            decode_all(data)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        print(
+            f"{name}: {count} kanji in {best:.4f} s ({count / best / 1000:6.0f}k kanji/sec), "
+            f"first run {first:.4f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Module: read_pipeline
+Desc: Benchmark arib-ts2ass reading files as it parses (mmap) against reading them on a
+  thread of its own (--pipelined), from a cold page cache and a warm one.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+Before each cold run the files are dropped from the page cache with
+posix_fadvise(POSIX_FADV_DONTNEED), so every byte has to come off the disk (or over the
+network) again. That's most effective on files nothing else has open or is writing to.
+Each run converts every file with a ts2ass.ConversionSession, writing the .ass files to a
+temporary directory.
+
+>python benchmarks/read_pipeline.py /media/recordings/*.ts --repeat 3
+
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+from arib.ts2ass import convert
+
+MODES = ("serial", "pipelined")
+
+
+def drop_from_cache(filename):
+    """Ask the OS to drop a file's pages from the page cache"""
+    with open(filename, "rb") as f:
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def time_run(filenames, outdir, pipelined, cold):
+    """Seconds taken to convert all the files"""
+    if cold:
+        for filename in filenames:
+            drop_from_cache(filename)
+    start = time.perf_counter()
+    for i, filename in enumerate(filenames):
+        outfile = os.path.join(outdir, f"{i}.ass")
+        convert(filename, outfile, pipelined=pipelined, silent=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Time arib-ts2ass converting MPEG TS files with and without --pipelined, "
+            "from a cold and a warm page cache."
+        )
+    )
+    parser.add_argument(
+        "infiles", help="Input filenames (MPEG2 Transport Stream Files)", type=str, nargs="+"
+    )
+    parser.add_argument("--repeat", help="Runs of each mode (median taken).", type=int, default=3)
+    parser.add_argument("--warm", help="Also time runs from a warm cache.", action="store_true")
+    args = parser.parse_args()
+
+    for filename in args.infiles:
+        if not os.path.exists(filename):
+            print("Input filename :" + filename + " does not exist.")
+            sys.exit(-1)
+    if not hasattr(os, "posix_fadvise"):
+        print("posix_fadvise() isn't available here, so the page cache can't be dropped.")
+        sys.exit(-1)
+
+    total_bytes = sum(os.path.getsize(f) for f in args.infiles)
+    print(f"{len(args.infiles)} files, {total_bytes / 1e6:.1f} MB, median of {args.repeat} runs")
+    caches = (True, False) if args.warm else (True,)
+    with tempfile.TemporaryDirectory() as outdir:
+        for cold in caches:
+            runs = {mode: [] for mode in MODES}
+            for _ in range(args.repeat):
+                # modes take turns, so neither gets the benefit of a quieter moment
+                for mode in MODES:
+                    runs[mode].append(time_run(args.infiles, outdir, mode == "pipelined", cold))
+            cache = "cold" if cold else "warm"
+            seconds = {mode: statistics.median(runs[mode]) for mode in MODES}
+            for mode in MODES:
+                print(
+                    f"{cache} {mode:>9}: {seconds[mode]:7.2f} s "
+                    f"({total_bytes / 1e6 / seconds[mode]:6.1f} MB/s)"
+                )
+            print(f"{cache} speedup: {seconds['serial'] / seconds['pipelined']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
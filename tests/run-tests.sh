@@ -9,3 +9,6 @@ do
   arib-es-extract "$i" > "${i}.txt"
 done
 
+# unit tests of the parsers and tools, on small streams built from the .es files
+cd "$SCRIPT_DIR/.."
+python -m unittest discover -s tests
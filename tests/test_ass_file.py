@@ -0,0 +1,139 @@
+"""
+Tests of arib.ass.ASSFile atomic writes: nothing is left behind, and no partial .ass file
+is put in place, when a file is discarded or a conversion fails.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import tsmux
+
+from arib.ass import ASSFile
+from arib.ts2ass import ConversionSession
+from arib.ts2ass import convert
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aijin.es")
+OLD_CONTENTS = "an earlier conversion\n"
+
+
+class ConversionFailed(Exception):
+    pass
+
+
+class TestAtomicASSFile(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tsdir = tempfile.TemporaryDirectory()
+        cls.ts_path = os.path.join(cls.tsdir.name, "aijin.ts")
+        with open(cls.ts_path, "wb") as f:
+            f.write(tsmux.mux(ES_FILE, 100))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tsdir.cleanup()
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "out.ass")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def files(self):
+        return sorted(os.listdir(self.tmpdir.name))
+
+    def write_old(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(OLD_CONTENTS)
+
+    def assertOld(self):
+        self.assertEqual(self.files(), ["out.ass"])
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), OLD_CONTENTS)
+
+    def test_commit(self):
+        self.write_old()
+        ass = ASSFile(self.path, atomic=True)
+        # written under another (hidden) name until closed
+        self.assertEqual(len(self.files()), 2)
+        self.assertTrue(self.files()[0].startswith(".out.ass."))
+        ass.close()
+        self.assertEqual(self.files(), ["out.ass"])
+        with open(self.path, encoding="utf-8") as f:
+            self.assertTrue(f.read().startswith("[Script Info]"))
+
+    def test_discard(self):
+        self.write_old()
+        ass = ASSFile(self.path, atomic=True)
+        ass.close(commit=False)
+        self.assertOld()
+        # and nothing at all if there was no earlier file
+        os.remove(self.path)
+        ASSFile(self.path, atomic=True).close(commit=False)
+        self.assertEqual(self.files(), [])
+
+    def test_context_manager_exception(self):
+        self.write_old()
+        with self.assertRaises(ConversionFailed):
+            with ASSFile(self.path, atomic=True):
+                raise ConversionFailed()
+        self.assertOld()
+
+    def test_permissions(self):
+        # those open() would give, under the umask, which is left as it is
+        for umask in (0o022, 0o077):
+            with self.subTest(umask=umask):
+                old_umask = os.umask(umask)
+                try:
+                    with mock.patch("os.umask", side_effect=AssertionError("umask changed")):
+                        ASSFile(self.path, atomic=True).close()
+                finally:
+                    os.umask(old_umask)
+                self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o666 & ~umask)
+
+    def fail_conversion(self, exception, after=20, **opts):
+        """Convert, raising exception from the middle of the TS parse"""
+        on_es_packet = ConversionSession.OnESPacket
+        calls = []
+
+        def failing(session, *args):
+            calls.append(session)
+            if len(calls) > after:
+                # the temporary file has been written to by now
+                self.assertTrue([name for name in self.files() if name.endswith(".tmp")])
+                raise exception
+            return on_es_packet(session, *args)
+
+        with mock.patch.object(ConversionSession, "OnESPacket", failing):
+            with self.assertRaises(type(exception)):
+                convert(self.ts_path, self.path, atomic=True, **opts)
+
+    def test_conversion_error(self):
+        self.write_old()
+        self.fail_conversion(ConversionFailed())
+        self.assertOld()
+
+    def test_conversion_error_no_earlier_file(self):
+        self.fail_conversion(ConversionFailed())
+        self.assertEqual(self.files(), [])
+
+    def test_conversion_interrupted(self):
+        self.write_old()
+        self.fail_conversion(KeyboardInterrupt())
+        self.assertOld()
+
+    def test_conversion(self):
+        self.write_old()
+        session = convert(self.ts_path, self.path, atomic=True)
+        self.assertTrue(session.file_written())
+        self.assertEqual(self.files(), ["out.ass"])
+        with open(self.path, encoding="utf-8") as f:
+            self.assertIn("Dialogue:", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
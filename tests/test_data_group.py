@@ -0,0 +1,85 @@
+"""
+Tests of arib.data_group: finding the way back to the next data group in a damaged .es file.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+
+import tsmux
+
+from arib import read
+from arib import data_group
+from arib.data_group import find_data_group_start
+from arib.data_group import is_data_group_start
+from arib.data_group import next_data_group
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aijin.es")
+
+# a data group start pattern followed by a group id and size that look fine,
+# but whose CRC-16 doesn't check out
+FALSE_START = data_group.DATA_GROUP_START + b"\x00\x00\x00\x00\x04abcd\x12\x34"
+
+
+def group_ids(path):
+    # (resyncing announces itself on stdout)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [(g._group_id, g._data_group_size) for g in next_data_group(path)]
+
+
+class TestResync(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(ES_FILE, "rb") as f:
+            cls.groups = tsmux.data_groups(f.read())[:50]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, data):
+        path = os.path.join(self.tmpdir.name, "test.es")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_is_data_group_start(self):
+        f = read.ByteReader(FALSE_START + self.groups[0])
+        self.assertFalse(is_data_group_start(f, 0))
+        self.assertTrue(is_data_group_start(f, len(FALSE_START)))
+
+    def test_find_skips_false_starts(self):
+        garbage = b"\x00" * 10 + FALSE_START + b"\x80\xff" + FALSE_START
+        f = read.ByteReader(garbage + self.groups[0])
+        self.assertTrue(find_data_group_start(f))
+        self.assertEqual(f.tell(), len(garbage))
+
+    def test_find_across_search_blocks(self):
+        # the real start pattern straddling two search blocks, false ones either side
+        padding = data_group.SEARCH_BLOCK_SIZE - len(FALSE_START) - 1
+        garbage = FALSE_START + bytes(padding) + FALSE_START[:1]
+        f = read.ByteReader(garbage + self.groups[0])
+        self.assertTrue(find_data_group_start(f))
+        self.assertEqual(f.tell(), len(garbage))
+
+    def test_find_nothing(self):
+        f = read.ByteReader(bytes(100) + FALSE_START + bytes(100))
+        self.assertFalse(find_data_group_start(f))
+
+    def test_damaged_file(self):
+        undamaged = group_ids(self.write(b"".join(self.groups)))
+        self.assertEqual(len(undamaged), len(self.groups))
+        # garbage between data groups, with false starts in it to be passed over
+        garbage = bytes(range(1, 256)) + FALSE_START + bytes(range(1, 256)) + FALSE_START
+        damaged = b"".join(
+            (garbage if n % 7 == 3 else b"") + group for n, group in enumerate(self.groups)
+        )
+        self.assertEqual(group_ids(self.write(damaged)), undamaged)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests of arib.drcs_cache: the glyph LRU cache and the drawings memoized for glyphs.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import unittest
+
+from arib import read
+from arib.drcs_cache import DrcsCache
+from arib.drcs_cache import DrcsGlyph
+
+
+def glyph(n):
+    """A distinct 8x2 1 bit glyph for each n < 65536"""
+    return DrcsGlyph(read.ByteReader(bytes([0x00, 1, 8, 2, n >> 8, n & 0xFF])))
+
+
+class TestDrawings(unittest.TestCase):
+    def setUp(self):
+        self.renders = 0
+
+    def render(self, g):
+        self.renders += 1
+        return bytes(g.bitmap).hex()
+
+    def test_memoized(self):
+        cache = DrcsCache()
+        cache.put(1, 0x21, glyph(1))
+        self.assertEqual(cache.drawing(cache.get(1, 0x21), self.render), "0001")
+        self.assertEqual(cache.drawing(glyph(1), self.render), "0001")
+        self.assertEqual(self.renders, 1)
+
+    def test_redefinition_forgets_drawing(self):
+        cache = DrcsCache()
+        cache.put(1, 0x21, glyph(1))
+        cache.drawing(glyph(1), self.render)
+        cache.put(1, 0x21, glyph(2))
+        self.assertEqual(cache.drawings(), 0)
+
+    def test_glyphs_not_stored_are_bounded(self):
+        # as for glyphs read back from a sidecar, which never go in the store
+        cache = DrcsCache(max_glyphs=16)
+        for n in range(1000):
+            cache.drawing(glyph(n), self.render)
+        self.assertEqual(cache.drawings(), 16)
+        # the most recently used are the ones kept
+        self.renders = 0
+        cache.drawing(glyph(999), self.render)
+        self.assertEqual(self.renders, 0)
+        cache.drawing(glyph(0), self.render)
+        self.assertEqual(self.renders, 1)
+
+    def test_store_is_bounded(self):
+        cache = DrcsCache(max_glyphs=4)
+        for code in range(10):
+            cache.put(1, code, glyph(code))
+            cache.drawing(glyph(code), self.render)
+        self.assertIsNone(cache.get(1, 0))
+        self.assertIsNotNone(cache.get(1, 9))
+        self.assertLessEqual(cache.drawings(), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Tests of the DRCS drawing paths of arib.ass: every strategy draws exactly the glyph's
+pixels, whichever fill rule the renderer uses.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import io
+import glob
+import os
+import random
+import unittest
+import contextlib
+
+from arib.ass import DRCS_PATH_STRATEGIES
+from arib.ass import bitmap_to_ass_path
+from arib.data_group import next_data_group
+from arib.drcs_cache import DrcsCache
+from arib.drcs_cache import use_drcs_cache
+from arib.drcs_decoder import drcs_unpack_to_bitmap
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+RANDOM_BITMAPS = 300
+
+
+class GlyphCollector(DrcsCache):
+    """DrcsCache keeping every glyph put in it"""
+
+    def __init__(self):
+        super().__init__()
+        self.glyphs = []
+
+    def put(self, set_id, code, glyph):
+        self.glyphs.append(glyph)
+        super().put(set_id, code, glyph)
+
+
+def corpus_bitmaps():
+    """Unpacked bitmaps of the distinct DRCS glyphs defined in the tests/*.es files"""
+    collector = GlyphCollector()
+    with use_drcs_cache(collector), contextlib.redirect_stdout(io.StringIO()):
+        for path in sorted(glob.glob(os.path.join(TESTS_DIR, "*.es"))):
+            for _ in next_data_group(path):
+                pass
+    glyphs = {g.content_key(): g for g in collector.glyphs}
+    return [
+        drcs_unpack_to_bitmap(g.width, g.height, g.bitmap, depth=g.depth_bits)
+        for g in glyphs.values()
+    ]
+
+
+def random_bitmaps(count, seed=12):
+    """Random bitmaps, from sparse to dense, with pixel values 0..3"""
+    rng = random.Random(seed)
+    bitmaps = []
+    for _ in range(count):
+        w, h = rng.randint(1, 24), rng.randint(1, 24)
+        density = rng.random()
+        pixels = [rng.randint(1, 3) if rng.random() < density else 0 for _ in range(w * h)]
+        bitmaps.append([pixels[y * w : (y + 1) * w] for y in range(h)])
+    return bitmaps
+
+
+def subpaths(path):
+    """The closed polygons of an ASS drawing made of m and l commands"""
+    polygons = []
+    tokens = path.split()
+    i = 0
+    while i < len(tokens):
+        command = tokens[i]
+        point = (int(tokens[i + 1]), int(tokens[i + 2]))
+        if command == "m":
+            polygons.append([point])
+        elif command == "l":
+            polygons[-1].append(point)
+        else:
+            raise ValueError(f"Unexpected drawing command {command!r}")
+        i += 3
+    return polygons
+
+
+def rasterize(path, w, h):
+    """
+    Pixels drawn by a path of integer coordinates, as (nonzero, even-odd) sets of (x, y).
+    A pixel is drawn if its center is inside; with integer coordinates the center is never
+    on an edge, so only the vertical edges to its right need be counted.
+    """
+    winding = {}
+    for polygon in subpaths(path):
+        for (x1, y1), (x2, y2) in zip(polygon, polygon[1:] + polygon[:1]):
+            if x1 != x2:
+                continue
+            direction = 1 if y2 > y1 else -1
+            for y in range(min(y1, y2), max(y1, y2)):
+                for x in range(0, min(x1, w)):
+                    winding.setdefault((x, y), []).append(direction)
+    nonzero = {p for p, crossings in winding.items() if sum(crossings)}
+    even_odd = {p for p, crossings in winding.items() if len(crossings) % 2}
+    return nonzero, even_odd
+
+
+class TestDrcsPaths(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = corpus_bitmaps()
+
+    def check(self, bitmaps, alpha_threshold=1):
+        for n, bitmap in enumerate(bitmaps):
+            h, w = len(bitmap), len(bitmap[0])
+            drawn = {
+                (x, y) for y in range(h) for x in range(w) if bitmap[y][x] >= alpha_threshold
+            }
+            for strategy in DRCS_PATH_STRATEGIES:
+                path = bitmap_to_ass_path(bitmap, alpha_threshold, strategy=strategy)
+                nonzero, even_odd = rasterize(path, w, h)
+                self.assertEqual(nonzero, drawn, f"{strategy} nonzero, bitmap {n}")
+                self.assertEqual(even_odd, drawn, f"{strategy} even-odd, bitmap {n}")
+
+    def test_corpus(self):
+        self.assertTrue(self.corpus)
+        self.check(self.corpus)
+
+    def test_random(self):
+        self.check(random_bitmaps(RANDOM_BITMAPS))
+
+    def test_threshold(self):
+        self.check(random_bitmaps(50, seed=13), alpha_threshold=2)
+
+    def test_holes_and_touching_corners(self):
+        ring = [[1, 1, 1], [1, 0, 1], [1, 1, 1]]
+        checkerboard = [[(x + y) % 2 for x in range(5)] for y in range(5)]
+        self.check([ring, checkerboard, [[0, 0], [0, 0]], [[1]]])
+
+    def test_merged_paths_are_smaller(self):
+        sizes = {
+            strategy: sum(len(bitmap_to_ass_path(b, strategy=strategy)) for b in self.corpus)
+            for strategy in DRCS_PATH_STRATEGIES
+        }
+        self.assertLess(sizes["rects"], sizes["runs"])
+        self.assertLess(sizes["outline"], sizes["runs"])
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            bitmap_to_ass_path([[1]], strategy="splines")
+
+
+if __name__ == "__main__":
+    unittest.main()
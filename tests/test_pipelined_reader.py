@@ -0,0 +1,145 @@
+"""
+Tests of arib.mpeg.ts.PipelinedReader: reading a TS file on a thread of its own.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import tsmux
+
+from arib.mpeg.ts import TS
+from arib.mpeg.ts import PipelinedReader
+from arib.ts2ass import convert
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aijin.es")
+
+
+def packets(generator):
+    # (pipelined packets are views only valid until the next one is taken)
+    return [bytes(p) for p in generator]
+
+
+def reader_threads():
+    return [t for t in threading.enumerate() if t.name == "ts-reader"]
+
+
+class TestPipelinedReader(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.data = tsmux.mux(ES_FILE, 100)
+        cls.ts_path = os.path.join(cls.tmpdir.name, "aijin.ts")
+        with open(cls.ts_path, "wb") as f:
+            f.write(cls.data)
+        cls.packets = packets(TS.next_packet(cls.ts_path))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def tearDown(self):
+        self.assertEqual(reader_threads(), [])
+
+    def test_packets(self):
+        self.assertEqual(len(self.packets), len(self.data) // TS.PACKET_SIZE)
+        for buffers in (1, 2, 4):
+            for buffer_packets in (1, 3, 7):
+                with self.subTest(buffers=buffers, buffer_packets=buffer_packets):
+                    reader = PipelinedReader(
+                        self.ts_path, buffers=buffers, buffer_packets=buffer_packets
+                    )
+                    self.assertEqual(packets(reader.packets()), self.packets)
+
+    def test_next_packet(self):
+        self.assertEqual(packets(TS.next_packet(self.ts_path, pipelined=True)), self.packets)
+
+    def test_range(self):
+        size = TS.PACKET_SIZE
+        for start, end in ((10 * size, 50 * size), (0, 5 * size), (90 * size, None)):
+            with self.subTest(start=start, end=end):
+                expected = packets(TS.next_packet(self.ts_path, start=start, end=end))
+                self.assertEqual(expected, self.packets[start // size : end and end // size])
+                reader = PipelinedReader(self.ts_path, start, end, buffer_packets=3)
+                self.assertEqual(packets(reader.packets()), expected)
+
+    def test_packets_across_buffers(self):
+        # out of packet alignment, packets are split across buffers
+        path = os.path.join(self.tmpdir.name, "unaligned.ts")
+        with open(path, "wb") as f:
+            f.write(bytes(100) + self.data)
+        expected = packets(TS.next_packet(path, memorymap=False))
+        self.assertEqual(expected, self.packets)
+        reader = PipelinedReader(path, buffers=2, buffer_packets=3)
+        self.assertEqual(packets(reader.packets()), expected)
+
+    def test_close_early(self):
+        # with the reader thread blocked waiting on a free buffer
+        generator = PipelinedReader(self.ts_path, buffers=2, buffer_packets=1).packets()
+        for _ in range(5):
+            next(generator)
+        self.assertEqual(len(reader_threads()), 1)
+        generator.close()
+
+    def test_reader_exception(self):
+        reader = PipelinedReader(os.path.join(self.tmpdir.name, "missing.ts"))
+        with self.assertRaises(FileNotFoundError):
+            packets(reader.packets())
+
+    def test_read_error_midway(self):
+        class ReadError(Exception):
+            pass
+
+        real_open = open
+        reads = []
+
+        class FailingFile(object):
+            def __init__(self, f):
+                self._f = f
+
+            def __getattr__(self, name):
+                return getattr(self._f, name)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self._f.close()
+
+            def readinto(self, b):
+                reads.append(len(b))
+                if len(reads) > 3:
+                    raise ReadError("read failed")
+                return self._f.readinto(b)
+
+        def failing_open(*args, **kwargs):
+            return FailingFile(real_open(*args, **kwargs))
+
+        reader = PipelinedReader(self.ts_path, buffer_packets=5)
+        received = []
+        with mock.patch("builtins.open", failing_open):
+            with self.assertRaises(ReadError):
+                for packet in reader.packets():
+                    received.append(bytes(packet))
+        self.assertEqual(received, self.packets[:15])
+
+    def test_ts2ass(self):
+        # several buffers' worth, so decoding runs while later buffers are read
+        serial = os.path.join(self.tmpdir.name, "serial", "aijin.ass")
+        pipelined = os.path.join(self.tmpdir.name, "pipelined", "aijin.ass")
+        convert(self.ts_path, serial)
+        with mock.patch.object(TS, "PIPELINE_PACKETS", 64):
+            convert(self.ts_path, pipelined, pipelined=True)
+        # (the header names the file)
+        with open(serial, encoding="utf-8") as f:
+            expected = f.read().replace(serial, "aijin.ass")
+        with open(pipelined, encoding="utf-8") as f:
+            self.assertEqual(f.read().replace(pipelined, "aijin.ass"), expected)
+        self.assertIn("Dialogue:", expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
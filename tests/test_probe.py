@@ -0,0 +1,69 @@
+"""
+Tests of arib-probe: captions found in a TS, and input that isn't a TS.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+
+import tsmux
+
+from arib.probe import probe
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ES_FILE = os.path.join(TESTS_DIR, "aijin.es")
+
+
+def run_probe(path):
+    """(exit status, JSON results) of arib-probe on path"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(TESTS_DIR))
+    done = subprocess.run(
+        [sys.executable, "-m", "arib.probe", path], capture_output=True, env=env, text=True
+    )
+    return done.returncode, json.loads(done.stdout)
+
+
+class TestProbe(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.ts_path = os.path.join(cls.tmpdir.name, "aijin.ts")
+        with open(cls.ts_path, "wb") as f:
+            f.write(tsmux.mux(ES_FILE, 40))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_captions(self):
+        results = probe(self.ts_path)
+        self.assertTrue(results["captions"])
+        self.assertEqual(results["pid"], tsmux.CAPTION_PID)
+        self.assertEqual(results["pcr_pid"], tsmux.PCR_PID)
+        self.assertEqual(results["found_by"], "pmt")
+        self.assertIsNone(results["error"])
+
+    def test_languages(self):
+        results = probe(self.ts_path, languages=True)
+        self.assertTrue(results["captions"])
+        self.assertIn("jpn", results["languages"])
+
+    def test_not_ts(self):
+        status, results = run_probe(ES_FILE)
+        self.assertNotEqual(status, 0)
+        self.assertFalse(results["captions"])
+        self.assertEqual(results["stopped"], "error")
+        self.assertTrue(results["error"])
+
+    def test_exit_status(self):
+        status, results = run_probe(self.ts_path)
+        self.assertEqual(status, 0)
+        self.assertTrue(results["captions"])
+
+
+if __name__ == "__main__":
+    unittest.main()
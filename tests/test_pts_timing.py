@@ -0,0 +1,145 @@
+"""
+Tests of arib-ts2ass --timing pts: captions timed by the PTS of their PES.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import os
+import tempfile
+import unittest
+
+import tsmux
+
+from arib.mpeg.ts import TS
+from arib.ts2ass import TIMING_PCR
+from arib.ts2ass import TIMING_PTS
+from arib.ts2ass import convert
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aijin.es")
+DATA_GROUPS = 60
+TICKS_PER_GROUP = TS.PCR_HZ // 2
+# PTS are stamped this far ahead of the PCR
+PTS_DELAY = TS.PCR_HZ // 10
+# the clock wraps 10 seconds in
+WRAPPING_PCR = TS.PCR_WRAP - 10 * TS.PCR_HZ
+
+
+def stream(groups, pcrs, ptss, first_pcr=None):
+    """
+    TS carrying a caption PES per data group, each after a PCR packet.
+    :param pcrs: PCR sent before each data group (None for no PCR packet)
+    :param ptss: PTS of each data group's PES (None for none)
+    :param first_pcr: PCR sent before them all (None for none)
+    """
+    muxer = tsmux.Muxer()
+    packets = muxer.packets(0, tsmux.pat()) + muxer.packets(tsmux.PMT_PID, tsmux.pmt())
+    if first_pcr is not None:
+        packets += muxer.packets(tsmux.PCR_PID, b"", pcr=first_pcr % TS.PCR_WRAP)
+    for group, pcr, pts in zip(groups, pcrs, ptss):
+        if pcr is not None:
+            packets += muxer.packets(tsmux.PCR_PID, b"", pcr=pcr % TS.PCR_WRAP)
+        pts = None if pts is None else pts % TS.PCR_WRAP
+        packets += muxer.packets(tsmux.CAPTION_PID, tsmux.pes(0xBD, group, pts))
+    return b"".join(packets)
+
+
+def dialogue(path):
+    """(start, end, text) of the Dialogue lines of an .ass file"""
+    lines = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Dialogue:"):
+                fields = line.rstrip("\n").split(",", 9)
+                lines.append((fields[1], fields[2], fields[9]))
+    return lines
+
+
+def seconds(asstime):
+    hours, minutes, secs = asstime.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(secs)
+
+
+class TestPTSTiming(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(ES_FILE, "rb") as f:
+            cls.groups = tsmux.data_groups(f.read())[:DATA_GROUPS]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def convert(self, data, timing):
+        path = os.path.join(self.tmpdir.name, f"{timing}.ts")
+        with open(path, "wb") as f:
+            f.write(data)
+        convert(path, path + ".ass", timing=timing)
+        return dialogue(path + ".ass")
+
+    def timed_by_pcr(self, times, first_pcr):
+        """Dialogue of the data groups timed by a PCR sent with each holding its time"""
+        data = stream(self.groups, times, [None] * len(times), first_pcr)
+        return self.convert(data, TIMING_PCR)
+
+    def check(self, pcrs, ptss):
+        """
+        Captions timed by PTS should come out as they would timed by a PCR sent with each
+        caption holding the time of its PTS (or the last PTS, for a PES without one).
+        """
+        lines = self.convert(stream(self.groups, pcrs, ptss), TIMING_PTS)
+        times = []
+        for pts in ptss:
+            times.append(times[-1] if pts is None else pts)
+        expected = self.timed_by_pcr(times, pcrs[0])
+        self.assertTrue(expected)
+        self.assertEqual(lines, expected)
+        return lines
+
+    def test_plain(self):
+        pcrs = [1000 + n * TICKS_PER_GROUP for n in range(DATA_GROUPS)]
+        self.check(pcrs, [pcr + PTS_DELAY for pcr in pcrs])
+
+    def test_wrap(self):
+        pcrs = [WRAPPING_PCR + n * TICKS_PER_GROUP for n in range(DATA_GROUPS)]
+        lines = self.check(pcrs, [pcr + PTS_DELAY for pcr in pcrs])
+        # the times are those of the PTS, since the first PCR
+        stamped = {
+            round((pcr + PTS_DELAY - WRAPPING_PCR) / TS.PCR_HZ, 2) for pcr in pcrs
+        }
+        starts = [seconds(start) for start, _, _ in lines]
+        self.assertTrue(set(starts) <= stamped)
+        self.assertTrue([t for t in starts if t > 10])
+
+    def test_pes_without_pts(self):
+        # keeps the time of the last caption that had one
+        pcrs = [1000 + n * TICKS_PER_GROUP for n in range(DATA_GROUPS)]
+        ptss = [None if n % 3 == 2 else pcr + PTS_DELAY for n, pcr in enumerate(pcrs)]
+        self.check(pcrs, ptss)
+
+    def test_pts_before_first_pcr(self):
+        # the first captions stamped (a little) before the first PCR are timed from 0
+        pcrs = [1000 + n * TICKS_PER_GROUP for n in range(DATA_GROUPS)]
+        ptss = [pcr + PTS_DELAY for pcr in pcrs]
+        # (the first data groups with statements are the 11th and 15th)
+        ptss[:16] = [pcrs[0] - 2 * TS.PCR_HZ + n * TS.PCR_HZ // 10 for n in range(16)]
+        lines = self.convert(stream(self.groups, pcrs, ptss), TIMING_PTS)
+        self.assertTrue(lines)
+        for start, end, _ in lines:
+            self.assertGreaterEqual(seconds(start), 0)
+            self.assertGreaterEqual(seconds(end), seconds(start))
+        expected = self.timed_by_pcr([max(pts, pcrs[0]) for pts in ptss], pcrs[0])
+        self.assertEqual(lines, expected)
+
+    def test_caption_before_first_pcr(self):
+        # the first PTS is the time base until there's a PCR, and stays so after
+        pcrs = [None] * 12 + [1000 + n * TICKS_PER_GROUP for n in range(12, DATA_GROUPS)]
+        ptss = [1000 + n * TICKS_PER_GROUP + PTS_DELAY for n in range(DATA_GROUPS)]
+        lines = self.convert(stream(self.groups, pcrs, ptss), TIMING_PTS)
+        expected = self.timed_by_pcr(ptss, ptss[0])
+        self.assertTrue(expected)
+        self.assertEqual(lines, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
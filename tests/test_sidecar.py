@@ -0,0 +1,113 @@
+"""
+Tests of arib.sidecar: writing decoded caption events and reading them back.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+
+import tsmux
+
+from arib.arib_exceptions import DecodingError
+from arib.closed_caption import StatementBody
+from arib.closed_caption import next_data_unit
+from arib.data_group import next_data_group
+from arib.sidecar import MAGIC
+from arib.sidecar import SidecarWriter
+from arib.sidecar import read_sidecar
+from arib.sidecar import render
+from arib.tokens import Tokens
+from arib.ts2ass import convert
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aijin.es")
+
+
+def statements(path):
+    """The decoded statements (tokens.Tokens) of an .es file, as arib-es-extract finds them"""
+    found = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for data_group in next_data_group(path):
+            if data_group.is_management_data():
+                continue
+            for data_unit in next_data_unit(data_group.payload()):
+                if isinstance(data_unit.payload(), StatementBody):
+                    found.append(data_unit.payload().payload())
+    return found
+
+
+def dialogue_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [line for line in f if line.startswith("Dialogue:")]
+
+
+class TestSidecar(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.statements = statements(ES_FILE)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "captions.sidecar")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        times = [None] + [n * 0.5 for n in range(1, len(self.statements))]
+        with SidecarWriter(self.path) as writer:
+            for statement, time_s in zip(self.statements, times):
+                writer.event(statement, time_s)
+        events = list(read_sidecar(self.path))
+        self.assertEqual([t for _, t in events], times)
+
+        glyphs = {}
+        for statement, (tokens, _) in zip(self.statements, events):
+            self.assertEqual(tokens.codes, statement.codes)
+            self.assertEqual(tokens.params, statement.params)
+            self.assertEqual(tokens.data, statement.data)
+            for (code, value), (_, read_value) in zip(statement, tokens):
+                if code == Tokens.TEXT:
+                    self.assertEqual(read_value, value)
+                if code != Tokens.OBJECT:
+                    # (control characters are all in the codes, params and data)
+                    continue
+                self.assertIs(type(read_value), type(value))
+                state = dict(vars(value))
+                read_state = dict(vars(read_value))
+                glyph, read_glyph = state.pop("glyph", None), read_state.pop("glyph", None)
+                self.assertEqual(read_state, state)
+                if glyph is not None:
+                    self.assertEqual(read_glyph.content_key(), glyph.content_key())
+                    # a glyph is written once and shared by the events using it
+                    self.assertIs(glyphs.setdefault(id(glyph), read_glyph), read_glyph)
+        # there are DRCS characters in aijin.es
+        self.assertTrue(glyphs)
+
+    def test_not_a_sidecar(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a sidecar file")
+        with self.assertRaises(DecodingError):
+            list(read_sidecar(self.path))
+        with open(self.path, "wb") as f:
+            f.write(MAGIC + b"X")
+        with self.assertRaises(DecodingError):
+            list(read_sidecar(self.path))
+
+    def test_render_matches_convert(self):
+        ts_path = os.path.join(self.tmpdir.name, "aijin.ts")
+        with open(ts_path, "wb") as f:
+            f.write(tsmux.mux(ES_FILE, 200))
+        converted = os.path.join(self.tmpdir.name, "converted.ass")
+        rendered = os.path.join(self.tmpdir.name, "rendered.ass")
+        convert(ts_path, converted, sidecar=self.path)
+        self.assertTrue(render(self.path, rendered))
+        lines = dialogue_lines(converted)
+        self.assertTrue(lines)
+        self.assertEqual(dialogue_lines(rendered), lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
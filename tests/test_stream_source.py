@@ -0,0 +1,117 @@
+"""
+Tests of arib.mpeg.ts.StreamSource: TS packets read from pipes and growing files, which
+hand over data in pieces that needn't end on a packet boundary.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import io
+import os
+import time
+import tempfile
+import threading
+import unittest
+
+import tsmux
+
+from arib.mpeg.ts import TS
+from arib.mpeg.ts import StreamSource
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aijin.es")
+
+# sizes of the pieces the data is handed over in, over and over
+PIECES = (1, 100, 187, 189, 3 * TS.PACKET_SIZE + 5, TS.PACKET_SIZE, 2000)
+
+
+def pieces(data):
+    pos = 0
+    n = 0
+    while pos < len(data):
+        size = PIECES[n % len(PIECES)]
+        yield data[pos : pos + size]
+        pos += size
+        n += 1
+
+
+class PieceReader(io.RawIOBase):
+    """Unbuffered reader handing its data over a piece at a time, like a pipe"""
+
+    def __init__(self, data):
+        self._pieces = pieces(data)
+        self._piece = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self._piece:
+            self._piece = next(self._pieces, b"")
+        n = min(len(b), len(self._piece))
+        b[:n] = self._piece[:n]
+        self._piece = self._piece[n:]
+        return n
+
+
+def read_packets(source):
+    # (packets are views only valid until the next read)
+    with source:
+        return [bytes(p) for p in source.packets()]
+
+
+class TestStreamSource(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data = tsmux.mux(ES_FILE, 100)
+        size = TS.PACKET_SIZE
+        cls.packets = [cls.data[i : i + size] for i in range(0, len(cls.data), size)]
+
+    def test_pieces(self):
+        for buffer_packets in (1, 2, 7, TS.CHUNK_PACKETS):
+            with self.subTest(buffer_packets=buffer_packets):
+                source = StreamSource(PieceReader(self.data), buffer_packets=buffer_packets)
+                self.assertEqual(read_packets(source), self.packets)
+
+    def test_partial_packet_at_end(self):
+        source = StreamSource(PieceReader(self.data + self.packets[0][:100]), buffer_packets=3)
+        self.assertEqual(read_packets(source), self.packets)
+
+    def test_pipe(self):
+        r, w = os.pipe()
+
+        def write():
+            with open(w, "wb", buffering=0) as f:
+                for piece in pieces(self.data):
+                    f.write(piece)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            source = StreamSource(open(r, "rb", buffering=0), "pipe", buffer_packets=5)
+            self.assertEqual(read_packets(source), self.packets)
+        finally:
+            writer.join()
+
+    def test_follow(self):
+        # a recording in progress: pieces appended now and then, until it goes idle
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "recording.ts")
+            open(path, "wb").close()
+
+            def write():
+                with open(path, "ab", buffering=0) as f:
+                    for n, piece in enumerate(pieces(self.data)):
+                        f.write(piece)
+                        if n % 50 == 0:
+                            time.sleep(StreamSource.POLL_INTERVAL)
+
+            writer = threading.Thread(target=write)
+            writer.start()
+            try:
+                source = StreamSource.open(path, follow=True, idle_timeout=1.0)
+                self.assertIsNone(source.size())
+                self.assertEqual(read_packets(source), self.packets)
+            finally:
+                writer.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests of arib.mpeg.timeline: times along a TS whose PCR wraps, or jumps.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import os
+import tempfile
+import unittest
+
+import tsmux
+
+from arib.mpeg.ts import TS
+from arib.mpeg.timeline import PCRTimeline
+from arib.ts2ass import convert
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aijin.es")
+DATA_GROUPS = 200
+SECONDS_PER_GROUP = 0.5
+# the PCR wraps 30 seconds in
+WRAPPING_PCR = TS.PCR_WRAP - 30 * TS.PCR_HZ
+# sample every few data groups' worth of packets, so most of the time line is bridged
+SAMPLE_BYTES = 20 * TS.PACKET_SIZE
+
+
+def dialogue_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [line for line in f if line.startswith("Dialogue:")]
+
+
+class TestPCRTimeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def check_times(self, timeline, duration):
+        self.assertEqual(timeline.pcr_pid, tsmux.PCR_PID)
+        # (up to the last PCR sampled, which may fall short of the end of the file)
+        self.assertLessEqual(timeline.duration(), duration)
+        self.assertGreater(timeline.duration(), duration - 5)
+        for seconds in (0.25, 29.9, 30.1, 50, timeline.duration() - 1):
+            before, after = timeline.find(seconds)
+            self.assertLessEqual(before[2], seconds * TS.PCR_HZ)
+            self.assertGreater(after[2], seconds * TS.PCR_HZ)
+            self.assertLess(before[0], after[0])
+
+    def test_wrapping(self):
+        path = self.write("wrap.ts", tsmux.mux(ES_FILE, DATA_GROUPS, first_pcr=WRAPPING_PCR))
+        with PCRTimeline(path, sample_bytes=SAMPLE_BYTES) as timeline:
+            self.check_times(timeline, (DATA_GROUPS - 1) * SECONDS_PER_GROUP)
+            # the PCR read back at a time past the wrap
+            before, _ = timeline.find(60)
+            self.assertEqual(before[1], (WRAPPING_PCR + before[2]) % TS.PCR_WRAP)
+
+    def test_discontinuity(self):
+        # a second stream spliced on with an unrelated clock: time stands still across it
+        first = tsmux.mux(ES_FILE, DATA_GROUPS // 2, first_pcr=WRAPPING_PCR)
+        second = tsmux.mux(ES_FILE, DATA_GROUPS // 2, first_pcr=12345)
+        path = self.write("splice.ts", first + second)
+        with PCRTimeline(path, sample_bytes=SAMPLE_BYTES) as timeline:
+            self.check_times(timeline, 2 * (DATA_GROUPS // 2 - 1) * SECONDS_PER_GROUP)
+
+    def test_captions_across_wrap(self):
+        # captions are timed from the first PCR, wherever the clock started
+        wrap = self.write("wrap.ts", tsmux.mux(ES_FILE, DATA_GROUPS, first_pcr=WRAPPING_PCR))
+        plain = self.write("plain.ts", tsmux.mux(ES_FILE, DATA_GROUPS))
+        convert(wrap, wrap + ".ass")
+        convert(plain, plain + ".ass")
+        lines = dialogue_lines(wrap + ".ass")
+        self.assertTrue(lines)
+        self.assertEqual(lines, dialogue_lines(plain + ".ass"))
+        # and a time range starting past the wrap gives the captions from then on
+        convert(wrap, wrap + ".60.ass", start=60)
+        convert(plain, plain + ".60.ass", start=60)
+        lines = dialogue_lines(wrap + ".60.ass")
+        self.assertTrue(lines)
+        self.assertEqual(lines, dialogue_lines(plain + ".60.ass"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests of arib.mpeg.ts: PCR arithmetic, and reassembling PES packets out of TS packets.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import unittest
+
+import tsmux
+
+from arib.mpeg.ts import TS
+
+
+def continuation(packet):
+    """packet with its payload unit start indicator cleared"""
+    packet = bytearray(packet)
+    packet[1] &= ~0x40
+    return bytes(packet)
+
+
+class TestPCRDelta(unittest.TestCase):
+    def test_plain(self):
+        self.assertEqual(TS.pcr_delta(1000, 91000), 90000)
+        self.assertEqual(TS.pcr_delta(91000, 1000), -90000)
+
+    def test_wrapped(self):
+        self.assertEqual(TS.pcr_delta(TS.PCR_WRAP - 100, 50), 150)
+        self.assertEqual(TS.pcr_delta(50, TS.PCR_WRAP - 100), -150)
+        self.assertEqual(TS.pcr_delta(TS.PCR_WRAP - 1, 0), 1)
+
+    def test_half_way(self):
+        # as far apart as can be told either way
+        half = TS.PCR_WRAP // 2
+        self.assertEqual(TS.pcr_delta(0, half - 1), half - 1)
+        self.assertEqual(TS.pcr_delta(0, half + 1), -(half - 1))
+
+
+class TestPESReassembly(unittest.TestCase):
+    def setUp(self):
+        self.muxer = tsmux.Muxer()
+        self.pes = tsmux.pes(0xBD, b"\x80\xff\xf0" + bytes(300), 9000)
+        self.received = []
+
+    def parse(self, packets):
+        ts = TS(None)
+        ts.OnESPacket = lambda pid, es, header_size: self.received.append((pid, bytes(es)))
+        psi = self.muxer.packets(0, tsmux.pat()) + self.muxer.packets(tsmux.PMT_PID, tsmux.pmt())
+        ts.parse_packets(psi + packets)
+        return self.received
+
+    def split(self, first_bytes, stream_id=None):
+        """packets carrying the PES, with only first_bytes of it in the first of them"""
+        pes = self.pes if stream_id is None else self.pes[:3] + bytes([stream_id]) + self.pes[4:]
+        first = self.muxer.packets(tsmux.CAPTION_PID, pes[:first_bytes])
+        rest = self.muxer.packets(tsmux.CAPTION_PID, pes[first_bytes:])
+        return first + [continuation(p) for p in rest]
+
+    def test_whole(self):
+        packets = self.muxer.packets(tsmux.CAPTION_PID, self.pes)
+        self.assertEqual(self.parse(packets), [(tsmux.CAPTION_PID, self.pes)])
+
+    def test_header_split(self):
+        # the start code, stream id and length split over packets
+        for first_bytes in range(1, 8):
+            with self.subTest(first_bytes=first_bytes):
+                self.received = []
+                self.assertEqual(
+                    self.parse(self.split(first_bytes)), [(tsmux.CAPTION_PID, self.pes)]
+                )
+
+    def test_header_split_not_private(self):
+        for first_bytes in (2, 5):
+            with self.subTest(first_bytes=first_bytes):
+                self.received = []
+                self.assertEqual(self.parse(self.split(first_bytes, stream_id=0xE0)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Tests of arib-ts2ass-batch: finding inputs, naming outputs and skipping up to date files.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import os
+import tempfile
+import unittest
+
+from pathlib import Path
+
+import tsmux
+
+from arib.ts2ass_batch import convert_one
+from arib.ts2ass_batch import find_inputs
+from arib.ts2ass_batch import is_up_to_date
+from arib.ts2ass_batch import no_captions_path
+from arib.ts2ass_batch import output_path
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "toriko_subs.es")
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmpdir.name)
+        self.inputs = self.root / "in"
+        for sub in ("a", "b"):
+            (self.inputs / sub).mkdir(parents=True)
+        self.captioned = tsmux.mux(ES_FILE, 60)
+        (self.inputs / "a" / "x.ts").write_bytes(self.captioned)
+        (self.inputs / "b" / "x.ts").write_bytes(self.captioned)
+        # a stream with a PAT, but no PMT or captions
+        (self.inputs / "none.ts").write_bytes(b"".join(tsmux.Muxer().packets(0, tsmux.pat())))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_relative_paths_kept_under_outdir(self):
+        found = dict(find_inputs([str(self.inputs)], recursive=True))
+        self.assertEqual(found[self.inputs / "a" / "x.ts"], Path("a/x.ts"))
+        outdir = self.root / "out"
+        outputs = {output_path(f, outdir, r) for f, r in found.items()}
+        self.assertEqual(
+            outputs,
+            {outdir / "a/x.ts.ass", outdir / "b/x.ts.ass", outdir / "none.ts.ass"},
+        )
+
+    def test_glob_relative_to_pattern_base(self):
+        found = dict(find_inputs([str(self.inputs / "*" / "*.ts")]))
+        self.assertEqual(set(found.values()), {Path("a/x.ts"), Path("b/x.ts")})
+
+    def test_files_given_by_name(self):
+        infile = self.inputs / "a" / "x.ts"
+        self.assertEqual(find_inputs([str(infile), str(infile)]), [(infile, Path("x.ts"))])
+        self.assertEqual(output_path(infile), self.inputs / "a" / "x.ts.ass")
+
+    def test_no_captions_marker(self):
+        infile = self.inputs / "none.ts"
+        outfile = output_path(infile, self.root / "out", Path("none.ts"))
+        self.assertFalse(is_up_to_date(infile, outfile))
+        result = convert_one(str(infile), str(outfile), {"silent": True})
+        self.assertIsNone(result["error"])
+        self.assertFalse(result["captions"])
+        self.assertFalse(outfile.exists())
+        self.assertTrue(no_captions_path(outfile).exists())
+        self.assertTrue(is_up_to_date(infile, outfile))
+
+        # captions after all (the recording was replaced): the marker goes
+        infile.write_bytes(self.captioned)
+        os.utime(infile, (0, os.stat(no_captions_path(outfile)).st_mtime + 10))
+        self.assertFalse(is_up_to_date(infile, outfile))
+        result = convert_one(str(infile), str(outfile), {"silent": True})
+        self.assertTrue(result["captions"])
+        self.assertTrue(outfile.exists())
+        self.assertFalse(no_captions_path(outfile).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
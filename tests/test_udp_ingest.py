@@ -0,0 +1,147 @@
+"""
+Tests of arib-udp2ass: RTP header handling, and captioning a TS replayed over loopback.
+Run from the top of the repository: python -m unittest discover -s tests
+"""
+
+import os
+import struct
+import asyncio
+import tempfile
+import functools
+import unittest
+
+import tsmux
+
+from arib.mpeg.ts import TS
+from arib.ts2ass import convert
+from arib.udp_ingest import ServiceIngest
+from arib.udp_ingest import open_socket
+from arib.udp_ingest import strip_rtp
+from arib.udp_replay import replay
+
+ES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aijin.es")
+# data groups muxed into the test stream, and TS packets sent per datagram.
+# The packet count is chosen to leave a partial datagram at the end.
+DATA_GROUPS = 200
+PACKETS_PER_DATAGRAM = 7
+
+TS_PACKETS = bytes([TS.SYNC_BYTE]) + bytes(TS.PACKET_SIZE - 1)
+
+
+def rtp_header(sequence, csrc_count=0, extension=False, padding=False):
+    flags = (2 << 6) | (0x20 if padding else 0) | (0x10 if extension else 0) | csrc_count
+    return struct.pack(">BBHLL", flags, 33, sequence, 0, 0x1234)
+
+
+def dialogue_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [line for line in f if line.startswith("Dialogue:")]
+
+
+class TestStripRTP(unittest.TestCase):
+    def test_plain_ts(self):
+        packets, sequence = strip_rtp(TS_PACKETS)
+        self.assertEqual(bytes(packets), TS_PACKETS)
+        self.assertIsNone(sequence)
+
+    def test_rtp(self):
+        packets, sequence = strip_rtp(rtp_header(513) + TS_PACKETS)
+        self.assertEqual(bytes(packets), TS_PACKETS)
+        self.assertEqual(sequence, 513)
+
+    def test_csrc_extension_and_padding(self):
+        csrcs = struct.pack(">LL", 1, 2)
+        # 4 byte extension header giving 2 words of extension data
+        extension = struct.pack(">HH", 0xBEDE, 2) + bytes(8)
+        padding = b"\x00\x00\x03"
+        datagram = (
+            rtp_header(65535, csrc_count=2, extension=True, padding=True)
+            + csrcs
+            + extension
+            + TS_PACKETS
+            + padding
+        )
+        packets, sequence = strip_rtp(datagram)
+        self.assertEqual(bytes(packets), TS_PACKETS)
+        self.assertEqual(sequence, 65535)
+
+    def test_truncated_extension(self):
+        with self.assertRaises(ValueError):
+            strip_rtp(rtp_header(1, extension=True) + b"\xbe\xde")
+
+    def test_not_rtp(self):
+        with self.assertRaises(ValueError):
+            strip_rtp(b"\x40" + bytes(20))
+        with self.assertRaises(ValueError):
+            strip_rtp(b"")
+
+
+class TestLoopbackIngest(unittest.TestCase):
+    """Replay a TS into a ServiceIngest on 127.0.0.1 and compare with arib-ts2ass"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.ts_path = os.path.join(cls.tmpdir.name, "aijin.ts")
+        data = tsmux.mux(ES_FILE, DATA_GROUPS)
+        with open(cls.ts_path, "wb") as f:
+            f.write(data)
+        cls.packet_count = len(data) // TS.PACKET_SIZE
+        expected = os.path.join(cls.tmpdir.name, "expected.ass")
+        convert(cls.ts_path, expected)
+        cls.expected = dialogue_lines(expected)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def ingest(self, rtp):
+        outfile = os.path.join(self.tmpdir.name, "rtp.ass" if rtp else "udp.ass")
+
+        async def receive():
+            loop = asyncio.get_running_loop()
+            sock = open_socket("127.0.0.1", 0)
+            port = sock.getsockname()[1]
+            ingest = ServiceIngest("127.0.0.1", port, outfile, idle_timeout=1.0)
+            await loop.create_datagram_endpoint(lambda: ingest, sock=sock)
+            run = asyncio.ensure_future(ingest.run())
+            # paced a little (1000x the stream's rate) so the socket buffer keeps up
+            send = functools.partial(
+                replay,
+                self.ts_path,
+                "127.0.0.1",
+                port,
+                rtp=rtp,
+                speed=1000,
+                packets_per_datagram=PACKETS_PER_DATAGRAM,
+            )
+            sent = await loop.run_in_executor(None, send)
+            await run
+            return ingest, sent
+
+        ingest, sent = asyncio.run(receive())
+        return ingest, sent, dialogue_lines(outfile)
+
+    def check(self, rtp):
+        self.assertNotEqual(self.packet_count % PACKETS_PER_DATAGRAM, 0)
+        ingest, sent, lines = self.ingest(rtp)
+        self.assertEqual(sent, -(-self.packet_count // PACKETS_PER_DATAGRAM))
+        stats = ingest.stats()
+        self.assertEqual(stats["datagrams"], sent)
+        self.assertEqual(stats["packets"], self.packet_count)
+        self.assertEqual(stats["caption_pid"], tsmux.CAPTION_PID)
+        for counter in ("malformed", "queue_dropped", "rtp_lost", "cc_errors"):
+            self.assertEqual(stats[counter], 0, counter)
+        self.assertTrue(self.expected)
+        self.assertEqual(lines, self.expected)
+        self.assertEqual(stats["dialogue_lines"], len(self.expected))
+
+    def test_udp(self):
+        self.check(rtp=False)
+
+    def test_rtp(self):
+        self.check(rtp=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
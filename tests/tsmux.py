@@ -0,0 +1,165 @@
+"""
+Module: tsmux
+Desc: Build small MPEG TS files around the caption data groups of the tests/*.es files.
+Author: John O'Neil
+Email: oneil.john@gmail.com
+
+Just enough of a multiplexer for the tests: a PAT and a PMT naming an ARIB caption
+component, a PCR packet and a private stream PES per data group, with a video PES now and
+then so there's a PID to skip.
+
+"""
+
+import struct
+import binascii
+
+from arib.mpeg.ts import TS
+
+PMT_PID = 0x101
+PCR_PID = 0x100
+VIDEO_PID = 0x111
+CAPTION_PID = 0x114
+
+DATA_GROUP_START = b"\x80\xff\xf0"
+
+
+def crc32_mpeg(data):
+    """CRC-32/MPEG-2 of a PSI section"""
+    crc = 0xFFFFFFFF
+    for b in data:
+        crc ^= b << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def data_groups(es_data):
+    """The whole data groups (with their CRC-16) in the data of an .es file"""
+    groups = []
+    pos = es_data.find(DATA_GROUP_START)
+    while 0 <= pos and pos + 8 <= len(es_data):
+        end = pos + 8 + ((es_data[pos + 6] << 8) | es_data[pos + 7]) + 2
+        if end > len(es_data):
+            break
+        # only what passes its CRC-16 (ITU-T) is a data group
+        if binascii.crc_hqx(es_data[pos + 3 : end], 0) == 0:
+            groups.append(es_data[pos:end])
+            pos = es_data.find(DATA_GROUP_START, end)
+        else:
+            pos = es_data.find(DATA_GROUP_START, pos + 1)
+    return groups
+
+
+class Muxer(object):
+    """Packetizes PSI sections and PES packets, keeping continuity counters per PID"""
+
+    def __init__(self):
+        self._counters = {}
+
+    def packets(self, pid, payload, pcr=None):
+        """TS packets carrying payload (a section with its pointer field, or a PES) on pid.
+        The payload starts in the first packet. pcr puts a PCR in its adaptation field.
+        """
+        out = []
+        pos = 0
+        while pos < len(payload) or not out:
+            # adaptation field, after its length byte
+            adaptation = b""
+            if pcr is not None and not out:
+                adaptation = b"\x10" + struct.pack(">LH", pcr >> 1, ((pcr & 1) << 15) | 0x7E00)
+            room = TS.PACKET_SIZE - 4 - (1 + len(adaptation) if adaptation else 0)
+            chunk = payload[pos : pos + room]
+            stuffing = room - len(chunk)
+            if adaptation:
+                adaptation += b"\xff" * stuffing
+            elif stuffing:
+                # the length byte takes up one byte of the stuffing
+                adaptation = (b"\x00" + b"\xff" * stuffing)[: stuffing - 1]
+            has_adaptation = (pcr is not None and not out) or stuffing > 0
+            control = (0x20 if has_adaptation else 0x00) | (0x10 if chunk else 0x00)
+            field = bytes([len(adaptation)]) + adaptation if has_adaptation else b""
+            counter = self._counters.get(pid, 0)
+            header = bytes(
+                [
+                    TS.SYNC_BYTE,
+                    (0x40 if not out else 0x00) | (pid >> 8),
+                    pid & 0xFF,
+                    control | counter,
+                ]
+            )
+            if chunk:
+                self._counters[pid] = (counter + 1) & TS.CONTINUITY_COUNTER_MASK
+            packet = header + field + chunk
+            assert len(packet) == TS.PACKET_SIZE
+            out.append(packet)
+            pos += len(chunk)
+        return out
+
+
+def section(table_id, extension, body):
+    length = 5 + len(body) + 4
+    data = (
+        bytes([table_id, 0xB0 | (length >> 8), length & 0xFF])
+        + struct.pack(">H", extension)
+        + b"\xc1\x00\x00"
+        + body
+    )
+    return b"\x00" + data + struct.pack(">L", crc32_mpeg(data))
+
+
+def pat():
+    return section(0x00, 1, struct.pack(">HH", 0x0800, 0xE000 | PMT_PID))
+
+
+def pmt():
+    caption_descriptors = b"\x52\x01\x30\xfd\x03\x00\x08\x3d"
+    body = struct.pack(">HH", 0xE000 | PCR_PID, 0xF000)
+    body += b"\x02" + struct.pack(">HH", 0xE000 | VIDEO_PID, 0xF000)
+    body += (
+        b"\x06"
+        + struct.pack(">HH", 0xE000 | CAPTION_PID, 0xF000 | len(caption_descriptors))
+        + caption_descriptors
+    )
+    return section(0x02, 0x0800, body)
+
+
+def pes(stream_id, payload, pts):
+    """PES packet, with a PTS in its header unless pts is None"""
+    if pts is None:
+        body = b"\x81\x00\x00" + payload
+        return b"\x00\x00\x01" + bytes([stream_id]) + struct.pack(">H", len(body)) + body
+    pts_bytes = bytes(
+        [
+            0x21 | ((pts >> 29) & 0x0E),
+            (pts >> 22) & 0xFF,
+            0x01 | ((pts >> 14) & 0xFE),
+            (pts >> 7) & 0xFF,
+            0x01 | ((pts << 1) & 0xFE),
+        ]
+    )
+    body = b"\x81\x80\x05" + pts_bytes + payload
+    return b"\x00\x00\x01" + bytes([stream_id]) + struct.pack(">H", len(body)) + body
+
+
+def mux(es_path, max_groups=None, first_pcr=1234567, seconds_per_group=0.5):
+    """
+    TS data carrying the data groups of an .es file on CAPTION_PID, a data group every
+    seconds_per_group seconds by the PCR (which is allowed to wrap).
+    :return: bytes of the TS
+    """
+    with open(es_path, "rb") as f:
+        groups = data_groups(f.read())[:max_groups]
+    muxer = Muxer()
+    packets = []
+    ticks = int(seconds_per_group * TS.PCR_HZ)
+    for n, group in enumerate(groups):
+        if n % 10 == 0:
+            packets += muxer.packets(0, pat())
+            packets += muxer.packets(PMT_PID, pmt())
+        pcr = (first_pcr + n * ticks) % TS.PCR_WRAP
+        packets += muxer.packets(PCR_PID, b"", pcr=pcr)
+        if n % 4 == 0:
+            packets += muxer.packets(VIDEO_PID, pes(0xE0, bytes(400), pcr))
+        packets += muxer.packets(CAPTION_PID, pes(0xBD, group, (pcr + 9000) % TS.PCR_WRAP))
+    return b"".join(packets)